@@ -3,10 +3,11 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_restx import Api
 from backend.config import Config  # Make sure this path is correct
-from backend.models import db  # Make sure this path is correct
+from backend.models import db, InvoiceItem  # Make sure this path is correct
+from backend.catalogSync import rebuild_product_listings, backfill_rating_counters
 from backend.routes.loginRegister import api as login_register_api  # Make sure this path is correct
 from backend.routes.categoriesProducts import api as categories_products_api  # Ensure the import path is correct
-from backend.routes.productImages import api as product_images_api
+from backend.routes.productImages import api as product_images_api, migrate_images_to_store
 from backend.routes.shoppingCart import api as shopping_cart_api  # Ensure the shopping cart namespace is correctly imported
 from backend.routes.sort import api as sort_api
 from backend.routes.productCreate import api as product_create_api  # Import your new productCreate namespace
@@ -19,11 +20,16 @@ from backend.routes.adminLogin import api as admin_login_api
 from backend.routes.adminMethods import api as admin_methods_api
 from backend.routes.salesManagerMethods import api as sales_manager_methods_api
 from backend.routes.wishlist import wishlist_api
+from backend.routes.jobs import api as jobs_api
+from backend.jobs import ensure_job_workers
+from backend.salesRollup import compact_sales_rollup
+from backend.auth import init_auth
 
 app = Flask(__name__)
 app.config.from_object(Config)
 CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})  # Adjust CORS settings as needed
 db.init_app(app)
+init_auth(app)  # Server-Timing header with the time spent authenticating
 
 # Initialize Flask-RESTX API
 api = Api(app, title='Customer API', description='API for Customer Registration, Login, Product Management, and Protected Routes')
@@ -44,9 +50,19 @@ api.add_namespace(admin_login_api)
 api.add_namespace(admin_methods_api)
 api.add_namespace(sales_manager_methods_api)
 api.add_namespace(wishlist_api)
+api.add_namespace(jobs_api)
+
+# Background job workers (invoice emails, notifications); every handler is registered by the imports above
+ensure_job_workers(app)
 
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()  # Make sure this creates all tables based on the updated models
+        for index in InvoiceItem.__table__.indexes:
+            index.create(db.engine, checkfirst=True)  # create_all skips indexes added to existing tables
+        backfill_rating_counters()  # Recompute stored rating counters from Product_Rating
+        rebuild_product_listings()  # Backfill the Product_Listing read model
+        migrate_images_to_store()  # Move legacy inline images into the image store
+        compact_sales_rollup()  # Roll completed days of Invoice_Item up into Sales_Rollup
     app.run(host='0.0.0.0', port=8000, debug=True)  # Adjust the host and port as necessary
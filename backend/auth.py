@@ -0,0 +1,190 @@
+"""
+Shared JWT authentication for the API namespaces.
+
+Verified token payloads are kept in a bounded LRU cache keyed by the token's SHA-256 digest, so
+repeated requests with the same token skip the signature check. An entry never outlives the
+token's `exp` claim. Revoked tokens (logout) are stored in Revoked_Token; each process keeps the
+set of revoked digests in memory and reloads it every REVOCATION_REFRESH_SECONDS.
+
+Time spent authenticating is reported per request in a Server-Timing response header once
+`init_auth(app)` is called.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, g, request
+import jwt
+from backend.cache import LRUCache
+from backend.config import Config
+from backend.models import db, Customer, RevokedToken
+
+# Verified payloads by token digest. The TTL bounds how long a cached verification is trusted.
+TOKEN_CACHE_TTL = 300  # seconds
+verified_tokens = LRUCache(maxsize=4096, ttl=TOKEN_CACHE_TTL)
+
+REVOCATION_REFRESH_SECONDS = 30
+_revoked = set()
+_revoked_loaded_at = None
+_revocation_lock = threading.Lock()
+
+
+class AuthError(Exception):
+    """Authentication failed; `message` and `code` make up the failure response."""
+
+    def __init__(self, message, code=401):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def bearer_token():
+    """The token of the Authorization header, with or without its "Bearer " prefix."""
+    token = request.headers.get('Authorization')
+    if not token:
+        raise AuthError("Token is missing")
+    if token.startswith("Bearer "):
+        token = token[len("Bearer "):]
+    return token
+
+
+def _revocation_enabled():
+    return current_app.config.get('AUTH_REVOCATION', True)
+
+
+def _revoked_digests():
+    """Digests of revoked, unexpired tokens; reloaded from Revoked_Token when stale."""
+    global _revoked, _revoked_loaded_at
+    now = time.monotonic()
+    if _revoked_loaded_at is not None and now - _revoked_loaded_at < REVOCATION_REFRESH_SECONDS:
+        return _revoked
+    with _revocation_lock:
+        if _revoked_loaded_at is None or now - _revoked_loaded_at >= REVOCATION_REFRESH_SECONDS:
+            _revoked = {
+                digest for (digest,) in db.session.query(RevokedToken.token_digest).filter(
+                    db.or_(RevokedToken.expires_at.is_(None), RevokedToken.expires_at > datetime.now(timezone.utc))
+                )
+            }
+            _revoked_loaded_at = now
+    return _revoked
+
+
+def verify_token(token):
+    """Return the payload of a valid token, or raise AuthError."""
+    digest = token_digest(token)
+    if _revocation_enabled() and digest in _revoked_digests():
+        verified_tokens.delete(digest)
+        raise AuthError("Token has been revoked")
+
+    payload = verified_tokens.get(digest)
+    if payload is not None:
+        if 'exp' in payload and payload['exp'] <= time.time():
+            verified_tokens.delete(digest)
+            raise AuthError("Token has expired")
+        g.auth_cache = 'hit'
+        return payload
+
+    g.auth_cache = 'miss'
+    try:
+        payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise AuthError("Token has expired")
+    except jwt.InvalidTokenError:
+        raise AuthError("Invalid token")
+
+    ttl = TOKEN_CACHE_TTL
+    if 'exp' in payload:
+        ttl = min(ttl, payload['exp'] - time.time())
+    if ttl > 0:
+        verified_tokens.set(digest, payload, ttl=ttl)
+    return payload
+
+
+def authenticate():
+    """
+    Verify the request's bearer token and expose its payload as request.token_payload (and, for
+    customer tokens, request.customer / request.customer_id). Raises AuthError.
+    """
+    started = time.perf_counter()
+    try:
+        payload = verify_token(bearer_token())
+    finally:
+        g.auth_seconds = g.get('auth_seconds', 0) + time.perf_counter() - started
+    request.token_payload = payload
+    request.customer = payload
+    request.customer_id = payload.get('customer_id')
+    return payload
+
+
+def token_required(func):
+    """Require a valid token."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            authenticate()
+        except AuthError as e:
+            return {"status": "failure", "message": e.message}, e.code
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def token_required_with_role(*required_roles):
+    """Require a valid manager token carrying one of `required_roles`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                payload = authenticate()
+            except AuthError as e:
+                return {"status": "failure", "message": e.message}, e.code
+            if payload.get('role') not in required_roles:
+                return {"status": "failure", "message": "Unauthorized role"}, 403
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def customer_required(func):
+    """Require a valid customer token and pass the Customer row as `current_user` (after `self`)."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            payload = authenticate()
+        except AuthError as e:
+            return {"status": "failure", "message": e.message}, e.code
+        current_user = db.session.get(Customer, payload.get('customer_id')) if payload.get('customer_id') else None
+        if current_user is None:
+            return {"status": "failure", "message": "User not found"}, 401
+        return func(*args, current_user, **kwargs)
+    return wrapper
+
+
+def revoke_token(token, payload=None):
+    """Revoke a token for every process (effective here at once, elsewhere within the refresh interval)."""
+    digest = token_digest(token)
+    payload = payload if payload is not None else verify_token(token)
+    expires_at = datetime.fromtimestamp(payload['exp'], timezone.utc) if 'exp' in payload else None
+    if db.session.get(RevokedToken, digest) is None:
+        db.session.add(RevokedToken(token_digest=digest, expires_at=expires_at))
+    db.session.commit()
+    verified_tokens.delete(digest)
+    with _revocation_lock:
+        _revoked.add(digest)
+
+
+def init_auth(app):
+    """Report the time spent authenticating each request in a Server-Timing header."""
+    @app.after_request
+    def add_auth_timing(response):
+        seconds = g.get('auth_seconds')
+        if seconds is not None:
+            response.headers.add(
+                'Server-Timing', f'auth;dur={seconds * 1000:.3f};desc="cache {g.get("auth_cache", "miss")}"'
+            )
+        return response
+    return app
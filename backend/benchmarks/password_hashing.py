@@ -0,0 +1,66 @@
+"""
+Password hashing throughput benchmark.
+
+Hashes a password repeatedly with each candidate werkzeug method, on one thread and on several,
+and reports hashes per second and latency. Login capacity per process is roughly the threaded
+rate of the configured PASSWORD_HASH_METHOD with PASSWORD_HASH_WORKERS threads.
+
+    python -m backend.benchmarks.password_hashing --methods scrypt:32768:8:1 pbkdf2:sha256:600000 --threads 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from backend.passwords import normalize_method
+
+DEFAULT_METHODS = [
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+]
+
+
+def measure(method, threads, seconds):
+    """Check a password against a `method` hash for about `seconds`. Returns (hashes/sec, mean ms)."""
+    password_hash = generate_password_hash('correct horse battery staple', method=method)
+    deadline = time.perf_counter() + seconds
+
+    def work():
+        count, busy = 0, 0.0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            check_password_hash(password_hash, 'correct horse battery staple')
+            busy += time.perf_counter() - started
+            count += 1
+        return count, busy
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda _: work(), range(threads)))
+    elapsed = time.perf_counter() - started
+    count = sum(count for count, _ in results)
+    busy = sum(busy for _, busy in results)
+    return count / elapsed, busy / count * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS, help='werkzeug hash methods to compare')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 2, help='Threads for the parallel run')
+    parser.add_argument('--seconds', type=float, default=3.0, help='Duration of each measurement')
+    args = parser.parse_args()
+
+    print(f"{'method':<26} {'1 thread/s':>11} {'ms/hash':>8} {f'{args.threads} threads/s':>13} {'ms/hash':>8}")
+    for method in args.methods:
+        method = normalize_method(method)
+        single_rate, single_ms = measure(method, 1, args.seconds)
+        parallel_rate, parallel_ms = measure(method, args.threads, args.seconds)
+        print(f"{method:<26} {single_rate:>11.1f} {single_ms:>8.1f} {parallel_rate:>13.1f} {parallel_ms:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
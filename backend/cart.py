@@ -0,0 +1,143 @@
+from collections import namedtuple
+from sqlalchemy import tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from backend.models import db, Products, ProductColors, ProductSizes, ShoppingBagItem
+
+# Upper bound on keys per IN-list / VALUES list, to stay clear of bind parameter limits
+BATCH_CHUNK_SIZE = 500
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE support
+_UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+# One cart (or wishlist) line with everything needed to display, price or check it out.
+# product / size are None and color_exists is False when the referenced row no longer exists.
+CartLine = namedtuple('CartLine', ['item', 'product', 'product_image', 'size', 'color_exists'])
+
+
+def load_cart_lines(line_model, customer_id):
+    """
+    Fetch a customer's ShoppingBagItem or WishlistItem lines together with their product,
+    color image, size stock and whether the color exists in a single joined query, ordered by product, color and size.
+    Loaded ProductSizes rows are ORM objects, so callers can update their stock directly.
+    """
+    rows = db.session.query(
+        line_model,
+        Products,
+        ProductColors.product_image,
+        ProductSizes,
+        ProductColors.color_name.isnot(None)
+    ).outerjoin(
+        Products, line_model.base_product_id == Products.base_product_id
+    ).outerjoin(
+        ProductColors,
+        (line_model.base_product_id == ProductColors.base_product_id) &
+        (line_model.color_name == ProductColors.color_name)
+    ).outerjoin(
+        ProductSizes,
+        (line_model.base_product_id == ProductSizes.base_product_id) &
+        (line_model.color_name == ProductSizes.color_name) &
+        (line_model.size_name == ProductSizes.size_name)
+    ).filter(
+        line_model.customer_id == customer_id
+    ).order_by(
+        line_model.base_product_id, line_model.color_name, line_model.size_name
+    ).all()
+    return [CartLine(*row) for row in rows]
+
+
+def discounted_price(product):
+    """Current unit price of a product after its discount."""
+    discount_percentage = float(product.discount_percentage or 0)
+    return float(product.price) * (1 - discount_percentage / 100.0)
+
+
+def _chunks(items, size=BATCH_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_variants(keys):
+    """
+    Look up which (base_product_id, color_name, size_name) keys exist.
+    Returns (colors, sizes): the existing (base_product_id, color_name) pairs among the keys'
+    colors and the existing full keys, using one query per BATCH_CHUNK_SIZE colors.
+    """
+    color_keys = {(base_product_id, color_name) for base_product_id, color_name, _ in keys}
+    colors, sizes = set(), set()
+    for chunk in _chunks(color_keys):
+        rows = db.session.query(
+            ProductColors.base_product_id,
+            ProductColors.color_name,
+            ProductSizes.size_name
+        ).outerjoin(
+            ProductSizes,
+            (ProductColors.base_product_id == ProductSizes.base_product_id) &
+            (ProductColors.color_name == ProductSizes.color_name)
+        ).filter(
+            tuple_(ProductColors.base_product_id, ProductColors.color_name).in_(chunk)
+        )
+        for base_product_id, color_name, size_name in rows:
+            colors.add((base_product_id, color_name))
+            if size_name is not None:
+                sizes.add((base_product_id, color_name, size_name))
+    return colors, sizes
+
+
+def add_to_cart(customer_id, quantities):
+    """
+    Add quantities ({(base_product_id, color_name, size_name): quantity}) to a customer's
+    shopping bag, incrementing lines that already exist. Keys must have been validated.
+    Uses a single INSERT ... ON CONFLICT DO UPDATE per chunk where the database supports it,
+    otherwise one lookup of the existing lines followed by ORM updates. The caller commits.
+    """
+    if not quantities:
+        return
+    values = [
+        {
+            "customer_id": customer_id,
+            "base_product_id": base_product_id,
+            "color_name": color_name,
+            "size_name": size_name,
+            "product_quantity": quantity
+        }
+        for (base_product_id, color_name, size_name), quantity in quantities.items()
+    ]
+
+    make_insert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if make_insert is not None:
+        table = ShoppingBagItem.__table__
+        for chunk in _chunks(values):
+            statement = make_insert(table).values(chunk)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.customer_id, table.c.base_product_id, table.c.color_name, table.c.size_name],
+                set_={"product_quantity": table.c.product_quantity + statement.excluded.product_quantity}
+            )
+            db.session.execute(statement)
+        return
+
+    # Portable fallback: fetch the existing lines in one query per chunk, then update or add
+    for chunk in _chunks(quantities):
+        existing = {
+            (line.base_product_id, line.color_name, line.size_name): line
+            for line in ShoppingBagItem.query.filter(
+                ShoppingBagItem.customer_id == customer_id,
+                tuple_(ShoppingBagItem.base_product_id, ShoppingBagItem.color_name, ShoppingBagItem.size_name).in_(chunk)
+            )
+        }
+        for key in chunk:
+            line = existing.get(key)
+            if line is not None:
+                line.product_quantity += quantities[key]
+            else:
+                base_product_id, color_name, size_name = key
+                db.session.add(ShoppingBagItem(
+                    customer_id=customer_id,
+                    base_product_id=base_product_id,
+                    color_name=color_name,
+                    size_name=size_name,
+                    product_quantity=quantities[key]
+                ))
@@ -0,0 +1,322 @@
+"""
+Bulk catalog import: many products, with their colors and sizes, in a few statements per chunk.
+
+Products are validated row by row and imported in chunks of IMPORT_CHUNK_SIZE. Each chunk is one
+transaction: missing categories are created once (categories are reused across the whole import),
+products are inserted with one multi-row INSERT ... RETURNING, and colors and sizes with one
+executemany each. A failing chunk is rolled back on its own; chunks committed before it stay.
+In dry-run mode rows are only validated and nothing is written.
+
+Background imports stage the products as Catalog_Import_Row rows of their job instead of one
+payload; the job deletes each chunk's staged rows and records its progress in the transaction that
+imports the chunk.
+"""
+from sqlalchemy import delete, insert, tuple_
+from backend.models import db, Categories, Products, ProductColors, ProductSizes, CatalogImportRow
+from backend.catalogSync import products_changed, category_changed
+from backend.jobs import job_handler, record_progress
+
+IMPORT_CHUNK_SIZE = 500  # products per transaction
+MAX_REPORTED_ERRORS = 1000  # rejected rows listed in a background import's progress
+
+_PRODUCT_STRINGS = ('category_name', 'category_gender', 'product_name', 'distributor')
+_PRODUCT_INTEGERS = ('model', 'serial_number', 'warranty_status')
+
+
+def _string(data, field, errors, prefix='', max_length=None):
+    value = data.get(field)
+    if not isinstance(value, str) or not value.strip():
+        errors.append(f"{prefix}{field} is required")
+        return None
+    value = value.strip()
+    if max_length is not None and len(value) > max_length:
+        errors.append(f"{prefix}{field} must be at most {max_length} characters")
+    return value
+
+
+def _integer(value):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError()
+    return int(value)
+
+
+def validate_product(data):
+    """
+    Check one product of an import. Returns (product, errors): the normalized product with its
+    category key, columns and colors, or None with the list of problems found.
+    """
+    if not isinstance(data, dict):
+        return None, ["Expected a JSON object"]
+    errors = []
+    values = {field: _string(data, field, errors, max_length=255) for field in _PRODUCT_STRINGS}
+    for field in _PRODUCT_INTEGERS:
+        try:
+            values[field] = _integer(data.get(field))
+        except (TypeError, ValueError):
+            errors.append(f"{field} must be an integer")
+    try:
+        values['price'] = float(data.get('price'))
+        if values['price'] < 0:
+            errors.append("price must not be negative")
+    except (TypeError, ValueError):
+        errors.append("price must be a number")
+    try:
+        values['discount_percentage'] = float(data.get('discount_percentage') or 0)
+        if not 0 <= values['discount_percentage'] <= 100:
+            errors.append("discount_percentage must be between 0 and 100")
+    except (TypeError, ValueError):
+        errors.append("discount_percentage must be a number")
+
+    colors = data.get('colors') or []
+    if not isinstance(colors, list):
+        errors.append("colors must be a list")
+        colors = []
+    parsed_colors = {}
+    for index, color in enumerate(colors):
+        prefix = f"colors[{index}]."
+        if not isinstance(color, dict):
+            errors.append(f"colors[{index}] must be an object")
+            continue
+        color_name = _string(color, 'color_name', errors, prefix, max_length=50)
+        parsed = {
+            'color_name': color_name,
+            'product_image': _string(color, 'product_image', errors, prefix, max_length=500),
+            'color_description': _string(color, 'color_description', errors, prefix, max_length=500),
+            'sizes': {}
+        }
+        if color_name in parsed_colors:
+            errors.append(f"{prefix}color_name '{color_name}' is repeated")
+        sizes = color.get('sizes') or []
+        if not isinstance(sizes, list):
+            errors.append(f"{prefix}sizes must be a list")
+            sizes = []
+        for size_index, size in enumerate(sizes):
+            size_prefix = f"{prefix}sizes[{size_index}]."
+            if not isinstance(size, dict):
+                errors.append(f"{prefix}sizes[{size_index}] must be an object")
+                continue
+            size_name = _string(size, 'size_name', errors, size_prefix, max_length=50)
+            try:
+                stock = _integer(size.get('product_stock'))
+                if stock < 0:
+                    errors.append(f"{size_prefix}product_stock must not be negative")
+            except (TypeError, ValueError):
+                errors.append(f"{size_prefix}product_stock must be an integer")
+                stock = None
+            if size_name in parsed['sizes']:
+                errors.append(f"{size_prefix}size_name '{size_name}' is repeated")
+            parsed['sizes'][size_name] = stock
+        parsed_colors[color_name] = parsed
+
+    if errors:
+        return None, errors
+    category = (values.pop('category_name'), values.pop('category_gender'))
+    return {'category': category, 'columns': values, 'colors': list(parsed_colors.values())}, []
+
+
+class CatalogImport:
+    """
+    One import run. Feed it (row number, product) pairs with add(); call finish() at the end.
+    `on_progress(summary, first_row, last_row)` is called for every chunk inside the chunk's
+    transaction, right before it commits, so whatever it writes commits together with the chunk.
+    """
+
+    def __init__(self, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE, on_progress=None):
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.categories = {}  # (name, gender) -> category_id, or None for categories a dry run would create
+        self.summary = {
+            "rows": 0, "created": 0, "valid": 0, "invalid": 0, "failed": 0,
+            "colors": 0, "sizes": 0, "categories_created": 0, "chunks": 0
+        }
+        self.errors = []
+        self._chunk = []
+        self._new_categories = []
+        self._rows = None  # [first, last] row number of the pending chunk
+
+    def add(self, row_number, data):
+        self.summary["rows"] += 1
+        if self._rows is None:
+            self._rows = [row_number, row_number]
+        self._rows[1] = row_number
+        product, errors = validate_product(data)
+        if errors:
+            self.summary["invalid"] += 1
+            self.errors.append({"row": row_number, "errors": errors})
+        else:
+            self._chunk.append((row_number, product))
+        if self.summary["rows"] % self.chunk_size == 0:
+            self.flush()
+
+    def finish(self):
+        self.flush()
+        return self.summary
+
+    def flush(self):
+        """Import (or, in a dry run, check) the pending chunk in one transaction."""
+        chunk, self._chunk = self._chunk, []
+        rows, self._rows = self._rows, None
+        if rows is None:
+            return
+        self.summary["chunks"] += 1
+        if self.dry_run or not chunk:
+            if chunk:
+                self._check_chunk(chunk)
+            self._report(rows)
+            db.session.commit()
+            return
+
+        committed_summary = dict(self.summary)
+        try:
+            for key, count in self._import_chunk(chunk).items():
+                self.summary[key] += count
+            self._report(rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.summary = committed_summary
+            self._forget_uncommitted_categories()
+            print(f"Catalog import chunk failed: {e}")
+            self.summary["failed"] += len(chunk)
+            self.errors.append({
+                "rows": [chunk[0][0], chunk[-1][0]],
+                "errors": [f"Chunk rolled back: {e.__class__.__name__}"]
+            })
+            self._report(rows)
+            db.session.commit()
+
+    def _report(self, rows):
+        if self.on_progress is not None:
+            self.on_progress(dict(self.summary), *rows)
+
+    def _load_categories(self, keys):
+        missing = [key for key in keys if key not in self.categories]
+        if missing:
+            rows = db.session.query(
+                Categories.category_name, Categories.category_gender, Categories.category_id
+            ).filter(tuple_(Categories.category_name, Categories.category_gender).in_(missing))
+            for name, gender, category_id in rows:
+                self.categories.setdefault((name, gender), category_id)
+        return [key for key in keys if key not in self.categories]
+
+    def _check_chunk(self, chunk):
+        keys = sorted({product['category'] for _, product in chunk})
+        for key in self._load_categories(keys):
+            self.categories[key] = None
+            self.summary["categories_created"] += 1
+        self.summary["valid"] += len(chunk)
+        self.summary["colors"] += sum(len(product['colors']) for _, product in chunk)
+        self.summary["sizes"] += sum(
+            len(color['sizes']) for _, product in chunk for color in product['colors']
+        )
+
+    def _import_chunk(self, chunk):
+        keys = sorted({product['category'] for _, product in chunk})
+        self._new_categories = []
+        for name, gender in self._load_categories(keys):
+            category = Categories(category_name=name, category_gender=gender)
+            db.session.add(category)
+            db.session.flush()
+            self.categories[(name, gender)] = category.category_id
+            self._new_categories.append((name, gender))
+            category_changed(category.category_id)
+
+        product_rows = [
+            dict(product['columns'], category_id=self.categories[product['category']])
+            for _, product in chunk
+        ]
+        product_ids = db.session.scalars(
+            insert(Products).returning(Products.base_product_id, sort_by_parameter_order=True),
+            product_rows
+        ).all()
+
+        color_rows = []
+        size_rows = []
+        for base_product_id, (_, product) in zip(product_ids, chunk):
+            for color in product['colors']:
+                color_rows.append({
+                    'base_product_id': base_product_id,
+                    'color_name': color['color_name'],
+                    'product_image': color['product_image'],
+                    'color_description': color['color_description']
+                })
+                size_rows.extend(
+                    {'base_product_id': base_product_id, 'color_name': color['color_name'],
+                     'size_name': size_name, 'product_stock': stock}
+                    for size_name, stock in color['sizes'].items()
+                )
+        if color_rows:
+            db.session.execute(insert(ProductColors.__table__), color_rows)
+        if size_rows:
+            db.session.execute(insert(ProductSizes.__table__), size_rows)
+
+        products_changed(product_ids)
+        return {
+            "created": len(product_ids), "valid": len(product_ids), "colors": len(color_rows),
+            "sizes": len(size_rows), "categories_created": len(self._new_categories)
+        }
+
+    def _forget_uncommitted_categories(self):
+        for key in self._new_categories:
+            self.categories.pop(key, None)
+        self._new_categories = []
+
+
+def import_products(rows, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE, on_progress=None):
+    """Import (row number, product) pairs. Returns (summary, errors)."""
+    run = CatalogImport(dry_run=dry_run, chunk_size=chunk_size, on_progress=on_progress)
+    for row_number, data in rows:
+        run.add(row_number, data)
+    return run.finish(), run.errors
+
+
+def stage_import(job_id, rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Store (row number, product) pairs for a 'catalog_import' job in the current transaction, with
+    one executemany per chunk, so the request never holds the whole import. Returns the row count.
+    """
+    staged = 0
+    batch = []
+    for row_number, data in rows:
+        batch.append({"job_id": job_id, "row_number": row_number, "data": data})
+        if len(batch) >= chunk_size:
+            db.session.execute(insert(CatalogImportRow), batch)
+            staged += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(CatalogImportRow), batch)
+        staged += len(batch)
+    return staged
+
+
+@job_handler('catalog_import')
+def catalog_import_job(payload, job):
+    """
+    Import the products staged for the job. Every chunk deletes its staged rows and records the
+    summary in the transaction that imports it, so a retried job resumes with the rows still staged
+    and never imports a committed chunk twice.
+    """
+    previous = dict(job.progress or {})
+
+    def on_progress(summary, first_row, last_row):
+        db.session.execute(delete(CatalogImportRow).where(
+            CatalogImportRow.job_id == job.job_id, CatalogImportRow.row_number.between(first_row, last_row)
+        ))
+        record_progress(
+            job, errors=(previous.get("errors", []) + run.errors)[:MAX_REPORTED_ERRORS],
+            **{key: previous.get(key, 0) + value for key, value in summary.items()}
+        )
+
+    run = CatalogImport(on_progress=on_progress)
+    last_row = 0
+    while True:
+        rows = db.session.query(CatalogImportRow.row_number, CatalogImportRow.data).filter(
+            CatalogImportRow.job_id == job.job_id, CatalogImportRow.row_number > last_row
+        ).order_by(CatalogImportRow.row_number).limit(IMPORT_CHUNK_SIZE).all()
+        if not rows:
+            break
+        for row_number, data in rows:
+            run.add(row_number, data)
+        last_row = rows[-1].row_number
+    run.finish()
@@ -0,0 +1,520 @@
+from collections import defaultdict
+from sqlalchemy import event, func, case, cast, literal, select, update, Numeric
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import hashlib
+import json
+import threading
+import time
+import traceback
+from flask import current_app
+from backend.cache import LRUCache
+from backend.imageStore import is_image_key
+from backend.searchIndex import SearchIndex, PrefixIndex
+from backend.models import db, Products, Categories, ProductColors, ProductSizes, ProductRating, ProductListing, ProductListingFacet
+
+# Assembled /categoriesProducts/products/<id>/details responses, keyed by base_product_id.
+# The TTL bounds staleness when several worker processes each hold their own cache.
+product_details_cache = LRUCache(maxsize=2048, ttl=300)
+
+# Inverted index behind /searchMethods/search. Changes committed through this process are applied
+# right after the commit; a periodic full reload picks up changes made by other worker processes.
+product_search_index = SearchIndex()
+SEARCH_INDEX_MAX_AGE = 600  # seconds
+
+# Prefix index behind /searchMethods/suggest over product, color and category names,
+# maintained the same way as the search index
+suggestion_index = PrefixIndex()
+_index_rebuilds = set()  # ids of the indexes being reloaded by a background thread
+_index_rebuild_lock = threading.Lock()
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING support
+_INSERT_IGNORING_CONFLICTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+# Bucketed facets of the catalog listing. Price buckets are ranges (upper bound exclusive, None = open);
+# discount and rating buckets are thresholds, so a product belongs to every threshold it reaches.
+PRICE_BUCKETS = [(0, 50), (50, 100), (100, 250), (250, 500), (500, None)]
+DISCOUNT_THRESHOLDS = [10, 25, 50]
+RATING_THRESHOLDS = [4, 3, 2, 1]
+
+# Category list behind GET /categories. The version is bumped whenever a category change commits
+# in this process; other processes pick changes up once the cached list is CATEGORY_CACHE_MAX_AGE old.
+CATEGORY_CACHE_MAX_AGE = 300  # seconds
+_category_cache = {"version": 0, "loaded_version": None, "loaded_at": None, "categories": None, "etag": None}
+_category_cache_lock = threading.Lock()
+
+
+def _pending_products(session):
+    """Products changed in the session's current transaction, evicted from caches once it commits."""
+    return session.info.setdefault('catalog_changed_products', set())
+
+
+def _pending_search_documents(session):
+    """Search documents of products changed in the current transaction, applied to the index once it commits."""
+    return session.info.setdefault('catalog_search_documents', {})
+
+
+def _pending_suggestions(session):
+    """Suggestion entries per source (('product', id) or ('category', id)) changed in the current transaction."""
+    return session.info.setdefault('catalog_suggestions', {})
+
+
+def _pending_stock_products(session):
+    """Products whose stock changed in the current transaction; their size facets are refreshed once it commits."""
+    return session.info.setdefault('catalog_stock_changed', set())
+
+
+def _mark_categories_changed(session):
+    """Flag the current transaction as changing categories, bumping the category list version once it commits."""
+    session.info['catalog_categories_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed_changes(session):
+    for base_product_id in session.info.pop('catalog_changed_products', ()):
+        product_details_cache.delete(base_product_id)
+    stock_products = session.info.pop('catalog_stock_changed', None)
+    if stock_products:
+        try:
+            with session.get_bind().begin() as connection:
+                refresh_size_facets(connection, sorted(stock_products))
+        except Exception:
+            traceback.print_exc()  # The stock change itself is committed; the facets catch up on the next one
+    for base_product_id, documents in session.info.pop('catalog_search_documents', {}).items():
+        product_search_index.replace_product(base_product_id, documents)
+    for source, entries in session.info.pop('catalog_suggestions', {}).items():
+        suggestion_index.replace(source, entries)
+    if session.info.pop('catalog_categories_changed', False):
+        with _category_cache_lock:
+            _category_cache["version"] += 1
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_pending_products(session, transaction):
+    # Runs after after_commit; anything still pending here belonged to a rolled back transaction
+    if transaction.parent is None:
+        session.info.pop('catalog_changed_products', None)
+        session.info.pop('catalog_stock_changed', None)
+        session.info.pop('catalog_search_documents', None)
+        session.info.pop('catalog_suggestions', None)
+        session.info.pop('catalog_categories_changed', None)
+
+
+def product_image_url(base_product_id, color_name, image_key=None, size=None):
+    """
+    Build the public image URL for a product color. When the image store key is known it is
+    appended as ?v=, which makes the URL content-addressed and cacheable indefinitely.
+    `size` selects a precomputed rendition (thumb, medium, full).
+    """
+    url = f"/productImages/retrieve?base_product_id={base_product_id}&color_name={color_name}"
+    if is_image_key(image_key):
+        url += f"&v={image_key}"
+    if size:
+        url += f"&size={size}"
+    return url
+
+
+def price_bucket(price):
+    """Label of the PRICE_BUCKETS range containing price, e.g. '50-100' or '500+'."""
+    for low, high in PRICE_BUCKETS:
+        if high is None:
+            return f"{low}+"
+        if low <= price < high:
+            return f"{low}-{high}"
+    return None
+
+
+def _facet_rows(row, in_stock_sizes):
+    """Product_Listing_Facet rows of one listing row."""
+    values = [('color', color_name) for color_name in row['colors']]
+    values += [('size', size_name) for size_name in in_stock_sizes]
+    values.append(('distributor', row['distributor']))
+    bucket = price_bucket(float(row['price']))
+    if bucket is not None:
+        values.append(('price', bucket))
+    values += [('discount', f"{threshold}+") for threshold in DISCOUNT_THRESHOLDS if float(row['discount_percentage']) >= threshold]
+    values += [('rating', f"{threshold}+") for threshold in RATING_THRESHOLDS if float(row['average_rating']) >= threshold]
+    return [
+        {"base_product_id": row['base_product_id'], "facet": facet, "value": value}
+        for facet, value in dict.fromkeys(values)
+    ]
+
+
+def _build_listing_rows(base_product_ids=None):
+    """
+    Compute Product_Listing and Product_Listing_Facet rows for the given products (or for every
+    product when None) and return them as (listing_rows, facet_rows).
+    Uses a fixed number of queries regardless of how many colors or sizes a product has.
+    """
+    products_query = db.session.query(
+        Products.base_product_id,
+        Products.category_id,
+        Products.product_name,
+        Products.price,
+        Products.discount_percentage,
+        Products.average_rating,
+        Products.rating_sum,
+        Products.distributor,
+        Categories.category_name,
+        Categories.category_gender
+    ).join(Categories, Products.category_id == Categories.category_id)
+
+    colors_query = db.session.query(ProductColors.base_product_id, ProductColors.color_name, ProductColors.product_image)
+    sizes_query = db.session.query(
+        ProductSizes.base_product_id,
+        ProductSizes.size_name,
+        func.max(ProductSizes.product_stock).label('max_stock')
+    ).group_by(ProductSizes.base_product_id, ProductSizes.size_name)
+
+    if base_product_ids is not None:
+        products_query = products_query.filter(Products.base_product_id.in_(base_product_ids))
+        colors_query = colors_query.filter(ProductColors.base_product_id.in_(base_product_ids))
+        sizes_query = sizes_query.filter(ProductSizes.base_product_id.in_(base_product_ids))
+
+    colors = defaultdict(list)
+    first_image_url = {}
+    for base_product_id, color_name, product_image in colors_query.order_by(ProductColors.base_product_id, ProductColors.color_name):
+        colors[base_product_id].append(color_name)
+        first_image_url.setdefault(base_product_id, product_image_url(base_product_id, color_name, product_image, size='thumb'))
+
+    sizes = defaultdict(list)
+    in_stock_sizes = defaultdict(list)  # Sizes with stock left in at least one color
+    for base_product_id, size_name, max_stock in sizes_query.order_by(ProductSizes.base_product_id, ProductSizes.size_name):
+        sizes[base_product_id].append(size_name)
+        if max_stock and max_stock > 0:
+            in_stock_sizes[base_product_id].append(size_name)
+
+    rows = []
+    facet_rows = []
+    for product in products_query:
+        product_colors = colors.get(product.base_product_id, [])
+        row = {
+            "base_product_id": product.base_product_id,
+            "category_id": product.category_id,
+            "product_name": product.product_name,
+            "price": product.price,
+            "discount_percentage": product.discount_percentage or 0,
+            "average_rating": product.average_rating or 0,
+            "distributor": product.distributor,
+            "category_name": product.category_name,
+            "category_gender": product.category_gender,
+            "colors": product_colors,
+            "sizes": sizes.get(product.base_product_id, []),
+            # popularity = avg(rate) * count(rate), i.e. the stored sum of all ratings of the product
+            "popularity": product.rating_sum or 0,
+            "image_url": first_image_url.get(product.base_product_id)
+        }
+        rows.append(row)
+        facet_rows.extend(_facet_rows(row, in_stock_sizes.get(product.base_product_id, [])))
+    return rows, facet_rows
+
+
+def _load_search_documents(base_product_ids=None):
+    """Fetch the searchable fields of every product color (or of the given products only)."""
+    query = db.session.query(
+        Products.base_product_id,
+        Products.product_name,
+        Products.price,
+        ProductColors.color_name,
+        ProductColors.color_description
+    ).join(ProductColors, Products.base_product_id == ProductColors.base_product_id)
+    if base_product_ids is not None:
+        query = query.filter(Products.base_product_id.in_(base_product_ids))
+    return [
+        {
+            "base_product_id": row.base_product_id,
+            "product_name": row.product_name,
+            "price": float(row.price),
+            "color_name": row.color_name,
+            "color_description": row.color_description
+        }
+        for row in query
+    ]
+
+
+def _rebuild_index(index, load_snapshot):
+    index.begin_rebuild()
+    try:
+        snapshot = load_snapshot()
+    except Exception:
+        index.abort_rebuild()
+        raise
+    index.rebuild(snapshot)
+
+
+def _rebuild_index_in_background(app, index, load_snapshot):
+    try:
+        with app.app_context():
+            try:
+                _rebuild_index(index, load_snapshot)
+            finally:
+                db.session.remove()
+    except Exception:
+        traceback.print_exc()  # The stale index keeps serving; the next request retries
+    finally:
+        with _index_rebuild_lock:
+            _index_rebuilds.discard(id(index))
+
+
+def _fresh_index(index, load_snapshot):
+    """
+    Return an index, loading it on first use. A stale index keeps serving while a background
+    thread reloads it from the database and swaps the new one in.
+    """
+    loaded_at = index.loaded_at
+    if loaded_at is None:
+        _rebuild_index(index, load_snapshot)
+    elif time.monotonic() - loaded_at > SEARCH_INDEX_MAX_AGE:
+        with _index_rebuild_lock:
+            if id(index) in _index_rebuilds:
+                return index
+            _index_rebuilds.add(id(index))
+        threading.Thread(
+            target=_rebuild_index_in_background,
+            args=(current_app._get_current_object(), index, load_snapshot),
+            name='search-index-rebuild',
+            daemon=True
+        ).start()
+    return index
+
+
+def get_product_search_index():
+    """Return the product search index, reloading it from the database when missing or stale."""
+    return _fresh_index(product_search_index, _load_search_documents)
+
+
+def _load_suggestion_sources(base_product_ids=None, category_ids=None):
+    """
+    Fetch suggestion entries grouped by source. Products contribute their name and color names,
+    categories their name. Passing only one of the id lists skips the other kind of source.
+    """
+    sources = {}
+    if base_product_ids is not None or category_ids is None:
+        products_query = db.session.query(Products.base_product_id, Products.product_name)
+        colors_query = db.session.query(ProductColors.base_product_id, ProductColors.color_name)
+        if base_product_ids is not None:
+            products_query = products_query.filter(Products.base_product_id.in_(base_product_ids))
+            colors_query = colors_query.filter(ProductColors.base_product_id.in_(base_product_ids))
+            sources.update({('product', base_product_id): [] for base_product_id in base_product_ids})
+        for base_product_id, product_name in products_query:
+            sources[('product', base_product_id)] = [('product', product_name)]
+        for base_product_id, color_name in colors_query:
+            sources.setdefault(('product', base_product_id), []).append(('color', color_name))
+
+    if category_ids is not None or base_product_ids is None:
+        categories_query = db.session.query(Categories.category_id, Categories.category_name)
+        if category_ids is not None:
+            categories_query = categories_query.filter(Categories.category_id.in_(category_ids))
+            sources.update({('category', category_id): [] for category_id in category_ids})
+        for category_id, category_name in categories_query:
+            sources[('category', category_id)] = [('category', category_name)]
+    return sources
+
+
+def get_suggestion_index():
+    """Return the suggestion index, reloading it from the database when missing or stale."""
+    return _fresh_index(suggestion_index, _load_suggestion_sources)
+
+
+def refresh_product_listings(base_product_ids):
+    """Recompute the listing rows of the given products inside the current transaction."""
+    base_product_ids = list(set(base_product_ids))
+    if not base_product_ids:
+        return
+
+    db.session.flush()
+    rows, facet_rows = _build_listing_rows(base_product_ids)
+
+    # Products that no longer exist (or lost their category) drop out of the listing
+    _delete_listings(base_product_ids)
+    _insert_listings(rows, facet_rows)
+
+
+def rebuild_product_listings():
+    """Rebuild the whole Product_Listing table, e.g. after the table is first created."""
+    rows, facet_rows = _build_listing_rows()
+    ProductListingFacet.query.delete(synchronize_session=False)
+    ProductListing.query.delete(synchronize_session=False)
+    _insert_listings(rows, facet_rows)
+    db.session.commit()
+
+
+def _delete_listings(base_product_ids):
+    ProductListingFacet.query.filter(ProductListingFacet.base_product_id.in_(base_product_ids)).delete(synchronize_session=False)
+    ProductListing.query.filter(ProductListing.base_product_id.in_(base_product_ids)).delete(synchronize_session=False)
+
+
+def _insert_listings(rows, facet_rows):
+    if rows:
+        db.session.execute(ProductListing.__table__.insert(), rows)
+    if facet_rows:
+        db.session.execute(ProductListingFacet.__table__.insert(), facet_rows)
+
+
+def product_details_changed(base_product_ids):
+    """
+    Call before committing a change that only affects the product detail page
+    (stock levels, comment approval). Cached responses are evicted after the commit.
+    """
+    _pending_products(db.session()).update(base_product_ids)
+
+
+def product_stock_changed(base_product_ids):
+    """
+    Call before committing stock level changes. Besides the detail page, stock decides
+    which sizes the listing offers as in-stock facet values; those are refreshed right after the
+    commit, so checkouts do not lock or rewrite the listing rows of the products they buy.
+    """
+    _pending_stock_products(db.session()).update(base_product_ids)
+    product_details_changed(base_product_ids)
+
+
+def refresh_size_facets(connection, base_product_ids):
+    """
+    Bring the in-stock size facet rows of the given products in line with Product_Sizes, in place:
+    one DELETE of the sizes that ran out and one INSERT of the sizes back in stock. Both read the
+    stock committed when they run, so the refreshes of concurrent stock changes converge on the
+    latest stock instead of rewriting the listing rows.
+    """
+    facets = ProductListingFacet.__table__
+    sizes = ProductSizes.__table__
+    listings = ProductListing.__table__
+    in_stock = select(sizes.c.base_product_id).where(
+        sizes.c.base_product_id == facets.c.base_product_id,
+        sizes.c.size_name == facets.c.value,
+        sizes.c.product_stock > 0
+    ).exists()
+    connection.execute(facets.delete().where(
+        facets.c.facet == 'size', facets.c.base_product_id.in_(base_product_ids), ~in_stock
+    ))
+
+    listed = select(listings.c.base_product_id).where(listings.c.base_product_id == sizes.c.base_product_id).exists()
+    indexed = select(facets.c.base_product_id).where(
+        facets.c.base_product_id == sizes.c.base_product_id, facets.c.facet == 'size', facets.c.value == sizes.c.size_name
+    ).exists()
+    back_in_stock = select(
+        sizes.c.base_product_id, literal('size'), sizes.c.size_name
+    ).where(
+        sizes.c.base_product_id.in_(base_product_ids), sizes.c.product_stock > 0, listed, ~indexed
+    ).distinct()
+    make_insert = _INSERT_IGNORING_CONFLICTS.get(connection.dialect.name)
+    if make_insert is not None:
+        statement = make_insert(facets).from_select(['base_product_id', 'facet', 'value'], back_in_stock).on_conflict_do_nothing()
+    else:
+        statement = facets.insert().from_select(['base_product_id', 'facet', 'value'], back_in_stock)
+    connection.execute(statement)
+
+
+def products_changed(base_product_ids):
+    """
+    Call before committing any change to products, their colors, sizes or ratings.
+    Keeps the derived catalog data in the same transaction as the change.
+    """
+    refresh_product_listings(base_product_ids)
+    product_details_changed(base_product_ids)
+
+    documents = {base_product_id: [] for base_product_id in base_product_ids}
+    for document in _load_search_documents(list(documents)):
+        documents[document['base_product_id']].append(document)
+    _pending_search_documents(db.session()).update(documents)
+    _pending_suggestions(db.session()).update(_load_suggestion_sources(base_product_ids=list(documents)))
+
+
+def record_rating(product_id, rate, previous_rate=None):
+    """
+    Fold a new rating (or a changed one, given its previous value) into the product's stored
+    rating_count / rating_sum / average_rating. The counters are updated relative to their
+    current values in a single UPDATE, so concurrent ratings never overwrite each other.
+    Call before committing, together with product_changed().
+    """
+    count_delta = 0 if previous_rate is not None else 1
+    sum_delta = rate - (previous_rate or 0)
+    new_count = Products.rating_count + count_delta
+    new_sum = Products.rating_sum + sum_delta
+    db.session.execute(
+        update(Products).where(Products.base_product_id == product_id).values(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            average_rating=case((new_count > 0, func.round(cast(new_sum, Numeric(12, 2)) / new_count, 1)), else_=0)
+        )
+    )
+
+
+def backfill_rating_counters():
+    """Recompute the stored rating counters of every product from Product_Rating, e.g. after adding the columns."""
+    ratings = ProductRating.__table__
+    rated_product = ratings.c.product_id == Products.base_product_id
+    db.session.execute(
+        update(Products).values(
+            rating_count=select(func.count()).where(rated_product).scalar_subquery(),
+            rating_sum=select(func.coalesce(func.sum(ratings.c.customer_rate), 0)).where(rated_product).scalar_subquery(),
+            average_rating=select(
+                func.coalesce(func.round(cast(func.avg(ratings.c.customer_rate), Numeric(12, 2)), 1), 0)
+            ).where(rated_product).scalar_subquery()
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    db.session.commit()
+
+
+def product_changed(base_product_id):
+    """Single-product shorthand for products_changed()."""
+    products_changed([base_product_id])
+
+
+def products_deleted(base_product_ids):
+    """Call before committing the deletion of products."""
+    base_product_ids = list(set(base_product_ids))
+    product_details_changed(base_product_ids)
+    _pending_search_documents(db.session()).update({base_product_id: [] for base_product_id in base_product_ids})
+    _pending_suggestions(db.session()).update({('product', base_product_id): [] for base_product_id in base_product_ids})
+    if base_product_ids:
+        _delete_listings(base_product_ids)
+
+
+def category_changed(category_id):
+    """Call before committing the creation (or change) of a category."""
+    db.session.flush()
+    _pending_suggestions(db.session()).update(_load_suggestion_sources(category_ids=[category_id]))
+    _mark_categories_changed(db.session())
+
+
+def category_deleted(category_id):
+    """Call before committing the deletion of a category."""
+    _pending_suggestions(db.session())[('category', category_id)] = []
+    _mark_categories_changed(db.session())
+
+
+def get_categories():
+    """
+    Return (categories, etag) for the category list, reloading it when its version was bumped
+    or it is older than CATEGORY_CACHE_MAX_AGE. The ETag is a digest of the list, so every
+    process serving the same categories hands out the same validator.
+    """
+    with _category_cache_lock:
+        version = _category_cache["version"]
+        loaded_at = _category_cache["loaded_at"]
+        if (
+            _category_cache["loaded_version"] == version
+            and loaded_at is not None
+            and time.monotonic() - loaded_at <= CATEGORY_CACHE_MAX_AGE
+        ):
+            return _category_cache["categories"], _category_cache["etag"]
+
+    categories = [
+        {"category_id": category_id, "category_name": category_name, "category_gender": category_gender}
+        for category_id, category_name, category_gender in db.session.query(
+            Categories.category_id, Categories.category_name, Categories.category_gender
+        ).order_by(Categories.category_id)
+    ]
+    digest = hashlib.sha1(json.dumps(categories, sort_keys=True).encode('utf-8')).hexdigest()
+    etag = f"categories-{digest[:16]}"
+
+    with _category_cache_lock:
+        # A category change committed while loading leaves the version bumped, forcing another reload
+        if _category_cache["version"] == version:
+            _category_cache.update(loaded_version=version, loaded_at=time.monotonic(), categories=categories, etag=etag)
+    return categories, etag
@@ -0,0 +1,248 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from flask import current_app, send_file
+from backend.cache import LRUCache
+
+try:  # Pillow is optional: without it only the original uploads are served
+    from PIL import Image
+except ImportError:  # pragma: no cover
+    Image = None
+
+# Keys are "<sha256 of the content>.<extension>", so identical uploads share one blob
+_KEY_RE = re.compile(r"^[0-9a-f]{64}\.(png|jpg|gif|webp)$")
+
+_MIME_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+# Content-addressed blobs never change, so versioned URLs (?v=<key>) may be cached for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Unversioned URLs are revalidated with their ETag after this many seconds
+UNVERSIONED_MAX_AGE = 300
+
+# Renditions generated for every upload: size name -> longest edge in pixels
+DERIVATIVE_SIZES = {
+    'thumb': 240,
+    'medium': 640,
+    'full': 1280,
+}
+DERIVATIVE_QUALITY = 80
+
+# Derivatives are rendered off the request thread; uploads return as soon as the original is stored
+_derivative_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-derivatives')
+_pending_derivatives = {}  # original key -> future, so an image is never rendered twice concurrently
+_pending_lock = threading.RLock()
+# Originals whose derivatives could not be rendered. Keys name immutable content, so the failure is
+# remembered and those images are served as originals instead of being decoded again on every request.
+_failed_derivatives = LRUCache(maxsize=8192)
+
+
+def detect_image_type(data):
+    """Guess the image extension from its magic bytes (defaults to png, like the old endpoint)."""
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpg'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return 'png'
+
+
+def content_key(data):
+    """Content-addressed key for image bytes."""
+    return f"{hashlib.sha256(data).hexdigest()}.{detect_image_type(data)}"
+
+
+def is_image_key(value):
+    """Whether a Product_Colors.product_image value references the image store (vs. legacy inline bytes)."""
+    return isinstance(value, str) and bool(_KEY_RE.match(value))
+
+
+def derivative_key(key, size):
+    """Store key of the `size` rendition of an original image key: "<sha256 of the original>_<size>.webp"."""
+    return f"{key.split('.', 1)[0]}_{size}.webp"
+
+
+def mimetype_for_key(key):
+    return _MIME_TYPES.get(key.rsplit('.', 1)[-1], 'application/octet-stream')
+
+
+class ImageStore(ABC):
+    """Interface of the pluggable image blob stores."""
+
+    @abstractmethod
+    def put(self, data, key=None):
+        """Store bytes and return their key. `key` defaults to the content hash."""
+
+    @abstractmethod
+    def exists(self, key):
+        """Whether a blob is stored under `key`."""
+
+    @abstractmethod
+    def get(self, key):
+        """Return the stored bytes, or None."""
+
+    @abstractmethod
+    def send(self, key, max_age):
+        """Build a conditional (ETag / If-None-Match / Range aware) response for a stored blob."""
+
+
+class FileSystemImageStore(ImageStore):
+    """Stores blobs as files under root/ab/cd/<key>, served with sendfile and range support."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, data, key=None):
+        key = key or content_key(data)
+        path = self.path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        return key
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def send(self, key, max_age):
+        return send_file(
+            self.path(key),
+            mimetype=mimetype_for_key(key),
+            conditional=True,
+            etag=key,
+            max_age=max_age
+        )
+
+
+class MemoryImageStore(ImageStore):
+    """In-process store, for tests and single-process development servers."""
+
+    def __init__(self):
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, data, key=None):
+        key = key or content_key(data)
+        with self._lock:
+            self._blobs.setdefault(key, bytes(data))
+        return key
+
+    def exists(self, key):
+        return key in self._blobs
+
+    def get(self, key):
+        return self._blobs.get(key)
+
+    def send(self, key, max_age):
+        return send_file(
+            BytesIO(self._blobs[key]),
+            mimetype=mimetype_for_key(key),
+            conditional=True,
+            etag=key,
+            max_age=max_age,
+            download_name=key
+        )
+
+
+def get_image_store():
+    """
+    Return the image store of the current app, configured by IMAGE_STORE
+    ('filesystem' or 'memory') and IMAGE_STORE_PATH.
+    """
+    store = current_app.extensions.get('image_store')
+    if store is None:
+        if current_app.config.get('IMAGE_STORE', 'filesystem') == 'memory':
+            store = MemoryImageStore()
+        else:
+            root = current_app.config.get('IMAGE_STORE_PATH') or os.path.join(os.path.dirname(__file__), 'image_store')
+            store = FileSystemImageStore(root)
+        current_app.extensions['image_store'] = store
+    return store
+
+
+def render_derivatives(data):
+    """
+    Render every DERIVATIVE_SIZES rendition of an image as WebP.
+    Returns {size: bytes}; empty when Pillow is missing or the bytes are not a readable image.
+    Images are only ever scaled down, so small uploads keep their dimensions.
+    """
+    if Image is None:
+        return {}
+    try:
+        with Image.open(BytesIO(data)) as source:
+            source.load()
+            mode = 'RGBA' if source.mode in ('RGBA', 'LA', 'P') else 'RGB'
+            source = source.convert(mode)
+            derivatives = {}
+            for size, edge in DERIVATIVE_SIZES.items():
+                rendition = source.copy()
+                rendition.thumbnail((edge, edge), Image.LANCZOS)
+                out = BytesIO()
+                rendition.save(out, format='WEBP', quality=DERIVATIVE_QUALITY, method=4)
+                derivatives[size] = out.getvalue()
+            return derivatives
+    except Exception as e:
+        print(f"Failed to render image derivatives: {e}")
+        return {}
+
+
+def generate_derivatives(store, key, data=None):
+    """Render and store the derivatives of an original image. Returns the stored derivative keys."""
+    if Image is None:
+        return []
+    if data is None:
+        data = store.get(key)
+    renditions = render_derivatives(data) if data is not None else {}
+    if not renditions:
+        _failed_derivatives.set(key, True)
+        return []
+    return [store.put(rendition, key=derivative_key(key, size)) for size, rendition in renditions.items()]
+
+
+def derivatives_failed(key):
+    """True when the derivatives of an original cannot be rendered (no Pillow, or unreadable image)."""
+    return Image is None or key in _failed_derivatives
+
+
+def schedule_derivatives(store, key, data=None):
+    """
+    Queue derivative generation on the background pool and return its future, or None when the
+    derivatives of this original cannot be rendered.
+    """
+    if derivatives_failed(key):
+        return None
+    with _pending_lock:
+        future = _pending_derivatives.get(key)
+        if future is None:
+            future = _derivative_executor.submit(generate_derivatives, store, key, data)
+            _pending_derivatives[key] = future
+            future.add_done_callback(lambda _: _forget_pending(key))
+    return future
+
+
+def _forget_pending(key):
+    with _pending_lock:
+        _pending_derivatives.pop(key, None)
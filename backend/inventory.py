@@ -0,0 +1,115 @@
+from sqlalchemy import update, tuple_, values, column, bindparam, BigInteger, String
+from backend.models import db, ProductSizes
+
+STOCK_CHUNK_SIZE = 1000  # SKUs per set_stock_levels() call in bulk stock updates
+
+
+class InsufficientStock(Exception):
+    """Raised when a SKU cannot cover the requested quantity. The caller must roll back."""
+
+    def __init__(self, base_product_id, color_name, size_name, requested):
+        super().__init__(
+            f"Insufficient stock for product {base_product_id} (Color: {color_name}, Size: {size_name})"
+        )
+        self.base_product_id = base_product_id
+        self.color_name = color_name
+        self.size_name = size_name
+        self.requested = requested
+
+
+def sku_quantities(lines):
+    """Sum (base_product_id, color_name, size_name, quantity) tuples into {sku: quantity}."""
+    quantities = {}
+    for base_product_id, color_name, size_name, quantity in lines:
+        key = (base_product_id, color_name, size_name)
+        quantities[key] = quantities.get(key, 0) + quantity
+    return quantities
+
+
+def reserve_stock(quantities):
+    """
+    Atomically take {(base_product_id, color_name, size_name): quantity} out of Product_Sizes
+    in the current transaction.
+
+    Each SKU is decremented with a conditional UPDATE (stock = stock - q WHERE stock >= q), so the
+    check and the decrement cannot be separated by a concurrent checkout and stock never goes
+    negative. SKUs are updated in sorted key order: concurrent reservations lock rows in the same
+    order and cannot deadlock each other. Raises InsufficientStock on the first SKU that cannot be
+    covered; updates already made in the transaction must then be rolled back by the caller.
+    """
+    for key in sorted(quantities):
+        base_product_id, color_name, size_name = key
+        quantity = quantities[key]
+        result = db.session.execute(
+            update(ProductSizes).where(
+                ProductSizes.base_product_id == base_product_id,
+                ProductSizes.color_name == color_name,
+                ProductSizes.size_name == size_name,
+                ProductSizes.product_stock >= quantity
+            ).values(
+                product_stock=ProductSizes.product_stock - quantity
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            raise InsufficientStock(base_product_id, color_name, size_name, quantity)
+
+
+
+def set_stock_levels(levels):
+    """
+    Set absolute stock levels {(base_product_id, color_name, size_name): stock} in the current
+    transaction and return {sku: previous stock} for the SKUs that exist (unknown SKUs are left out).
+
+    The current levels are read, and locked, with one query in sorted key order like reserve_stock.
+    Changed SKUs are then written with a single UPDATE ... FROM (VALUES ...) on PostgreSQL, or one
+    executemany UPDATE elsewhere. Callers pass chunks of at most STOCK_CHUNK_SIZE SKUs and commit.
+    """
+    if not levels:
+        return {}
+    key_columns = (ProductSizes.base_product_id, ProductSizes.color_name, ProductSizes.size_name)
+    previous = {
+        (base_product_id, color_name, size_name): stock
+        for base_product_id, color_name, size_name, stock in db.session.query(
+            *key_columns, ProductSizes.product_stock
+        ).filter(
+            tuple_(*key_columns).in_(list(levels))
+        ).order_by(*key_columns).with_for_update()
+    }
+    changes = [
+        key + (stock,)
+        for key, stock in sorted(levels.items())
+        if key in previous and previous[key] != stock
+    ]
+    if not changes:
+        return previous
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        new_levels = values(
+            column('base_product_id', BigInteger),
+            column('color_name', String),
+            column('size_name', String),
+            column('product_stock', BigInteger),
+            name='new_levels'
+        ).data(changes)
+        db.session.execute(
+            update(ProductSizes).where(
+                ProductSizes.base_product_id == new_levels.c.base_product_id,
+                ProductSizes.color_name == new_levels.c.color_name,
+                ProductSizes.size_name == new_levels.c.size_name
+            ).values(
+                product_stock=new_levels.c.product_stock
+            ).execution_options(synchronize_session=False)
+        )
+    else:
+        db.session.execute(
+            update(ProductSizes.__table__).where(
+                ProductSizes.base_product_id == bindparam('b_base_product_id'),
+                ProductSizes.color_name == bindparam('b_color_name'),
+                ProductSizes.size_name == bindparam('b_size_name')
+            ).values(product_stock=bindparam('b_product_stock')),
+            [
+                {"b_base_product_id": base_product_id, "b_color_name": color_name, "b_size_name": size_name, "b_product_stock": stock}
+                for base_product_id, color_name, size_name, stock in changes
+            ]
+        )
+    return previous
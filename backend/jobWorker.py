@@ -0,0 +1,23 @@
+"""
+Dedicated background job worker process: `python -m backend.jobWorker`.
+
+Importing backend.app registers every job handler and creates the app; this process then runs the
+app's worker threads (JOB_WORKERS, at least 2 here even when the web processes set it to 0) until
+it is stopped.
+"""
+import threading
+from backend.app import app
+from backend.jobs import ensure_job_workers
+from backend.models import db
+
+
+def main():
+    app.config['JOB_WORKERS'] = app.config.get('JOB_WORKERS') or 2
+    with app.app_context():
+        db.create_all()
+    ensure_job_workers(app)
+    threading.Event().wait()
+
+
+if __name__ == '__main__':
+    main()
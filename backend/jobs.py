@@ -0,0 +1,252 @@
+"""
+Durable background jobs stored in the Background_Job table.
+
+Request handlers enqueue a job in their own transaction and return; worker threads claim due jobs
+with a conditional UPDATE (so several processes can share the table without a broker), run the
+registered handler and retry failures with exponential backoff.
+
+Workers run inside every process that creates the app (backend.app starts JOB_WORKERS threads)
+or in a dedicated process with `python -m backend.jobWorker`.
+"""
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import and_, event, or_, update
+from sqlalchemy.orm import Session
+from backend.models import db, BackgroundJob
+
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_BASE = 10  # seconds before the first retry; doubled for every further attempt
+JOB_BACKOFF_MAX = 3600
+JOB_LEASE_SECONDS = 900  # A running job whose worker went silent this long is handed to another worker
+JOB_POLL_INTERVAL = 2  # seconds between polls when idle and not woken up by a local enqueue
+
+_handlers = {}
+_wakeup = threading.Event()
+_started_apps = set()
+_start_lock = threading.Lock()
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def job_handler(job_type):
+    """Register `func(payload, job)` as the handler of a job type. Raising marks the attempt as failed."""
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+
+def enqueue_job(job_type, payload, customer_id=None, max_attempts=JOB_MAX_ATTEMPTS):
+    """
+    Add a job to the current transaction and return it. Workers see it once the caller commits.
+    Payloads must be JSON serializable and must not contain credentials.
+    """
+    job = BackgroundJob(
+        job_type=job_type,
+        payload=payload,
+        customer_id=customer_id,
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=utcnow()
+    )
+    db.session.add(job)
+    db.session.flush()
+    db.session.info['jobs_enqueued'] = True
+    ensure_job_workers(current_app._get_current_object())
+    return job
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('jobs_enqueued', False):
+        _wakeup.set()
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_enqueued(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('jobs_enqueued', None)
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a job that failed `attempts` times (with +-20% jitter)."""
+    delay = min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _lease_expired(now):
+    return and_(BackgroundJob.status == 'running', BackgroundJob.locked_at < now - timedelta(seconds=JOB_LEASE_SECONDS))
+
+
+def _claimable(now):
+    """
+    Jobs that are due, or running under an expired lease with attempts left. A job whose worker
+    died (crashed or killed while running it) counts that run as an attempt like any failure.
+    """
+    return or_(
+        and_(BackgroundJob.status == 'queued', BackgroundJob.run_after <= now),
+        and_(_lease_expired(now), BackgroundJob.attempts < BackgroundJob.max_attempts)
+    )
+
+
+def _fail_abandoned_jobs(now):
+    """Mark jobs whose worker died on their last attempt as failed instead of leaving them running."""
+    db.session.execute(
+        update(BackgroundJob).where(
+            _lease_expired(now), BackgroundJob.attempts >= BackgroundJob.max_attempts
+        ).values(
+            status='failed',
+            finished_at=now,
+            locked_by=None,
+            locked_at=None,
+            last_error="Worker lost: the job's lease expired on its last attempt"
+        ).execution_options(synchronize_session=False)
+    )
+
+
+def claim_next_job(worker_id):
+    """Atomically take the next due job for this worker and return its id, or None."""
+    now = utcnow()
+    _fail_abandoned_jobs(now)
+    candidates = [
+        job_id for (job_id,) in db.session.query(BackgroundJob.job_id).filter(
+            _claimable(now)
+        ).order_by(BackgroundJob.run_after, BackgroundJob.job_id).limit(10)
+    ]
+    for job_id in candidates:
+        # Only one worker can move a given row out of the claimable state
+        result = db.session.execute(
+            update(BackgroundJob).where(
+                BackgroundJob.job_id == job_id, _claimable(now)
+            ).values(
+                status='running',
+                locked_by=worker_id,
+                locked_at=now,
+                attempts=BackgroundJob.attempts + 1
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            db.session.commit()
+            return job_id
+    db.session.commit()
+    return None
+
+
+def run_job(job_id):
+    """Run a claimed job and record its outcome; failures are rescheduled until max_attempts."""
+    job = db.session.get(BackgroundJob, job_id, populate_existing=True)
+    handler = _handlers.get(job.job_type)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job type '{job.job_type}'")
+        handler(job.payload, job)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(BackgroundJob, job_id, populate_existing=True)
+        job.last_error = f"{type(e).__name__}: {e}"[:2000]
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = utcnow()
+        else:
+            job.status = 'queued'
+            job.run_after = utcnow() + timedelta(seconds=retry_delay(job.attempts))
+        db.session.commit()
+        print(f"Job {job_id} ({job.job_type}) failed on attempt {job.attempts}: {job.last_error}")
+        return False
+
+    job = db.session.get(BackgroundJob, job_id, populate_existing=True)
+    job.status = 'succeeded'
+    job.finished_at = utcnow()
+    job.last_error = None
+    job.locked_by = None
+    job.locked_at = None
+    db.session.commit()
+    return True
+
+
+def record_progress(job, **progress):
+    """
+    Merge counters into a running job's progress in the current transaction, without committing, so
+    the progress commits atomically with the work it describes. Also renews the job's lease.
+    """
+    job.progress = dict(job.progress or {}, **progress)
+    job.locked_at = utcnow()
+
+
+def report_progress(job, **progress):
+    """
+    Merge counters into a running job's progress and commit them so the status endpoint sees them.
+    Also renews the job's lease, so long jobs reporting progress are not handed to another worker.
+    """
+    record_progress(job, **progress)
+    db.session.commit()
+
+
+def run_pending_jobs(worker_id='inline', limit=None):
+    """Claim and run due jobs until none is left (or `limit` ran). Returns how many ran."""
+    processed = 0
+    while limit is None or processed < limit:
+        job_id = claim_next_job(worker_id)
+        if job_id is None:
+            break
+        run_job(job_id)
+        processed += 1
+    return processed
+
+
+def _worker_loop(app, worker_id):
+    while True:
+        processed = 0
+        with app.app_context():
+            try:
+                processed = run_pending_jobs(worker_id)
+            except Exception:
+                traceback.print_exc()
+                db.session.rollback()
+            finally:
+                db.session.remove()
+        if not processed:
+            _wakeup.wait(JOB_POLL_INTERVAL)
+            _wakeup.clear()
+
+
+def ensure_job_workers(app):
+    """Start the app's worker threads (JOB_WORKERS, default 2; 0 disables them) once per process."""
+    count = app.config.get('JOB_WORKERS', 2)
+    if not count:
+        return
+    with _start_lock:
+        if id(app) in _started_apps:
+            return
+        _started_apps.add(id(app))
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for index in range(count):
+            threading.Thread(
+                target=_worker_loop, args=(app, f"{prefix}:{index}"), name=f"job-worker-{index}", daemon=True
+            ).start()
+
+
+def job_to_dict(job):
+    """Public status of a job (the payload is not exposed)."""
+    return {
+        "job_id": job.job_id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "progress": job.progress,
+        "last_error": job.last_error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
@@ -0,0 +1,212 @@
+"""
+Outgoing mail transports.
+
+SMTPTransport keeps a bounded pool of logged-in SMTP connections that are reused across messages,
+so a batch of notifications costs one TLS handshake per pooled connection instead of one per
+message. MaildirTransport and MemoryTransport are drop-in local sinks for development and tests.
+"""
+import mailbox
+import queue
+import smtplib
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` acquisitions per second with bursts of `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class MailTransport(ABC):
+    """Interface of the mail transports."""
+
+    @abstractmethod
+    def send(self, message):
+        """Deliver one email.message.Message (From/To taken from its headers). Raises on failure."""
+
+    def send_many(self, messages):
+        """
+        Deliver a batch of messages. Never raises for individual messages: returns a list
+        aligned with `messages` holding None for delivered messages and the exception otherwise.
+        """
+        return [self._try_send(message) for message in messages]
+
+    def _try_send(self, message):
+        try:
+            self.send(message)
+        except Exception as e:
+            return e
+        return None
+
+    def close(self):
+        pass
+
+
+class SMTPTransport(MailTransport):
+    """
+    SMTP(S) transport with a bounded pool of authenticated connections.
+
+    Connections are created on demand up to `pool_size`, returned to the pool after each message
+    and checked with NOOP when they sat idle for a while. A connection dropped by the server is
+    replaced and the message retried once. `rate_limit` caps messages per second across the pool.
+    """
+
+    IDLE_CHECK_SECONDS = 30
+
+    def __init__(self, host, port, username=None, password=None, use_ssl=True, pool_size=4, rate_limit=None, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self._idle = queue.LifoQueue()  # (connection, last used) - most recently used first
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self):
+        if self.use_ssl:
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def _checkout(self):
+        """Take an idle connection (or open a new one); the caller holds a pool slot."""
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.IDLE_CHECK_SECONDS:
+                return connection
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except OSError:  # includes smtplib.SMTPException
+                pass
+            self._quit(connection)
+
+    @staticmethod
+    def _quit(connection):
+        try:
+            connection.quit()
+        except Exception:
+            pass
+
+    def send(self, message):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        with self._slots:
+            connection = self._checkout()
+            try:
+                try:
+                    connection.send_message(message)
+                except smtplib.SMTPServerDisconnected:
+                    # The server closed an idle connection: reconnect and retry once
+                    self._quit(connection)
+                    connection = self._connect()
+                    connection.send_message(message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+                # The server rejected this message but the session is still usable (smtplib sent RSET)
+                self._idle.put((connection, time.monotonic()))
+                raise
+            except Exception:
+                self._quit(connection)
+                raise
+            self._idle.put((connection, time.monotonic()))
+
+    def send_many(self, messages):
+        """Send a batch over up to pool_size connections in parallel."""
+        messages = list(messages)
+        if len(messages) <= 1:
+            return super().send_many(messages)
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(messages))) as pool:
+            return list(pool.map(self._try_send, messages))
+
+    def close(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(connection)
+
+
+class MaildirTransport(MailTransport):
+    """Delivers every message into a local Maildir, for development without a mail server."""
+
+    def __init__(self, path):
+        self.maildir = mailbox.Maildir(path, create=True)
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.maildir.add(message)
+
+
+class MemoryTransport(MailTransport):
+    """Keeps sent messages in `outbox`, for tests."""
+
+    def __init__(self):
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.outbox.append(message)
+
+
+def get_mail_transport(sender_email=None, sender_password=None):
+    """
+    Return the mail transport of the current app, configured by MAIL_TRANSPORT ('smtp', 'maildir'
+    or 'memory'). SMTP transports are pooled per sender account; MAIL_SMTP_HOST, MAIL_SMTP_PORT,
+    MAIL_POOL_SIZE and MAIL_RATE_LIMIT (messages per second) tune them.
+    """
+    config = current_app.config
+    kind = config.get('MAIL_TRANSPORT', 'smtp')
+    transports = current_app.extensions.setdefault('mail_transports', {})
+    key = (kind, sender_email) if kind == 'smtp' else (kind,)
+    transport = transports.get(key)
+    if transport is None:
+        if kind == 'memory':
+            transport = MemoryTransport()
+        elif kind == 'maildir':
+            transport = MaildirTransport(config.get('MAIL_MAILDIR_PATH', 'maildir'))
+        else:
+            transport = SMTPTransport(
+                config.get('MAIL_SMTP_HOST', 'smtp.gmail.com'),
+                config.get('MAIL_SMTP_PORT', 465),
+                username=sender_email,
+                password=sender_password,
+                pool_size=config.get('MAIL_POOL_SIZE', 4),
+                rate_limit=config.get('MAIL_RATE_LIMIT')
+            )
+        transport = transports.setdefault(key, transport)
+    return transport
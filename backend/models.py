@@ -30,10 +30,12 @@ class Products(db.Model):
     model = db.Column(db.BigInteger, nullable=False)
     serial_number = db.Column(db.BigInteger, nullable=False)
     price = db.Column(db.BigInteger, nullable=False)
-    average_rating = db.Column(db.Numeric(2, 1), default=0)
+    average_rating = db.Column(db.Numeric(2, 1), default=0)  # rating_sum / rating_count, maintained on every rating
     warranty_status = db.Column(db.BigInteger, nullable=False)
     discount_percentage = db.Column(db.Numeric(5, 2), default=0.00)
     distributor = db.Column(db.String(255), nullable=False)
+    rating_count = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
 
 # Product Colors model
 class ProductColors(db.Model):
@@ -63,6 +65,44 @@ class ProductSizes(db.Model):
         ),
     )
 
+# Product Listing model (one row per base product, maintained by backend.catalogSync)
+class ProductListing(db.Model):
+    __tablename__ = 'Product_Listing'
+    base_product_id = db.Column(db.BigInteger, db.ForeignKey('Products.base_product_id', ondelete='CASCADE'), primary_key=True, nullable=False)
+    category_id = db.Column(db.BigInteger, nullable=False)
+    product_name = db.Column(db.String(255), nullable=False)
+    price = db.Column(db.BigInteger, nullable=False)
+    discount_percentage = db.Column(db.Numeric(5, 2), default=0.00)
+    average_rating = db.Column(db.Numeric(2, 1), default=0)
+    distributor = db.Column(db.String(255), nullable=False)
+    category_name = db.Column(db.String(255), nullable=False)
+    category_gender = db.Column(db.String(255), nullable=False)
+    colors = db.Column(db.JSON, nullable=False, default=list)  # Distinct color names
+    sizes = db.Column(db.JSON, nullable=False, default=list)  # Distinct size names across all colors
+    popularity = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    image_url = db.Column(db.String(500), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_Product_Listing_category_id', 'category_id'),
+        db.Index('ix_Product_Listing_category_gender', 'category_gender'),
+        # Keyset pagination indexes: (sort column, base_product_id)
+        db.Index('ix_Product_Listing_price', 'price', 'base_product_id'),
+        db.Index('ix_Product_Listing_discount', 'discount_percentage', 'base_product_id'),
+        db.Index('ix_Product_Listing_popularity', 'popularity', 'base_product_id'),
+    )
+
+# Facet values of each listed product (color, in-stock size, distributor and price / discount / rating buckets),
+# maintained together with Product_Listing. Filters and facet counts of the catalog listing are answered from here.
+class ProductListingFacet(db.Model):
+    __tablename__ = 'Product_Listing_Facet'
+    base_product_id = db.Column(db.BigInteger, db.ForeignKey('Product_Listing.base_product_id', ondelete='CASCADE'), primary_key=True, nullable=False)
+    facet = db.Column(db.String(50), primary_key=True, nullable=False)
+    value = db.Column(db.String(255), primary_key=True, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_Product_Listing_Facet_value', 'facet', 'value', 'base_product_id'),
+    )
+
 # Wishlist Item model
 class WishlistItem(db.Model):
     __tablename__ = 'Wishlist_Item'
@@ -174,6 +214,10 @@ class InvoiceItem(db.Model):
     delivery_status = db.Column(db.SmallInteger, nullable=False)
 
     __table_args__ = (
+        # Admin order queues: one delivery status range, most recent first
+        db.Index('ix_Invoice_Item_delivery_status_purchased_date', 'delivery_status', 'purchased_date', 'invoice_item_id'),
+        # Sales rollup compaction and its live tail: one purchase date range
+        db.Index('ix_Invoice_Item_purchased_date', 'purchased_date'),
         ForeignKeyConstraint(
             ['base_product_id'],
             ['Products.base_product_id'],
@@ -190,3 +234,84 @@ class InvoiceItem(db.Model):
             ondelete='SET NULL'
         ),
     )
+
+# Durable background jobs (invoice emails, notifications), claimed and run by the backend.jobs workers
+class BackgroundJob(db.Model):
+    __tablename__ = 'Background_Job'
+    job_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True, nullable=False)
+    job_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    customer_id = db.Column(db.BigInteger, nullable=True)  # Customer allowed to see the job status, if any
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime(timezone=True), nullable=False)
+    locked_by = db.Column(db.String(255), nullable=True)
+    locked_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    progress = db.Column(db.JSON, nullable=True)  # Reported by the job handler, e.g. {"sent": 10, "failed": 0}
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp(), nullable=False)
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_Background_Job_status_run_after', 'status', 'run_after'),
+    )
+
+# Products of a background catalog import waiting for its 'catalog_import' job (backend.catalogImport);
+# the rows of each chunk are deleted in the transaction that imports them
+class CatalogImportRow(db.Model):
+    __tablename__ = 'Catalog_Import_Row'
+    job_id = db.Column(db.BigInteger, db.ForeignKey('Background_Job.job_id', ondelete='CASCADE'), primary_key=True, nullable=False)
+    row_number = db.Column(db.Integer, primary_key=True, nullable=False)
+    data = db.Column(db.JSON, nullable=False)  # The product as sent, validated by the job
+
+# Effective (discounted) price changes made through the sales manager price and discount updates,
+# consumed by the price drop detector in backend.priceDrops
+class PriceChangeLog(db.Model):
+    __tablename__ = 'Price_Change_Log'
+    change_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True, nullable=False)
+    base_product_id = db.Column(db.BigInteger, nullable=False)
+    old_price = db.Column(db.Numeric(10, 2), nullable=False)
+    new_price = db.Column(db.Numeric(10, 2), nullable=False)
+    changed_at = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp(), nullable=False)
+    processed_at = db.Column(db.DateTime(timezone=True), nullable=True)  # Set once the detector handled the change
+
+    __table_args__ = (
+        db.Index('ix_Price_Change_Log_processed_at_change_id', 'processed_at', 'change_id'),
+    )
+
+# Price drop emails already sent: one per wishlisted variant and notified price
+class PriceDropNotification(db.Model):
+    __tablename__ = 'Price_Drop_Notification'
+    customer_id = db.Column(db.BigInteger, db.ForeignKey('Customer.customer_id', ondelete='CASCADE'), primary_key=True, nullable=False)
+    base_product_id = db.Column(db.BigInteger, db.ForeignKey('Products.base_product_id', ondelete='CASCADE'), primary_key=True, nullable=False)
+    color_name = db.Column(db.String(50), primary_key=True, nullable=False)
+    size_name = db.Column(db.String(50), primary_key=True, nullable=False)
+    notified_price = db.Column(db.Numeric(10, 2), primary_key=True, nullable=False)
+    sent_at = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp(), nullable=False)
+
+# Revoked (logged out) JWTs by SHA-256 digest, checked by backend.auth until the token expires
+class RevokedToken(db.Model):
+    __tablename__ = 'Revoked_Token'
+    token_digest = db.Column(db.String(64), primary_key=True, nullable=False)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=True)  # None for tokens without an exp claim
+    revoked_at = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp(), nullable=False)
+
+# Gross sales per hour and per day (UTC) by total, category and product, compacted from Invoice_Item
+# by backend.salesRollup
+class SalesRollup(db.Model):
+    __tablename__ = 'Sales_Rollup'
+    granularity = db.Column(db.String(4), primary_key=True, nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime(timezone=True), primary_key=True, nullable=False)
+    dimension = db.Column(db.String(10), primary_key=True, nullable=False)  # 'total', 'category' or 'product'
+    dimension_id = db.Column(db.BigInteger, primary_key=True, nullable=False)  # 0 for totals and deleted products
+    revenue = db.Column(db.Numeric(14, 2), nullable=False)
+    units = db.Column(db.BigInteger, nullable=False)
+    item_count = db.Column(db.BigInteger, nullable=False)  # Invoice_Item rows
+    order_count = db.Column(db.BigInteger, nullable=False)  # Checkouts (customer and purchase minute)
+
+# How far Invoice_Item has been compacted into Sales_Rollup (a single row)
+class SalesRollupState(db.Model):
+    __tablename__ = 'Sales_Rollup_State'
+    state_id = db.Column(db.SmallInteger, primary_key=True, nullable=False)
+    compacted_until = db.Column(db.DateTime(timezone=True), nullable=True)  # Items purchased before this are rolled up
@@ -0,0 +1,33 @@
+import base64
+import json
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(*values):
+    """Encode the sort key of the last returned row into an opaque cursor string."""
+    raw = json.dumps(list(values), default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor(). Raises ValueError for malformed cursors."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_filter(columns, values, descending=False):
+    """
+    Build the WHERE clause selecting rows strictly after `values` in (columns...) order.
+    All columns are assumed to be sorted in the same direction and to be NOT NULL.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        after = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal_prefix, after))
+    return or_(*clauses)
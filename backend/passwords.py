@@ -0,0 +1,134 @@
+"""
+Password hashing for customer and manager accounts.
+
+Hashes use werkzeug's format ("<method>$<salt>$<hash>"), so existing hashes keep verifying. The
+method and its cost come from the app config:
+
+    PASSWORD_HASH_METHOD       werkzeug method string, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'
+    PASSWORD_SALT_LENGTH       salt characters (default 16)
+    PASSWORD_HASH_WORKERS      threads hashing and checking passwords (default: CPU count)
+    PASSWORD_HASH_QUEUE_SIZE   hash operations allowed to wait for a worker (default: 8 per worker)
+
+A successful login whose stored hash uses another method or cost is re-hashed with the current
+setting. Hashing runs in a bounded executor: at most PASSWORD_HASH_WORKERS hashes run at once and
+requests beyond the queue size fail fast with PasswordHashingBusy instead of piling up, so a burst
+of logins cannot take every request thread and CPU core.
+
+`python -m backend.benchmarks.password_hashing` reports hashes per second for candidate settings.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+DEFAULT_PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'  # werkzeug's default 'scrypt'
+DEFAULT_SALT_LENGTH = 16
+PASSWORD_HASH_TIMEOUT = 30  # seconds a request waits for its hash operation
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+_dummy_hashes = {}
+
+
+class PasswordHashingBusy(Exception):
+    """Too many password hash operations are already queued."""
+
+
+def normalize_method(method):
+    """Spell out werkzeug's implicit parameters, e.g. 'pbkdf2' -> 'pbkdf2:sha256:1000000'."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        return 'scrypt:' + ':'.join(args) if args else 'scrypt:32768:8:1'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f"Unsupported password hash method '{method}'")
+
+
+def current_method():
+    return normalize_method(current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_PASSWORD_HASH_METHOD))
+
+
+def hash_password(password, method=None, salt_length=None):
+    """Hash a password with `method` (default: the configured method)."""
+    return generate_password_hash(
+        password,
+        method=method or current_method(),
+        salt_length=salt_length or current_app.config.get('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+    )
+
+
+def needs_rehash(password_hash, method=None):
+    """True when a stored hash was made with another method or cost than `method`."""
+    stored_method = password_hash.split('$', 1)[0]
+    try:
+        return normalize_method(stored_method) != (method or current_method())
+    except ValueError:
+        return True
+
+
+def _get_executor():
+    global _executor, _slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = current_app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 2
+                queue_size = current_app.config.get('PASSWORD_HASH_QUEUE_SIZE', workers * 8)
+                _slots = threading.BoundedSemaphore(workers + queue_size)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _executor
+
+
+def run_bounded(func, *args):
+    """Run a hashing function on the password executor and wait for its result."""
+    executor = _get_executor()
+    if not _slots.acquire(blocking=False):
+        raise PasswordHashingBusy()
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+
+
+def _dummy_hash(method, salt_length):
+    """A hash of a random password, checked for unknown accounts so they take as long as known ones."""
+    key = (method, salt_length)
+    if key not in _dummy_hashes:
+        _dummy_hashes[key] = generate_password_hash(os.urandom(16).hex(), method=method, salt_length=salt_length)
+    return _dummy_hashes[key]
+
+
+def _check_and_upgrade(password_hash, password, method, salt_length, upgrade):
+    if password_hash is None:
+        check_password_hash(_dummy_hash(method, salt_length), password)
+        return False, None
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if upgrade and needs_rehash(password_hash, method):
+        return True, generate_password_hash(password, method=method, salt_length=salt_length)
+    return True, None
+
+
+def verify_password(password_hash, password, upgrade=True):
+    """
+    Check a login password on the bounded executor. `password_hash` is None for unknown accounts.
+    Returns (valid, new_hash); with `upgrade`, new_hash is set when the stored hash should be
+    replaced with it.
+    Raises PasswordHashingBusy when too many checks are queued.
+    """
+    method = current_method()
+    salt_length = current_app.config.get('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+    return run_bounded(_check_and_upgrade, password_hash, password or '', method, salt_length, upgrade)
+
+
+def hash_password_bounded(password):
+    """hash_password on the bounded executor (registration, password changes)."""
+    method = current_method()
+    salt_length = current_app.config.get('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+    return run_bounded(hash_password, password, method, salt_length)
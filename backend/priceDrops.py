@@ -0,0 +1,184 @@
+"""
+Incremental wishlist price drop notifications.
+
+Price and discount updates append a Price_Change_Log row in their own transaction and queue a
+'price_drop_detection' job. The job consumes the unprocessed changes, looks only at the wishlist
+rows of the products whose effective price dropped, and records every email it sent in
+Price_Drop_Notification so a customer is never told twice about the same price of a variant.
+It is the only sender of wishlist price and discount emails: one email per customer and product,
+however many variants of the product the customer wished for.
+The work done grows with the number of price changes, not with the size of all wishlists.
+"""
+from datetime import datetime, timezone
+from itertools import groupby
+from flask import current_app
+from sqlalchemy import and_, case, update
+from backend.models import db, Products, Customer, WishlistItem, BackgroundJob, PriceChangeLog, PriceDropNotification
+from backend.jobs import enqueue_job, job_handler, report_progress
+from backend.sendMail import build_price_drop_email, send_batch
+
+PRICE_CHANGE_BATCH_SIZE = 500  # Log rows consumed per detector pass
+PRICE_DROP_SEND_BATCH_SIZE = 100  # Emails rendered and sent per batch
+
+
+def record_price_change(product, old_price, new_price):
+    """
+    Log a change of a product's effective price in the current transaction. Drops also queue a
+    detection job unless one is already waiting, which will pick up this change as well.
+    Returns the detection job that will notify the wishlists, or None when the price did not drop.
+    """
+    old_price, new_price = round(float(old_price), 2), round(float(new_price), 2)
+    if old_price == new_price:
+        return None
+    db.session.add(PriceChangeLog(base_product_id=product.base_product_id, old_price=old_price, new_price=new_price))
+    if new_price > old_price:
+        return None
+    waiting = BackgroundJob.query.filter_by(
+        job_type='price_drop_detection', status='queued'
+    ).order_by(BackgroundJob.job_id).first()
+    return waiting or enqueue_job('price_drop_detection', {})
+
+
+def _latest_drops(changes):
+    """{base_product_id: new effective price} for products whose latest logged change is a drop."""
+    latest = {}
+    for change in sorted(changes, key=lambda change: change.change_id):
+        latest[change.base_product_id] = change
+    return {
+        base_product_id: change.new_price
+        for base_product_id, change in latest.items()
+        if change.new_price < change.old_price
+    }
+
+
+def _pending_notifications(drops):
+    """
+    Wishlist rows of the dropped products that were added above the new price and were not notified
+    at that price yet, with the customer's email and the product name, in one query, ordered so the
+    rows of one customer and product are adjacent.
+    """
+    if not drops:
+        return []
+    new_price = case(drops, value=WishlistItem.base_product_id)
+    return db.session.query(
+        WishlistItem, Customer.email_address, Products.product_name
+    ).join(
+        Customer, WishlistItem.customer_id == Customer.customer_id
+    ).join(
+        Products, WishlistItem.base_product_id == Products.base_product_id
+    ).outerjoin(
+        PriceDropNotification, and_(
+            PriceDropNotification.customer_id == WishlistItem.customer_id,
+            PriceDropNotification.base_product_id == WishlistItem.base_product_id,
+            PriceDropNotification.color_name == WishlistItem.color_name,
+            PriceDropNotification.size_name == WishlistItem.size_name,
+            PriceDropNotification.notified_price == new_price
+        )
+    ).filter(
+        WishlistItem.base_product_id.in_(drops),
+        WishlistItem.addition_price > new_price,
+        PriceDropNotification.customer_id.is_(None)
+    ).order_by(
+        WishlistItem.customer_id, WishlistItem.base_product_id, WishlistItem.color_name, WishlistItem.size_name
+    ).all()
+
+
+def _group_by_customer_and_product(rows):
+    """One ([wishlist items], email, product name) per customer and product of the pending rows."""
+    groups = []
+    for _, group in groupby(rows, key=lambda row: (row[0].customer_id, row[0].base_product_id)):
+        group = list(group)
+        groups.append(([wishlist_item for wishlist_item, _, _ in group], group[0][1], group[0][2]))
+    return groups
+
+
+def detect_price_drops(sender_email, sender_password, job=None):
+    """
+    Notify wishlists about every unprocessed price drop. Returns (sent, failed).
+
+    Each pass takes up to PRICE_CHANGE_BATCH_SIZE log rows, sends the pending emails in batches and
+    records the sent ones before the log rows are marked processed. Rejected recipients are counted
+    as failed and not retried; a batch where every send failed raises, so a job retries later and
+    only the emails not yet recorded go out again.
+    """
+    progress = (job.progress or {}) if job is not None else {}
+    sent, failed = progress.get("sent", 0), progress.get("failed", 0)
+    while True:
+        changes = PriceChangeLog.query.filter(
+            PriceChangeLog.processed_at.is_(None)
+        ).order_by(PriceChangeLog.change_id).limit(PRICE_CHANGE_BATCH_SIZE).all()
+        if not changes:
+            return sent, failed
+        change_ids = [change.change_id for change in changes]
+
+        drops = _latest_drops(changes)
+        pending = _group_by_customer_and_product(_pending_notifications(drops))
+        for start in range(0, len(pending), PRICE_DROP_SEND_BATCH_SIZE):
+            batch = pending[start:start + PRICE_DROP_SEND_BATCH_SIZE]
+            messages = [
+                build_price_drop_email(
+                    customer_email=email_address,
+                    product_name=product_name,
+                    wishlist_price=max(float(item.addition_price) for item in wishlist_items),
+                    current_price=float(drops[wishlist_items[0].base_product_id]),
+                    sender_email=sender_email
+                )
+                for wishlist_items, email_address, product_name in batch
+            ]
+            errors = send_batch(messages, sender_email, sender_password)
+            if all(errors):
+                # Nothing went out: the mail server is unreachable
+                raise errors[0]
+            for (wishlist_items, email_address, _), email_error in zip(batch, errors):
+                if email_error is not None:
+                    failed += 1
+                    print(f"Failed to send email to {email_address}: {email_error}")
+                    continue
+                sent += 1
+                # The email covers every wishlisted variant of the product
+                db.session.add_all(PriceDropNotification(
+                    customer_id=item.customer_id,
+                    base_product_id=item.base_product_id,
+                    color_name=item.color_name,
+                    size_name=item.size_name,
+                    notified_price=drops[item.base_product_id]
+                ) for item in wishlist_items)
+            if job is not None:
+                report_progress(job, sent=sent, failed=failed)
+            else:
+                db.session.commit()
+
+        db.session.execute(
+            update(PriceChangeLog).where(
+                and_(PriceChangeLog.change_id.in_(change_ids), PriceChangeLog.processed_at.is_(None))
+            ).values(processed_at=datetime.now(timezone.utc)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+
+@job_handler('price_drop_detection')
+def price_drop_detection_job(payload, job):
+    """Run the detector with the configured sender account."""
+    sent, failed = detect_price_drops(
+        current_app.config.get("MAIL_SENDER", "SENDER_EMAIL"),
+        current_app.config.get("MAIL_PASSWORD", "SENDER_PASSWORD"),
+        job=job
+    )
+    report_progress(job, sent=sent, failed=failed)
+    print(f"Price drop detection: {sent} sent, {failed} failed")
+
+
+def check_price_drops_and_notify(sender_email, sender_password):
+    """
+    Notify wishlists about price drops logged since the last run.
+
+    Args:
+        sender_email (str): The email address used to send notifications.
+        sender_password (str): The password for the sender email.
+    """
+    try:
+        sent, failed = detect_price_drops(sender_email, sender_password)
+        print(f"Price drop check completed successfully: {sent} sent, {failed} failed.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error during price drop check: {e}")
@@ -2,7 +2,8 @@ from flask_restx import Namespace, Resource, fields, reqparse
 from flask import request, jsonify
 from backend.models import db, InvoiceItem, Customer
 from backend.routes.adminMethods import token_parser
-from backend.utils import decode_jwt_token
+from backend.auth import token_required
+from backend.catalogSync import product_stock_changed
 from collections import defaultdict
 from sqlalchemy.sql import text
 
@@ -33,28 +34,6 @@ refund_item_model = api.model('RefundItem', {
 })
 
 
-# Decorator to check for a valid JWT token
-def token_required(func):
-    def wrapper(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"status": "failure", "message": "Token is missing"}, 401
-        try:
-            # Remove 'Bearer ' prefix if present
-            token = token.replace('Bearer ', '')
-            decoded_token = decode_jwt_token(token)
-            if not decoded_token:
-                return {"status": "failure", "message": "Invalid or expired token"}, 401
-            # Pass the decoded token to the route function
-            request.customer = decoded_token
-        except Exception as e:
-            return {"status": "failure", "message": str(e)}, 401
-        return func(*args, **kwargs)
-
-    wrapper.__name__ = func.__name__  # Preserve the original function name
-    return wrapper
-
-
 # GET /account/invoices: View user invoice items
 @api.route('/invoices')
 class ViewInvoices(Resource):
@@ -294,6 +273,7 @@ class CancelOrder(Resource):
                             'size_name': order.size_name,
                         },
                     )
+                    product_stock_changed([order.base_product_id])
                 else:
                     db.session.rollback()
                     return {
@@ -1,7 +1,7 @@
 from flask_restx import Namespace, Resource, fields
 from flask import request, jsonify
 from backend.models import db, Managers
-from werkzeug.security import generate_password_hash, check_password_hash
+from backend.passwords import verify_password, hash_password_bounded, PasswordHashingBusy
 from backend.config import Config
 import jwt
 
@@ -68,7 +68,10 @@ class AdminRegister(Resource):
             return {"status": "failure", "message": "Username already registered"}, 400
 
         # Hash the password before storing it
-        password_hash = generate_password_hash(password)
+        try:
+            password_hash = hash_password_bounded(password)
+        except PasswordHashingBusy:
+            return {"status": "failure", "message": "Too many requests, please try again shortly"}, 503
 
         # Create and save the new admin
         new_admin = Managers(
@@ -95,9 +98,18 @@ class AdminLogin(Resource):
         # Retrieve the admin by username and check the password
         admin = Managers.query.filter_by(manager_username=username).first()
 
-        if admin is None or not check_password_hash(admin.manager_password, password):
+        try:
+            valid, upgraded_hash = verify_password(admin.manager_password if admin else None, password)
+        except PasswordHashingBusy:
+            return {"status": "failure", "message": "Too many requests, please try again shortly"}, 503
+        if not valid:
             return {"status": "failure", "message": "Invalid username or password"}, 401
 
+        # Re-hash passwords stored with an outdated method or cost
+        if upgraded_hash:
+            admin.manager_password = upgraded_hash
+            db.session.commit()
+
         # Generate JWT token with role
         adminToken = generate_admin_jwt_token(admin)
         return {"status": "success", "token": adminToken}, 200
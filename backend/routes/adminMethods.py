@@ -1,11 +1,21 @@
 from flask_restx import Namespace, Resource, fields
 from flask import request, jsonify
 from backend.models import db, InvoiceItem, ProductComments, Customer, Products, Categories, ProductColors, ProductSizes
-from backend.config import Config
-import jwt
+from backend.auth import token_required_with_role
+from backend.pagination import encode_cursor, decode_cursor, keyset_filter
+from backend.inventory import set_stock_levels, STOCK_CHUNK_SIZE
+from datetime import datetime, timedelta
+import csv
+import io
+from sqlalchemy import select, delete
+from backend.catalogSync import (
+    product_changed, products_deleted, product_details_changed, product_stock_changed,
+    category_changed, category_deleted, get_categories
+)
 
 from backend.routes.bulkCreate import product_creation_model
 from backend.sendMail import send_refund_email
+from backend.routes.productImages import save_product_image
 
 # Namespace for admin methods
 api = Namespace(
@@ -83,33 +93,6 @@ product_model = api.model('Product', {
 })
 
 
-
-# Helper function to check admin role
-def token_required_with_role(*required_roles):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            token = request.headers.get('Authorization')
-            if not token:
-                return {"status": "failure", "message": "Token is missing"}, 401
-            try:
-                # Decode the JWT token
-                if token.startswith("Bearer "):
-                    token = token.split(" ")[1]
-                payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-                user_role = payload.get('role')
-                if user_role not in required_roles:
-                    return {"status": "failure", "message": "Unauthorized role"}, 403
-            except jwt.ExpiredSignatureError:
-                return {"status": "failure", "message": "Token has expired"}, 401
-            except jwt.InvalidTokenError:
-                return {"status": "failure", "message": "Invalid token"}, 401
-            return func(*args, **kwargs)
-        wrapper.__name__ = func.__name__  # Preserve the original function name
-        return wrapper
-    return decorator
-
-
-
 # Existing Approve Order Method
 @api.route('/approveOrder')
 class ApproveOrder(Resource):
@@ -222,6 +205,7 @@ class ApproveComment(Resource):
 
         # Approve the comment by updating its comment_status
         comment.comment_status = 1
+        product_details_changed([comment.product_id])
         db.session.commit()
 
         return {"status": "success", "message": f"Comment {comment_id} has been approved"}, 200
@@ -248,128 +232,147 @@ class ApproveComment(Resource):
 
         # Approve the comment by updating its comment_status
         comment.comment_status = 2
+        product_details_changed([comment.product_id])
         db.session.commit()
 
         return {"status": "success", "message": f"Comment {comment_id} has been approved"}, 200
 
 
+ORDER_QUEUE_MAX_PAGE_SIZE = 200
+
+# Paging and filtering shared by the order queues below
+order_queue_parser = token_parser.copy()
+order_queue_parser.add_argument('limit', type=int, required=False, help=f"Page size (1-{ORDER_QUEUE_MAX_PAGE_SIZE}); omit to return every matching order")
+order_queue_parser.add_argument('cursor', type=str, required=False, help="Value of next_cursor from the previous page")
+order_queue_parser.add_argument('start_date', type=str, required=False, help='Only orders purchased on or after this date (YYYY-MM-DD)')
+order_queue_parser.add_argument('end_date', type=str, required=False, help='Only orders purchased on or before this date (YYYY-MM-DD)')
+
+return_status_parser = order_queue_parser.copy()
+return_status_parser.add_argument('delivery_status', type=int, action='append', choices=[1, 2, 3], required=False, help='Only these delivery statuses (repeatable)')
+
+
+def order_queue(statuses, args):
+    """
+    One page of the invoice items in `statuses`, most recent first, with the customer's home address
+    from a single joined query. Served by the (delivery_status, purchased_date, invoice_item_id)
+    index; pages continue from next_cursor, the (purchased_date, invoice_item_id) of the last row.
+    Returns (orders, next_cursor) or raises ValueError for invalid parameters.
+    """
+    limit = args.get('limit')
+    if limit is not None and not (1 <= limit <= ORDER_QUEUE_MAX_PAGE_SIZE):
+        raise ValueError(f"limit must be between 1 and {ORDER_QUEUE_MAX_PAGE_SIZE}")
+
+    query = db.session.query(InvoiceItem, Customer.home_address).outerjoin(
+        Customer, Customer.customer_id == InvoiceItem.customer_id
+    ).filter(InvoiceItem.delivery_status.in_(statuses))
+
+    try:
+        if args.get('start_date'):
+            query = query.filter(InvoiceItem.purchased_date >= datetime.strptime(args['start_date'], "%Y-%m-%d"))
+        if args.get('end_date'):
+            end_date = datetime.strptime(args['end_date'], "%Y-%m-%d") + timedelta(days=1)
+            query = query.filter(InvoiceItem.purchased_date < end_date)
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format")
+
+    if args.get('cursor'):
+        try:
+            last_date, last_id = decode_cursor(args['cursor'])
+            last_date, last_id = datetime.fromisoformat(last_date), int(last_id)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        query = query.filter(keyset_filter(
+            [InvoiceItem.purchased_date, InvoiceItem.invoice_item_id], [last_date, last_id], descending=True
+        ))
+
+    query = query.order_by(InvoiceItem.purchased_date.desc(), InvoiceItem.invoice_item_id.desc())
+    if limit:
+        # Fetch one extra row to know whether another page exists
+        query = query.limit(limit + 1)
+    rows = query.all()
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.purchased_date.isoformat(), last.invoice_item_id)
+
+    orders = [
+        {
+            "invoice_item_id": order.invoice_item_id,
+            "customer_id": order.customer_id,
+            "price_at_purchase": float(order.price_at_purchase),
+            "product_quantity": order.product_quantity,
+            "base_product_id": order.base_product_id,
+            "color_name": order.color_name,
+            "size_name": order.size_name,
+            "purchased_date": order.purchased_date.isoformat(),
+            "delivery_status": order.delivery_status,
+            "home_address": home_address or "Address not available"  # Fallback in case customer record is missing
+        }
+        for order, home_address in rows
+    ]
+    return orders, next_cursor
+
+
 # New Method: View All Orders with Status 0
 @api.route('/pendingOrders')
 class PendingOrders(Resource):
     @api.doc(security='BearerAuth')  # Attach security to this method
-    @api.expect(token_parser)
+    @api.expect(order_queue_parser)
     @token_required_with_role('productManager')
     def get(self):
-        """Retrieve all orders with delivery_status = 0, ordered by most recent"""
-        orders = InvoiceItem.query.filter_by(delivery_status=0).order_by(InvoiceItem.purchased_date.desc()).all()
+        """Retrieve orders with delivery_status = 0, ordered by most recent"""
+        args = order_queue_parser.parse_args()
+        try:
+            orders, next_cursor = order_queue([0], args)
+        except ValueError as e:
+            return {"status": "failure", "message": str(e)}, 400
 
-        if not orders:
+        if not orders and not args.get('cursor'):
             return {"status": "failure", "message": "No orders with delivery status 1, 2, or 3 found"}, 404
 
-        # Format orders for response
-        orders_list = []
-        for order in orders:
-            # Fetch the corresponding customer's home address
-            customer = Customer.query.filter_by(customer_id=order.customer_id).first()
-            if customer:
-                home_address = customer.home_address
-            else:
-                home_address = "Address not available"  # Fallback in case customer record is missing
-
-            orders_list.append({
-                "invoice_item_id": order.invoice_item_id,
-                "customer_id": order.customer_id,
-                "price_at_purchase": float(order.price_at_purchase),
-                "product_quantity": order.product_quantity,
-                "base_product_id": order.base_product_id,
-                "color_name": order.color_name,
-                "size_name": order.size_name,
-                "purchased_date": order.purchased_date.isoformat(),
-                "delivery_status": order.delivery_status,
-                "home_address": home_address  # Add the home address to the response
-            })
-
-        return {"status": "success", "pending_orders": orders_list}, 200
+        return {"status": "success", "pending_orders": orders, "next_cursor": next_cursor}, 200
 
 
 # New Method: Return Orders with Delivery Status 1, 2, or 3
 @api.route('/returnOrderStatus')
 class ReturnOrderStatus(Resource):
     @api.doc(security='BearerAuth')  # Attach security to this method
-    @api.expect(token_parser)
+    @api.expect(return_status_parser)
     @token_required_with_role('productManager')
     def get(self):
-        """Retrieve all orders with delivery_status = 1, 2, or 3, ordered by most recent"""
-        # Fetch orders with delivery_status 1, 2, or 3
-        orders = InvoiceItem.query.filter(InvoiceItem.delivery_status.in_([1, 2, 3])).order_by(
-            InvoiceItem.purchased_date.desc()
-        ).all()
+        """Retrieve orders with delivery_status = 1, 2, or 3 (or the requested ones), ordered by most recent"""
+        args = return_status_parser.parse_args()
+        try:
+            orders, next_cursor = order_queue(args.get('delivery_status') or [1, 2, 3], args)
+        except ValueError as e:
+            return {"status": "failure", "message": str(e)}, 400
 
-        if not orders:
+        if not orders and not args.get('cursor'):
             return {"status": "failure", "message": "No orders with delivery status 1, 2, or 3 found"}, 404
 
-        # Format orders for response
-        orders_list = []
-        for order in orders:
-            # Fetch the corresponding customer's home address
-            customer = Customer.query.filter_by(customer_id=order.customer_id).first()
-            if customer:
-                home_address = customer.home_address
-            else:
-                home_address = "Address not available"  # Fallback in case customer record is missing
-
-            orders_list.append({
-                "invoice_item_id": order.invoice_item_id,
-                "customer_id": order.customer_id,
-                "price_at_purchase": float(order.price_at_purchase),
-                "product_quantity": order.product_quantity,
-                "base_product_id": order.base_product_id,
-                "color_name": order.color_name,
-                "size_name": order.size_name,
-                "purchased_date": order.purchased_date.isoformat(),
-                "delivery_status": order.delivery_status,
-                "home_address": home_address  # Add the home address to the response
-            })
-
-        return {"status": "success", "orders": orders_list}, 200
+        return {"status": "success", "orders": orders, "next_cursor": next_cursor}, 200
 
 
 # New Method: View Pending Refunds
 @api.route('/pendingRefunds')
 class PendingRefunds(Resource):
     @api.doc(security='BearerAuth')
-    @api.expect(token_parser)
+    @api.expect(order_queue_parser)
     @token_required_with_role('salesManager')
     def get(self):
-        """Retrieve all orders with delivery_status = 5 (pending refund), ordered by most recent"""
-        refunds = InvoiceItem.query.filter_by(delivery_status=5).order_by(InvoiceItem.purchased_date.desc()).all()
+        """Retrieve orders with delivery_status = 5 (pending refund), ordered by most recent"""
+        args = order_queue_parser.parse_args()
+        try:
+            refunds, next_cursor = order_queue([5], args)
+        except ValueError as e:
+            return {"status": "failure", "message": str(e)}, 400
 
-        if not refunds:
+        if not refunds and not args.get('cursor'):
             return {"status": "failure", "message": "No pending refunds found"}, 404
 
-        refunds_list = []
-        for refund in refunds:
-            # Fetch the corresponding customer's home address
-            customer = Customer.query.filter_by(customer_id=refund.customer_id).first()
-            if customer:
-                home_address = customer.home_address
-            else:
-                home_address = "Address not available"
-
-            refunds_list.append({
-                "invoice_item_id": refund.invoice_item_id,
-                "customer_id": refund.customer_id,
-                "price_at_purchase": float(refund.price_at_purchase),
-                "product_quantity": refund.product_quantity,
-                "base_product_id": refund.base_product_id,
-                "color_name": refund.color_name,
-                "size_name": refund.size_name,
-                "purchased_date": refund.purchased_date.isoformat(),
-                # NEW FIELD:
-                "home_address": home_address
-            })
-
-        return {"status": "success", "pending_refunds": refunds_list}, 200
+        return {"status": "success", "pending_refunds": refunds, "next_cursor": next_cursor}, 200
 
 
 from sqlalchemy.sql import text
@@ -434,6 +437,7 @@ class ApproveRefund(Resource):
                      'size_name': refund.size_name,
                  },
              )
+             product_stock_changed([refund.base_product_id])
          else:
              return {"status": "failure", "message": "Product size not found for stock update"}, 404
 
@@ -499,6 +503,8 @@ class CategoryCreation(Resource):
             category_gender=category_gender
         )
         db.session.add(new_category)
+        db.session.flush()
+        category_changed(new_category.category_id)
         db.session.commit()
 
         return {"status": "success", "message": "Category created successfully", "category_id": new_category.category_id}
@@ -587,6 +593,10 @@ class ProductWithDetailsCreation(Resource):
                     db.session.add(size)
                     db.session.commit()
 
+        # Publish the finished product to the listing read model
+        product_changed(new_product.base_product_id)
+        db.session.commit()
+
         return {
             "status": "success",
             "message": "Product, colors, and sizes created successfully",
@@ -601,23 +611,42 @@ class ViewCategories(Resource):
         """
         Retrieve all categories.
         """
-        # Query the database for all categories
-        categories = Categories.query.all()
+        # Served from the shared category cache, revalidated with its ETag
+        categories_list, etag = get_categories()
 
-        if not categories:
+        if not categories_list:
             return {"status": "failure", "message": "No categories found"}, 404
 
-        # Format the response
-        categories_list = [
-            {
-                "category_id": category.category_id,
-                "category_name": category.category_name,
-                "category_gender": category.category_gender
-            }
-            for category in categories
-        ]
+        response = jsonify({"status": "success", "categories": categories_list})
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+DELETE_CHUNK_SIZE = 1000  # product ids per DELETE statement
+
+
+def delete_products(product_ids):
+    """
+    Delete products with their colors and sizes in the current transaction, without committing.
+    `product_ids` is a SELECT of base_product_id, run once; every table is then cleared with one
+    DELETE ... WHERE base_product_id IN (...) statement per DELETE_CHUNK_SIZE of the fetched ids, so
+    the deleted rows are exactly the products reported as deleted (rows referencing the products,
+    such as wishlist and cart lines, go through the foreign keys' ON DELETE rules).
+    Returns the number of deleted products.
+    """
+    base_product_ids = db.session.scalars(product_ids).all()
+    if not base_product_ids:
+        return 0
+    products_deleted(base_product_ids)
+    for start in range(0, len(base_product_ids), DELETE_CHUNK_SIZE):
+        chunk = base_product_ids[start:start + DELETE_CHUNK_SIZE]
+        for model in (ProductSizes, ProductColors, Products):
+            db.session.execute(
+                delete(model).where(model.base_product_id.in_(chunk)).execution_options(synchronize_session=False)
+            )
+    return len(base_product_ids)
 
-        return {"status": "success", "categories": categories_list}, 200
 
 @api.route('/deleteProduct/<int:base_product_id>')
 class DeleteProduct(Resource):
@@ -633,14 +662,8 @@ class DeleteProduct(Resource):
             return {"status": "failure", "message": f"Product with ID {base_product_id} not found"}, 404
 
         try:
-            # Delete all sizes associated with the product
-            ProductSizes.query.filter_by(base_product_id=base_product_id).delete()
-
-            # Delete all colors associated with the product
-            ProductColors.query.filter_by(base_product_id=base_product_id).delete()
-
-            # Delete the product itself
-            db.session.delete(product)
+            # Sizes, colors and the product go in one transaction
+            delete_products(select(Products.base_product_id).where(Products.base_product_id == base_product_id))
             db.session.commit()
 
             return {
@@ -665,27 +688,13 @@ class DeleteCategory(Resource):
             return {"status": "failure", "message": f"Category with ID {category_id} not found"}, 404
 
         try:
-            # Fetch all products in the category
-            products = Products.query.filter_by(category_id=category_id).all()
-
-            for product in products:
-                base_product_id = product.base_product_id
-
-                # Delete all sizes for the product
-                ProductSizes.query.filter_by(base_product_id=base_product_id).delete()
-
-                # Delete all colors for the product
-                ProductColors.query.filter_by(base_product_id=base_product_id).delete()
-
-                # Delete the product itself
-                db.session.delete(product)
-                db.session.commit()
-
-            # Finally, delete the category
+            # Set-based deletes of every size, color and product of the category, then the category,
+            # committed once so the catalog never shows a half-deleted category
+            delete_products(select(Products.base_product_id).where(Products.category_id == category_id))
+            category_deleted(category_id)
             db.session.delete(category)
             db.session.commit()
 
-
             return {
                 "status": "success",
                 "message": f"Category with ID {category_id} and all associated products, colors, and sizes have been deleted"
@@ -776,6 +785,7 @@ class AdjustStock(Resource):
 
         # Update the stock
         size.product_stock = new_stock
+        product_stock_changed([base_product_id])
         db.session.commit()
 
         return {
@@ -783,6 +793,136 @@ class AdjustStock(Resource):
             "message": f"Stock for size '{size_name}' with color '{color_name}' updated to {new_stock}"
         }, 200
 
+def read_stock_rows():
+    """
+    Yield (row number, row) for a bulk stock request: a CSV body (text/csv) or CSV file upload
+    (multipart field 'file'), parsed while it streams in, or JSON (a list of rows or {"items": [...]}).
+    Rows carry base_product_id, color_name, size_name and product_stock.
+    """
+    if request.mimetype in ('text/csv', 'application/csv'):
+        stream = request.stream
+    elif 'file' in request.files:
+        stream = request.files['file'].stream
+    else:
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise ValueError('Expected a JSON list of stock rows, an {"items": [...]} object or a CSV upload')
+        yield from enumerate(items, start=1)
+        return
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    yield from enumerate(reader, start=1)
+
+
+def parse_stock_row(row):
+    """Return ((base_product_id, color_name, size_name), stock) or raise ValueError."""
+    try:
+        key = (int(row['base_product_id']), str(row['color_name']).strip(), str(row['size_name']).strip())
+        stock = int(row['product_stock'])
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise ValueError("base_product_id, color_name, size_name and an integer product_stock are required")
+    if stock < 0:
+        raise ValueError("product_stock must not be negative")
+    return key, stock
+
+
+def apply_stock_chunk(rows):
+    """Apply one chunk of (row number, row) and commit it. Returns the per-row diff."""
+    parsed = []
+    levels = {}
+    for row_number, row in rows:
+        try:
+            key, stock = parse_stock_row(row)
+        except ValueError as e:
+            parsed.append((row_number, None, None, str(e)))
+            continue
+        parsed.append((row_number, key, stock, None))
+        levels[key] = stock  # The last row for a SKU wins
+
+    previous = set_stock_levels(levels)
+    changed_products = {key[0] for key, stock in levels.items() if key in previous and previous[key] != stock}
+    if changed_products:
+        product_stock_changed(list(changed_products))
+    db.session.commit()
+
+    diff = []
+    last_row_of = {key: row_number for row_number, key, _, _ in parsed if key is not None}
+    for row_number, key, stock, error in parsed:
+        if key is None:
+            diff.append({"row": row_number, "status": "invalid", "message": error})
+            continue
+        entry = {
+            "row": row_number,
+            "base_product_id": key[0],
+            "color_name": key[1],
+            "size_name": key[2],
+            "old_stock": previous.get(key),
+            "new_stock": stock
+        }
+        if key not in previous:
+            entry["status"] = "not_found"
+        elif last_row_of[key] != row_number:
+            entry["status"] = "superseded"  # A later row of the request sets this SKU
+        else:
+            entry["status"] = "updated" if previous[key] != stock else "unchanged"
+        diff.append(entry)
+    return diff
+
+
+def mark_superseded(entries, last_entry_of):
+    """
+    Mark entries of earlier chunks that `entries` (the diff of the next chunk) override as
+    superseded. `last_entry_of` maps each SKU to its latest applied entry so far and is updated.
+    """
+    for entry in entries:
+        if entry["status"] in ("invalid", "not_found", "superseded"):
+            continue  # Not applied, or already overridden within its own chunk
+        key = (entry["base_product_id"], entry["color_name"], entry["size_name"])
+        if key in last_entry_of:
+            last_entry_of[key]["status"] = "superseded"  # A row of a later chunk sets this SKU
+        last_entry_of[key] = entry
+
+
+@api.route('/bulkAdjustStock')
+class BulkAdjustStock(Resource):
+    @api.doc(security='BearerAuth')
+    @api.expect(token_parser)
+    @token_required_with_role('productManager')
+    def post(self):
+        """
+        Set the stock levels of many SKUs at once, from JSON or a streamed CSV upload.
+        Rows are applied and committed in chunks of STOCK_CHUNK_SIZE with one read and one
+        UPDATE ... FROM (VALUES ...) per chunk. Returns a per-row diff and a summary; unknown SKUs and
+        invalid rows are reported, not applied, and a row overridden by a later row of the request for
+        the same SKU (in any chunk) is reported as superseded. A malformed request body stops the import with a 400
+        after the chunks already committed (see applied_rows).
+        """
+        diff = []
+        chunk = []
+        last_entry_of = {}  # SKU -> its latest applied row, so rows of later chunks supersede earlier ones
+
+        def apply(chunk):
+            entries = apply_stock_chunk(chunk)
+            mark_superseded(entries, last_entry_of)
+            diff.extend(entries)
+
+        try:
+            for row in read_stock_rows():
+                chunk.append(row)
+                if len(chunk) >= STOCK_CHUNK_SIZE:
+                    apply(chunk)
+                    chunk = []
+            apply(chunk)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            return {"status": "failure", "message": str(e), "applied_rows": len(diff)}, 400
+
+        summary = {"rows": len(diff)}
+        for status in ("updated", "unchanged", "superseded", "not_found", "invalid"):
+            summary[status] = sum(1 for entry in diff if entry["status"] == status)
+        return {"status": "success", "summary": summary, "rows": diff}, 200
+
+
 @api.route('/getAllProducts')
 class GetAllProducts(Resource):
     @api.doc(security='BearerAuth')  # Attach security to this method
@@ -881,8 +1021,8 @@ class ProtectedUploadProductColorImage(Resource):
                 "message": "No image data received"
             }, 400
 
-        # Store the binary data in the product_image column
-        product_color.product_image = image_bytes
+        # Store the image in the content-addressed image store; the row only keeps the key
+        save_product_image(product_color, image_bytes)
         db.session.commit()
 
         return {"status": "success", "message": "Color image uploaded successfully!"}, 200
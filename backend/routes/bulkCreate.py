@@ -1,8 +1,24 @@
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource, fields, inputs
 from flask import request
-from backend.models import db, Categories, Products, ProductColors, ProductSizes
+import io
+import json
+from backend.models import db
+from backend.auth import token_required_with_role
+from backend.catalogImport import import_products, stage_import
+from backend.jobs import enqueue_job
 
-api = Namespace('bulkCreate', description='Operations related to creating a new product with associated data')
+api = Namespace(
+    'bulkCreate',
+    description='Operations related to creating a new product with associated data',
+    authorizations={
+        'BearerAuth': {
+            'type': 'apiKey',
+            'in': 'header',
+            'name': 'Authorization',
+            'description': 'JWT token with "Bearer " prefix'
+        }
+    }
+)
 
 # Models for Swagger documentation
 product_creation_model = api.model('ProductCreation', {
@@ -26,88 +42,78 @@ product_creation_model = api.model('ProductCreation', {
     })))
 })
 
+import_parser = api.parser()
+import_parser.add_argument('Authorization', location='headers', required=True, help='Bearer token is required')
+import_parser.add_argument('dry_run', type=inputs.boolean, default=False, location='args', help='Only validate the products and report what would be created')
+import_parser.add_argument('background', type=inputs.boolean, default=False, location='args', help='Import in a background job and return its id (progress at /jobs/<id>)')
+
+
+def read_product_rows():
+    """
+    Yield (row number, product) for a bulk import: an NDJSON body (application/x-ndjson, one product
+    per line) parsed while it streams in, or JSON (a list of products or {"products": [...]}).
+    Unparsable NDJSON lines are yielded as their text and rejected by validation.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        row_number = 0
+        for line in io.TextIOWrapper(request.stream, encoding='utf-8-sig'):
+            line = line.strip()
+            if not line:
+                continue
+            row_number += 1
+            try:
+                yield row_number, json.loads(line)
+            except ValueError:
+                yield row_number, line
+        return
+    data = request.get_json(silent=True)
+    products = data.get('products') if isinstance(data, dict) else data
+    if not isinstance(products, list):
+        raise ValueError('Expected a JSON list of products, a {"products": [...]} object or an NDJSON body')
+    yield from enumerate(products, start=1)
+
 
 @api.route('/')
 class ProductCreation(Resource):
     @api.expect(product_creation_model)
     def post(self):
-        data = request.json
-
-        # Extract category details
-        category_name = data.get('category_name')
-        category_gender = data.get('category_gender')
-
-        # Check or create category
-        category = Categories.query.filter_by(category_name=category_name, category_gender=category_gender).first()
-        if not category:
-            category = Categories(
-                category_name=category_name,
-                category_gender=category_gender
-            )
-            db.session.add(category)
-            db.session.commit()
-
-        # Extract product details
-        product_name = data.get('product_name')
-        model = data.get('model')
-        serial_number = data.get('serial_number')
-        price = data.get('price')
-        warranty_status = data.get('warranty_status')
-        distributor = data.get('distributor')
-        discount_percentage = data.get('discount_percentage', 0.0)
+        """Create one product with its colors and sizes in a single transaction."""
+        summary, errors = import_products([(1, request.json)])
+        if errors:
+            return {"status": "failure", "message": "; ".join(errors[0]["errors"])}, 500 if summary["failed"] else 400
 
-        # Create the product
-        new_product = Products(
-            category_id=category.category_id,
-            product_name=product_name,
-            model=model,
-            serial_number=serial_number,
-            price=price,
-            warranty_status=warranty_status,
-            distributor=distributor,
-            discount_percentage=discount_percentage
-        )
-        db.session.add(new_product)
-        db.session.commit()
+        return {"status": "success", "message": "Product, colors, and sizes created successfully"}
 
-        # Handle colors and sizes
-        colors = data.get('colors', [])
-        for color_data in colors:
-            color_name = color_data.get('color_name')
-            product_image = color_data.get('product_image')
-            color_description = color_data.get('color_description')
 
-            # Create or check color
-            color = ProductColors.query.filter_by(base_product_id=new_product.base_product_id,
-                                                  color_name=color_name).first()
-            if not color:
-                color = ProductColors(
-                    base_product_id=new_product.base_product_id,
-                    color_name=color_name,
-                    product_image=product_image,
-                    color_description=color_description
-                )
-                db.session.add(color)
+@api.route('/import')
+class BulkImport(Resource):
+    @api.doc(security='BearerAuth')
+    @api.expect(import_parser, [product_creation_model])
+    @token_required_with_role('productManager')
+    def post(self):
+        """
+        Create many products, with their colors and sizes, from a JSON list or a streamed NDJSON body.
+        Categories are looked up once and created when missing. Products are inserted in chunks of
+        IMPORT_CHUNK_SIZE, each chunk in one transaction with batched inserts. Invalid rows are
+        reported and skipped. With dry_run nothing is written; with background the import runs as a
+        job whose progress is reported at /jobs/<id>.
+        """
+        args = import_parser.parse_args()
+        try:
+            if args['background'] and not args['dry_run']:
+                # The products are staged in chunks as the body streams in; the job payload stays small
+                job = enqueue_job('catalog_import', {})
+                staged = stage_import(job.job_id, read_product_rows())
+                job.payload = {"rows": staged}
                 db.session.commit()
+                return {
+                    "status": "success",
+                    "message": f"Import of {staged} products queued",
+                    "job_id": job.job_id
+                }, 202
+            summary, errors = import_products(read_product_rows(), dry_run=args['dry_run'])
+        except (ValueError, UnicodeDecodeError) as e:
+            db.session.rollback()
+            return {"status": "failure", "message": str(e)}, 400
 
-            # Handle sizes for the color
-            sizes = color_data.get('sizes', [])
-            for size_data in sizes:
-                size_name = size_data.get('size_name')
-                product_stock = size_data.get('product_stock')
-
-                # Create or check size
-                size = ProductSizes.query.filter_by(
-                    base_product_id=new_product.base_product_id, color_name=color_name, size_name=size_name
-                ).first()
-                if not size:
-                    size = ProductSizes(
-                        base_product_id=new_product.base_product_id,
-                        color_name=color_name,
-                        size_name=size_name,
-                        product_stock=product_stock
-                    )
-                    db.session.add(size)
-                    db.session.commit()
-
-        return {"status": "success", "message": "Product, colors, and sizes created successfully"}
+        return {"status": "success", "dry_run": args['dry_run'], "summary": summary, "errors": errors}, 200
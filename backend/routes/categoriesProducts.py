@@ -2,6 +2,8 @@ from flask_restx import Namespace, Resource, reqparse
 from flask import jsonify, send_file, request
 from backend.models import db, Categories, Products, ProductColors, ProductSizes, ProductComments
 import io
+from backend.catalogSync import product_details_cache, product_image_url, get_categories
+from backend.imageStore import DERIVATIVE_SIZES
 
 api = Namespace('categoriesProducts', description='Operations related to product categories and products')
 
@@ -16,60 +18,97 @@ get_products_by_gender_parser.add_argument('category_gender', type=str, required
 @api.route('/categories')
 class GetCategories(Resource):
     def get(self):
-        categories = Categories.query.all()
-        return jsonify(
-            [{"category_id": c.category_id, "category_name": c.category_name, "category_gender": c.category_gender} for c in categories]
-        )
+        categories, etag = get_categories()
+        response = jsonify(categories)
+        # Clients and CDNs may keep the list but must revalidate it; unchanged lists cost a 304
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     
-# Route to get product details by base_product_id
-@api.route('/products/<int:base_id>/details')
-class GetProductDetails(Resource):
-    def get(self, base_id):
-        product = Products.query.filter_by(base_product_id=base_id).first()
-        if not product:
-            return {"status": "failure", "message": f"No product found with base_id '{base_id}'"}, 404
+def load_product_details(base_id):
+    """
+    Assemble the product detail payload with a fixed number of queries:
+    the product, its colors outer-joined with their sizes, and its approved comments.
+    Returns None when the product does not exist.
+    """
+    product = Products.query.filter_by(base_product_id=base_id).first()
+    if not product:
+        return None
 
-        # Fetch all colors for this base_id, each with associated sizes
-        color_variants = ProductColors.query.filter_by(base_product_id=base_id).all()
-        colors_data = []
-        for color in color_variants:
-            sizes = ProductSizes.query.filter_by(base_product_id=base_id, color_name=color.color_name).all()
-            sizes_data = [{"size_name": size.size_name, "stock": int(size.product_stock)} for size in sizes]
+    # Fetch all colors for this base_id together with their sizes in one query
+    variant_rows = db.session.query(
+        ProductColors.color_name,
+        ProductColors.color_description,
+        ProductColors.product_image,
+        ProductSizes.size_name,
+        ProductSizes.product_stock
+    ).outerjoin(
+        ProductSizes,
+        (ProductColors.base_product_id == ProductSizes.base_product_id) &
+        (ProductColors.color_name == ProductSizes.color_name)
+    ).filter(
+        ProductColors.base_product_id == base_id
+    ).order_by(ProductColors.color_name).all()
 
-            image_url = f"/productImages/retrieve?base_product_id={base_id}&color_name={color.color_name}"
+    colors_by_name = {}
+    for row in variant_rows:
+        color = colors_by_name.get(row.color_name)
+        if color is None:
+            color = colors_by_name[row.color_name] = {
+                "color_name": row.color_name,
+                "color_description": row.color_description,
+                "sizes": [],
+                "image_url": product_image_url(base_id, row.color_name, row.product_image),
+                "image_urls": {
+                    size: product_image_url(base_id, row.color_name, row.product_image, size=size)
+                    for size in DERIVATIVE_SIZES
+                }
+            }
+        if row.size_name is not None:
+            color["sizes"].append({"size_name": row.size_name, "stock": int(row.product_stock)})
 
-            colors_data.append({
-                "color_name": color.color_name,
-                "color_description": color.color_description,
-                "sizes": sizes_data,
-                "image_url": image_url
-            })
+    # Fetch approved comments related to this product base_id
+    comments = ProductComments.query.filter_by(product_id=base_id, comment_status=1).all()
+    comments_data = [
+        {
+            "comment_id": comment.comment_id,
+            "customer_id": comment.customer_id,
+            "content": comment.comment_content,
+            "status": comment.comment_status,
+            "created_at": comment.created_at.isoformat() if comment.created_at else None
+        }
+        for comment in comments
+    ]
 
-        # Fetch comments related to this product base_id
-        comments = ProductComments.query.filter_by(product_id=base_id).all()
-        comments_data = []
-        for comment in comments:
-            if (comment.comment_status == 1):
-                comments_data.append({
-                    "comment_id": comment.comment_id,
-                    "customer_id": comment.customer_id,
-                    "content": comment.comment_content,
-                    "status": comment.comment_status,
-                    "created_at": comment.created_at.isoformat() if comment.created_at else None
-                })
+    return {
+        "product_id": product.base_product_id,
+        "product_name": product.product_name,
+        "model": int(product.model) if product.model is not None else None,
+        "serial_number": int(product.serial_number) if product.serial_number is not None else None,
+        "price": float(product.price) if product.price is not None else None,
+        "average_rating": float(product.average_rating) if product.average_rating is not None else None,
+        "rating_count": int(product.rating_count or 0),
+        "popularity": float(product.rating_sum or 0),
+        "warranty_status": int(product.warranty_status) if product.warranty_status is not None else None,
+        "distributor": product.distributor,
+        "colors": list(colors_by_name.values()),
+        "comments": comments_data,
+        "discount_percentage": product.discount_percentage
+    }
 
-        response_data = {
-            "product_id": product.base_product_id,
-            "product_name": product.product_name,
-            "model": int(product.model) if product.model is not None else None,
-            "serial_number": int(product.serial_number) if product.serial_number is not None else None,
-            "price": float(product.price) if product.price is not None else None,
-            "average_rating": float(product.average_rating) if product.average_rating is not None else None,
-            "warranty_status": int(product.warranty_status) if product.warranty_status is not None else None,
-            "distributor": product.distributor,
-            "colors": colors_data,
-            "comments": comments_data,
-            "discount_percentage": product.discount_percentage
-        }
 
-        return jsonify(response_data)
\ No newline at end of file
+# Route to get product details by base_product_id
+@api.route('/products/<int:base_id>/details')
+class GetProductDetails(Resource):
+    def get(self, base_id):
+        # Served from the per-product cache; backend.catalogSync evicts entries when
+        # price, discount, stock, colors, ratings or comment approval change
+        response_data = product_details_cache.get(base_id)
+        if response_data is None:
+            response_data = load_product_details(base_id)
+            if response_data is None:
+                return {"status": "failure", "message": f"No product found with base_id '{base_id}'"}, 404
+            product_details_cache.set(base_id, response_data)
+
+        return jsonify(response_data)
@@ -1,9 +1,14 @@
 from flask_restx import Namespace, Resource, fields, reqparse
-from flask import request, jsonify
+from flask import request, jsonify, current_app
+from sqlalchemy import tuple_
 from backend.models import db, Customer, CreditCard, ShoppingBagItem, InvoiceItem, Products, ProductColors, ProductSizes
 from backend.pdf_generator import generate_invoice_pdf
 from backend.sendMail import send_invoice_email
-from backend.utils import decode_jwt_token
+from backend.auth import token_required
+from backend.catalogSync import product_stock_changed
+from backend.cart import load_cart_lines, discounted_price
+from backend.inventory import reserve_stock, sku_quantities, InsufficientStock
+from backend.jobs import enqueue_job, job_handler
 
 # Namespace for Checkout functionality
 api = Namespace(
@@ -27,24 +32,6 @@ credit_card_model = api.model('CreditCard', {
     'save_card': fields.Boolean(description='Flag to save the card for future use')
 })
 
-# Decorator to validate JWT token
-def token_required(func):
-    def wrapper(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"status": "failure", "message": "Token is missing"}, 401
-        try:
-            token = token.replace('Bearer ', '')  # Remove 'Bearer' prefix
-            decoded_token = decode_jwt_token(token)
-            if not decoded_token:
-                return {"status": "failure", "message": "Invalid or expired token"}, 401
-            request.customer_id = decoded_token.get('customer_id')  # Add customer ID to request
-        except Exception as e:
-            return {"status": "failure", "message": str(e)}, 401
-        return func(*args, **kwargs)
-
-    wrapper.__name__ = func.__name__
-    return wrapper
 
 # GET /checkout/user-info: Fetch user's personal information
 @api.route('/user-info')
@@ -119,60 +106,48 @@ class Checkout(Resource):
         """Process checkout for items in the shopping bag"""
         customer_id = request.customer_id
 
-        # Fetch all items in the shopping bag for the customer
-        cart_items = ShoppingBagItem.query.filter_by(customer_id=customer_id).all()
-        if not cart_items:
+        # Fetch all items in the shopping bag with their products, colors and sizes in one query
+        cart_lines = load_cart_lines(ShoppingBagItem, customer_id)
+        if not cart_lines:
             return {"status": "failure", "message": "No items in the shopping bag"}, 404
 
-        for item in cart_items:
-            # Fetch product details
-            product = Products.query.filter_by(base_product_id=item.base_product_id).first()
+        for item, product, _, size, color_exists in cart_lines:
             if not product:
                 return {
                     "status": "failure",
                     "message": f"Product not found for item with base_product_id: {item.base_product_id}"
                 }, 400
 
-            # Fetch color details
-            color = ProductColors.query.filter_by(
-                base_product_id=item.base_product_id,
-                color_name=item.color_name
-            ).first()
-            if not color:
+            if not color_exists:
                 return {
                     "status": "failure",
                     "message": f"Color {item.color_name} not found for product {product.product_name}"
                 }, 400
 
-            # Fetch size and stock details
-            size = ProductSizes.query.filter_by(
-                base_product_id=item.base_product_id,
-                color_name=item.color_name,
-                size_name=item.size_name
-            ).first()
             if not size:
                 return {
                     "status": "failure",
-                    "message": f"Size {item.size_name} not found for product {product.product_name} with color {color.color_name}"
+                    "message": f"Size {item.size_name} not found for product {product.product_name} with color {item.color_name}"
                 }, 400
 
-            # Check stock availability
-            if size.product_stock < item.product_quantity:
-                return {
-                    "status": "failure", #TODO: Asks for wishlist
-                    "message": f"Insufficient stock for {product.product_name} (Color: {color.color_name}, Size: {size.size_name})"
-                }, 400
-
-            # Deduct stock
-            size.product_stock -= item.product_quantity
-            # In your /checkout/checkout POST method, after fetching `product`
-            original_price = float(product.price)
-            discount_percentage = float(product.discount_percentage or 0)
-            discounted_price = original_price * (1 - discount_percentage / 100.0)
-
+        # Deduct stock with conditional updates; the stock check and the decrement are one statement per SKU
+        product_names = {line.item.base_product_id: line.product.product_name for line in cart_lines}
+        try:
+            reserve_stock(sku_quantities(
+                (line.item.base_product_id, line.item.color_name, line.item.size_name, line.item.product_quantity)
+                for line in cart_lines
+            ))
+        except InsufficientStock as e:
+            db.session.rollback()
+            return {
+                "status": "failure", #TODO: Asks for wishlist
+                "message": f"Insufficient stock for {product_names[e.base_product_id]} (Color: {e.color_name}, Size: {e.size_name})"
+            }, 400
+
+        for item, product, _, _, _ in cart_lines:
             invoice_item = InvoiceItem(
                 customer_id=customer_id,
-                price_at_purchase=discounted_price,  # use the discounted price
+                price_at_purchase=discounted_price(product),  # use the discounted price
                 product_quantity=item.product_quantity,
                 base_product_id=item.base_product_id,
                 color_name=item.color_name,
@@ -181,11 +156,34 @@ class Checkout(Resource):
             )
             db.session.add(invoice_item)
 
-        # Commit changes to deduct stock and add invoice items
-        db.session.commit()
+        # Clear the purchased quantities from the bag in the same transaction as the invoice and the stock deduction.
+        # Only lines still holding the quantity that was reserved are deleted in one statement; a line the
+        # customer changed meanwhile keeps what was added on top of the purchased quantity.
+        bag_key = (ShoppingBagItem.base_product_id, ShoppingBagItem.color_name, ShoppingBagItem.size_name)
+        purchased = {
+            (line.item.base_product_id, line.item.color_name, line.item.size_name): line.item.product_quantity
+            for line in cart_lines
+        }
+        cleared = ShoppingBagItem.query.filter(
+            ShoppingBagItem.customer_id == customer_id,
+            tuple_(*bag_key, ShoppingBagItem.product_quantity).in_(
+                [(*key, quantity) for key, quantity in purchased.items()]
+            )
+        ).delete(synchronize_session=False)
+        if cleared < len(purchased):
+            for key, quantity in purchased.items():
+                changed_line = ShoppingBagItem.query.filter(
+                    ShoppingBagItem.customer_id == customer_id, tuple_(*bag_key) == key
+                )
+                changed_line.filter(ShoppingBagItem.product_quantity > quantity).update(
+                    {ShoppingBagItem.product_quantity: ShoppingBagItem.product_quantity - quantity},
+                    synchronize_session=False
+                )
+                changed_line.filter(ShoppingBagItem.product_quantity <= quantity).delete(synchronize_session=False)
+
+        # Refresh detail pages now; in-stock listing facets of the purchased products follow the commit
+        product_stock_changed([line.item.base_product_id for line in cart_lines])
 
-        # Clear the shopping bag
-        ShoppingBagItem.query.filter_by(customer_id=customer_id).delete()
         db.session.commit()
 
         return {"status": "success", "message": "Checkout completed successfully"}
@@ -209,27 +207,49 @@ class SendEmail(Resource):
         if not all([customer_email, order_id, personal_info]):
             return {"status": "failure", "message": "Missing required fields"}, 400
 
-        try:
-            pdf_data = generate_invoice_pdf(
-                order_id=order_id,
-                personal_info=personal_info,
-                delivery_method=delivery_method,
-                payment_method=payment_method,
-                shopping_bag=shopping_bag,
-                total_price=total_price,
-                as_bytes=True
-            )
-
-            send_invoice_email(
-                customer_email=customer_email,
-                pdf_data=pdf_data,
-                order_id=order_id,
-                sender_email="SENDER_EMAIL",
-                sender_password="SENDER_PASSWORD"
-            )
-
-            return {"status": "success", "message": "Invoice email sent successfully"}, 200
+        # Rendering the PDF and talking to the mail server happen in a background job
+        job = enqueue_job('send_invoice_email', {
+            "customer_email": customer_email,
+            "order_id": order_id,
+            "shopping_bag": shopping_bag,
+            "personal_info": personal_info,
+            "delivery_method": delivery_method,
+            "payment_method": mask_payment_method(payment_method),
+            "total_price": total_price
+        }, customer_id=request.customer_id)
+        db.session.commit()
 
-        except Exception as e:
-            print(f"Error sending email: {e}")
-            return {"status": "failure", "message": str(e)}, 500
\ No newline at end of file
+        return {"status": "success", "message": "Invoice email queued", "job_id": job.job_id}, 202
+
+
+def mask_payment_method(payment_method):
+    """Keep only what the invoice prints from the payment method (holder and last card digits)."""
+    if not isinstance(payment_method, dict):
+        return payment_method
+    masked = {key: value for key, value in payment_method.items() if key in ('type', 'cardHolderName')}
+    if payment_method.get('cardNumber'):
+        masked['cardNumber'] = str(payment_method['cardNumber'])[-4:]
+    return masked
+
+
+@job_handler('send_invoice_email')
+def send_invoice_job(payload, job):
+    """Render the invoice PDF and email it; errors propagate so the job is retried."""
+    pdf_data = generate_invoice_pdf(
+        order_id=payload["order_id"],
+        personal_info=payload["personal_info"],
+        delivery_method=payload["delivery_method"],
+        payment_method=payload["payment_method"],
+        shopping_bag=payload["shopping_bag"],
+        total_price=payload["total_price"],
+        as_bytes=True
+    )
+
+    send_invoice_email(
+        customer_email=payload["customer_email"],
+        pdf_data=pdf_data,
+        order_id=payload["order_id"],
+        sender_email=current_app.config.get("MAIL_SENDER", "SENDER_EMAIL"),
+        sender_password=current_app.config.get("MAIL_PASSWORD", "SENDER_PASSWORD"),
+        raise_errors=True
+    )
@@ -1,7 +1,8 @@
 from flask_restx import Namespace, Resource, fields, reqparse
 from flask import request, jsonify
 from backend.models import db, ProductComments, ProductRating, InvoiceItem
-from backend.utils import decode_jwt_token
+from backend.auth import token_required
+from backend.catalogSync import product_changed, record_rating
 
 # Namespace for comment and rating-related operations
 api = Namespace(
@@ -40,28 +41,6 @@ mycomments_model = api.model('MyComments', {
 })
 
 
-# Decorator to check for a valid JWT token
-def token_required(func):
-    def wrapper(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"status": "failure", "message": "Token is missing"}, 401
-        try:
-            # Remove 'Bearer ' prefix if present
-            token = token.replace('Bearer ', '')
-            decoded_token = decode_jwt_token(token)
-            if not decoded_token:
-                return {"status": "failure", "message": "Invalid or expired token"}, 401
-            # Pass the decoded token to the route function
-            request.customer = decoded_token
-        except Exception as e:
-            return {"status": "failure", "message": str(e)}, 401
-        return func(*args, **kwargs)
-
-    wrapper.__name__ = func.__name__  # Preserve the original function name
-    return wrapper
-
-
 # POST /commentRating/comment: Make a comment on a product
 @api.route('/comment')
 class MakeComment(Resource):
@@ -161,6 +140,9 @@ class GiveRating(Resource):
             customer_rate=int_rate
         )
         db.session.add(new_rating)
+        # Update the stored rating counters and average atomically, in the same transaction as the rating
+        record_rating(product_id, int_rate)
+        product_changed(product_id)
         db.session.commit()
 
         return {"status": "success", "message": "Rating added successfully."}, 201
\ No newline at end of file
@@ -0,0 +1,36 @@
+from flask_restx import Namespace, Resource
+from flask import request
+from backend.models import db, BackgroundJob
+from backend.auth import token_required
+from backend.jobs import job_to_dict
+
+# Namespace for background job status
+api = Namespace(
+    'jobs',
+    description='Status of background jobs (invoice emails, notifications)',
+    authorizations={
+        'BearerAuth': {
+            'type': 'apiKey',
+            'in': 'header',
+            'name': 'Authorization',
+            'description': 'Paste the JWT token here with "Bearer " prefix'
+        }
+    }
+)
+
+
+@api.route('/<int:job_id>')
+class JobStatus(Resource):
+    @api.doc(security='BearerAuth')
+    @token_required
+    def get(self, job_id):
+        """
+        Return the status, attempts, progress and last error of a background job.
+        """
+        job = db.session.get(BackgroundJob, job_id)
+        # Customers may see their own jobs; manager tokens (which carry a role) may see every job
+        payload = request.token_payload
+        if not job or (not payload.get('role') and job.customer_id != payload.get('customer_id')):
+            return {"status": "failure", "message": f"Job {job_id} not found"}, 404
+
+        return {"status": "success", "job": job_to_dict(job)}, 200
@@ -3,8 +3,8 @@ from flask import request, jsonify
 from backend.models import db, Customer
 from backend.utils import generate_jwt_token
 from backend.schemas import init_schemas
-from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
+from backend.passwords import verify_password, hash_password_bounded, PasswordHashingBusy
+from backend.auth import token_required, customer_required, revoke_token, bearer_token
 import jwt
 from backend.config import Config
 
@@ -57,7 +57,10 @@ class Register(Resource):
             return {"status": "failure", "message": "Email already registered"}, 400
 
         # Hash the password before storing it
-        password_hash = generate_password_hash(password)
+        try:
+            password_hash = hash_password_bounded(password)
+        except PasswordHashingBusy:
+            return {"status": "failure", "message": "Too many requests, please try again shortly"}, 503
 
         new_user = Customer(
             name=name,
@@ -85,43 +88,37 @@ class Login(Resource):
         # Retrieve the customer by email and check the password
         customer = Customer.query.filter_by(email_address=email).first()
 
-        if customer is None or not check_password_hash(customer.password, password):
+        try:
+            valid, upgraded_hash = verify_password(customer.password if customer else None, password)
+        except PasswordHashingBusy:
+            return {"status": "failure", "message": "Too many requests, please try again shortly"}, 503
+        if not valid:
             return {"status": "failure", "message": "Invalid email or password"}, 401
 
+        # Re-hash passwords stored with an outdated method or cost
+        if upgraded_hash:
+            customer.password = upgraded_hash
+            db.session.commit()
+
         # Generate JWT token
         token = generate_jwt_token(customer)
         return {"status": "success", "token": token}
 
-def token_required(f):
-    """Decorator to protect routes that require authentication."""
-    @wraps(f)
-    def decorator(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({"status": "failure", "message": "Token is missing"}), 401
-        try:
-            # Remove 'Bearer ' prefix if present
-            if token.startswith("Bearer "):
-                token = token.split(" ")[1]
-            payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-            current_user = Customer.query.get(payload['customer_id'])
-            if current_user is None:
-                return jsonify({"status": "failure", "message": "User not found"}), 401
-        except jwt.ExpiredSignatureError:
-            return jsonify({"status": "failure", "message": "Token has expired"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"status": "failure", "message": "Invalid token"}), 401
-        return f(current_user, *args, **kwargs)
-    return decorator
-
-
-
 @api.route('/protected')
 class Protected(Resource):
     @token_required
-    def get(self, current_user):
+    def get(self):
         """Example of a protected route"""
-        return {"status": "success", "message": f"Hello, {current_user.name}!"}
+        return {"status": "success", "message": f"Hello, {request.customer.get('name')}!"}
+
+@api.route('/logout')
+class Logout(Resource):
+    @api.doc(security='BearerAuth')
+    @token_required
+    def post(self):
+        """Revoke the token used for this request"""
+        revoke_token(bearer_token(), request.token_payload)
+        return {"status": "success", "message": "Logged out successfully"}
 
 @api.route('/decode-token')
 class DecodeToken(Resource):
@@ -146,7 +143,7 @@ class DecodeToken(Resource):
 class ChangePassword(Resource):
     @api.expect(change_password_model)  # Document the input model for Swagger UI
     @api.doc(security='BearerAuth')  # Indicate that this endpoint requires a JWT token
-    @token_required
+    @customer_required
     def post(self, current_user):
         """
         Change the password of the logged-in user.
@@ -161,7 +158,11 @@ class ChangePassword(Resource):
             return {"status": "failure", "message": "All fields are required"}, 400
 
         # Check if the old password matches the hashed password in the database
-        if not check_password_hash(current_user.password, old_password):
+        try:
+            valid, _ = verify_password(current_user.password, old_password, upgrade=False)
+        except PasswordHashingBusy:
+            return {"status": "failure", "message": "Too many requests, please try again shortly"}, 503
+        if not valid:
             return {"status": "failure", "message": "Old password is incorrect"}, 401
 
         # Check if the new password matches the confirmation
@@ -169,7 +170,10 @@ class ChangePassword(Resource):
             return {"status": "failure", "message": "New passwords do not match"}, 400
 
         # Hash the new password and update the database
-        current_user.password = generate_password_hash(new_password)
+        try:
+            current_user.password = hash_password_bounded(new_password)
+        except PasswordHashingBusy:
+            return {"status": "failure", "message": "Too many requests, please try again shortly"}, 503
         db.session.commit()
 
         return {"status": "success", "message": "Password changed successfully"}
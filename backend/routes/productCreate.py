@@ -1,6 +1,7 @@
 from flask_restx import Namespace, Resource, fields
 from flask import request, jsonify
 from backend.models import db, Categories, Products, ProductColors, ProductSizes
+from backend.catalogSync import product_changed, category_changed
 
 api = Namespace('productCreate', description='Operations related to creating a new product')
 
@@ -55,6 +56,8 @@ class CategoryCreation(Resource):
             category_gender=category_gender
         )
         db.session.add(new_category)
+        db.session.flush()
+        category_changed(new_category.category_id)
         db.session.commit()
 
         return {"status": "success", "message": "Category created successfully", "category_id": new_category.category_id}
@@ -91,6 +94,8 @@ class ProductCreation(Resource):
             discount_percentage=discount_percentage
         )
         db.session.add(new_product)
+        db.session.flush()
+        product_changed(new_product.base_product_id)
         db.session.commit()
 
         return {"status": "success", "message": "Product created successfully", "base_product_id": new_product.base_product_id}
@@ -124,6 +129,7 @@ class ProductColorCreation(Resource):
             color_description=color_description
         )
         db.session.add(new_color)
+        product_changed(base_product_id)
         db.session.commit()
 
         return {"status": "success", "message": "Color created successfully"}
@@ -159,6 +165,7 @@ class ProductSizeCreation(Resource):
             product_stock=product_stock
         )
         db.session.add(new_size)
+        product_changed(base_product_id)
         db.session.commit()
 
         return {"status": "success", "message": "Size created successfully"}
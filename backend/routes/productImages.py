@@ -1,8 +1,14 @@
 from flask_restx import Namespace, Resource, reqparse
-from flask import send_file, request
-from werkzeug.datastructures import FileStorage
+from flask import request, send_file
 from io import BytesIO
+from werkzeug.datastructures import FileStorage
 from backend.models import db, ProductColors
+from backend.cache import LRUCache
+from backend.catalogSync import product_changed
+from backend.imageStore import (
+    get_image_store, is_image_key, derivative_key, schedule_derivatives,
+    DERIVATIVE_SIZES, IMMUTABLE_MAX_AGE, UNVERSIONED_MAX_AGE
+)
 
 api = Namespace('productImages', description='API for uploading and retrieving product images')
 
@@ -15,6 +21,67 @@ upload_parser.add_argument('image', type=FileStorage, location='files', required
 retrieve_parser = reqparse.RequestParser()
 retrieve_parser.add_argument('base_product_id', type=int, required=True, help='ID of the base product')
 retrieve_parser.add_argument('color_name', type=str, required=True, help='Name of the product color')
+retrieve_parser.add_argument('v', type=str, required=False, help='Image version (content key) from the image URL')
+retrieve_parser.add_argument('size', type=str, required=False, choices=tuple(DERIVATIVE_SIZES), help='Precomputed rendition to serve; the original upload when omitted')
+
+# (base_product_id, color_name) -> image key, so image requests skip the Product_Colors lookup
+image_key_cache = LRUCache(maxsize=8192, ttl=UNVERSIONED_MAX_AGE)
+
+
+def save_product_image(product_color, image_bytes):
+    """
+    Store an uploaded image and point the product color at it. The caller commits.
+    Listing and detail responses are refreshed so their image URLs carry the new version.
+    The thumb/medium/full renditions are rendered in the background.
+    """
+    store = get_image_store()
+    key = store.put(image_bytes)
+    schedule_derivatives(store, key, image_bytes)
+    product_color.product_image = key
+    product_changed(product_color.base_product_id)
+    image_key_cache.delete((product_color.base_product_id, product_color.color_name))
+    return key
+
+
+def resolve_image_key(base_product_id, color_name):
+    """
+    Return the image key of a product color, or None if it has no image in the image store
+    (no image at all, or a legacy inline image that migrate_images_to_store has not moved yet).
+    """
+    cache_key = (base_product_id, color_name)
+    key = image_key_cache.get(cache_key)
+    if key is not None:
+        return key
+
+    value = db.session.query(ProductColors.product_image).filter_by(
+        base_product_id=base_product_id, color_name=color_name
+    ).scalar()
+    if not is_image_key(value):
+        return None
+
+    image_key_cache.set(cache_key, value)
+    return value
+
+
+def is_legacy_image(value):
+    """Raw image bytes stored in Product_Colors before the image store existed."""
+    return not is_image_key(value) and isinstance(value, (bytes, bytearray, memoryview)) and len(value) > 0
+
+
+def migrate_images_to_store():
+    """Move every legacy inline image into the image store. Safe to run repeatedly."""
+    store = get_image_store()
+    rows = db.session.query(ProductColors.base_product_id, ProductColors.color_name, ProductColors.product_image).all()
+    for base_product_id, color_name, value in rows:
+        if is_legacy_image(value):
+            key = store.put(bytes(value))
+            ProductColors.query.filter_by(base_product_id=base_product_id, color_name=color_name).update(
+                {ProductColors.product_image: key}, synchronize_session=False
+            )
+            product_changed(base_product_id)
+            db.session.commit()
+            image_key_cache.delete((base_product_id, color_name))
+
 
 # Route to upload an image
 @api.route('/upload')
@@ -32,9 +99,8 @@ class UploadImage(Resource):
         if not product_color:
             return {"status": "failure", "message": f"No product color found with base_product_id '{base_product_id}' and color_name '{color_name}'"}, 404
 
-        # Read image bytes and save to database
-        image_bytes = image_file.read()
-        product_color.product_image = image_bytes  # Changed from product_image_url to product_image
+        # Write the bytes to the content-addressed image store; the row only keeps the key
+        save_product_image(product_color, image_file.read())
 
         # Commit changes
         db.session.commit()
@@ -50,23 +116,50 @@ class RetrieveImage(Resource):
         args = retrieve_parser.parse_args()
         base_product_id = args.get('base_product_id')
         color_name = args.get('color_name')
+        version = args.get('v')
+        size = args.get('size')
 
-        # Retrieve the product color using both base_product_id and color_name
-        product_color = ProductColors.query.filter_by(base_product_id=base_product_id, color_name=color_name).first()
-        if not product_color:
-            return {"status": "failure", "message": f"No product color found with base_product_id '{base_product_id}' and color_name '{color_name}'"}, 404
+        store = get_image_store()
+
+        # Versioned URLs name the blob directly: no database access, cacheable forever
+        if version and is_image_key(version) and store.exists(version):
+            return send_image(store, version, size, versioned=True)
 
-        # If there's no image available
-        if not product_color.product_image:
+        image_key = resolve_image_key(base_product_id, color_name)
+        if image_key is None or not store.exists(image_key):
+            product_color = ProductColors.query.filter_by(base_product_id=base_product_id, color_name=color_name).first()
+            if not product_color:
+                return {"status": "failure", "message": f"No product color found with base_product_id '{base_product_id}' and color_name '{color_name}'"}, 404
+            if is_legacy_image(product_color.product_image):
+                # Not migrated yet: serve the inline bytes as before, read-only
+                return send_file(
+                    BytesIO(product_color.product_image),
+                    mimetype='image/png',
+                    as_attachment=False,
+                    download_name=f"product_{base_product_id}_color_{color_name}.png"
+                )
             return {"status": "failure", "message": f"No image found for base_product_id '{base_product_id}' and color_name '{color_name}'"}, 404
 
-        # Determine the MIME type (default to 'image/png' if not specified)
-        mime_type = 'image/png'  # Adjust if you have different image types
+        return send_image(store, image_key, size, versioned=False)
+
+
+def send_image(store, key, size, versioned):
+    """
+    Serve an original image or one of its renditions. A rendition that has not been rendered yet
+    (still queued, or an image stored before derivatives existed) is queued and the original is
+    served meanwhile, with a short max-age so clients pick the rendition up later. Originals whose
+    renditions cannot be rendered are served as they are, without queueing them again.
+    Strong ETag = blob key; If-None-Match and Range requests are handled by send_file.
+    """
+    if size:
+        rendition = derivative_key(key, size)
+        if store.exists(rendition):
+            key = rendition
+        else:
+            schedule_derivatives(store, key)
+            versioned = False
 
-        # Send the image file as a response
-        return send_file(
-            BytesIO(product_color.product_image),
-            mimetype=mime_type,
-            as_attachment=False,
-            download_name=f"product_{base_product_id}_color_{color_name}.png"
-        )
+    response = store.send(key, max_age=IMMUTABLE_MAX_AGE if versioned else UNVERSIONED_MAX_AGE)
+    if versioned:
+        response.cache_control.immutable = True
+    return response
@@ -3,14 +3,15 @@ import zipfile
 from collections import defaultdict
 from flask_restx import Namespace, Resource, reqparse
 from flask import request, jsonify, send_file
-from backend.models import db, Products, InvoiceItem, Customer, WishlistItem
-from backend.config import Config
-import jwt
+from backend.models import db, Products, InvoiceItem, Customer
+from backend.auth import token_required_with_role
 from backend.pdf_generator import generate_invoice_pdf
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime
+from backend.catalogSync import product_changed
+from backend.priceDrops import record_price_change
+from backend.cart import discounted_price
+from backend.salesRollup import sales_rollup
+from backend.salesAnalytics import sales_metrics, AnalyticsUnavailable, ANALYTICS_MAX_DAYS
+from datetime import datetime, timedelta, timezone
 
 
 api = Namespace(
@@ -26,27 +27,6 @@ api = Namespace(
     }
 )
 
-# Helper function to validate JWT token and role
-def token_required_with_role(required_role):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            token = request.headers.get('Authorization')
-            if not token:
-                return {"status": "failure", "message": "Token is missing"}, 401
-            try:
-                if token.startswith("Bearer "):
-                    token = token.split(" ")[1]
-                payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-                if payload.get('role') != required_role:
-                    return {"status": "failure", "message": "Unauthorized role"}, 403
-            except jwt.ExpiredSignatureError:
-                return {"status": "failure", "message": "Token has expired"}, 401
-            except jwt.InvalidTokenError:
-                return {"status": "failure", "message": "Invalid token"}, 401
-            return func(*args, **kwargs)
-        wrapper.__name__ = func.__name__
-        return wrapper
-    return decorator
 
 # Define parsers for price and discount updates
 price_parser = reqparse.RequestParser()
@@ -78,7 +58,10 @@ class UpdatePrice(Resource):
             return {"status": "failure", "message": "Product not found"}, 404
 
         # Update the price
+        old_price = discounted_price(product)
         product.price = new_price
+        record_price_change(product, old_price, discounted_price(product))
+        product_changed(base_product_id)
         db.session.commit()
 
         return {"status": "success", "message": "Product price updated successfully", "product_id": base_product_id, "new_price": new_price}
@@ -106,74 +89,21 @@ class UpdateDiscount(Resource):
             return {"status": "failure", "message": "Product not found"}, 404
 
         # Update the discount percentage
+        old_price = discounted_price(product)
         product.discount_percentage = new_discount
+        # Wishlists are notified by the price drop detector job committed together with the discount
+        job = record_price_change(product, old_price, discounted_price(product))
+        product_changed(base_product_id)
         db.session.commit()
 
-        # Add this line here if the update completes successfully
-        success_message = {
+        return {
             "status": "success",
             "message": "Product discount updated successfully",
             "product_id": base_product_id,
-            "new_discount": new_discount
+            "new_discount": new_discount,
+            "notification_job_id": job.job_id if job is not None else None
         }
 
-        # Calculate the new discounted price
-        discounted_price = float(product.price) * (1 - float(new_discount) / 100)
-
-        try:
-            # Fetch wishlist items related to this product
-            wishlist_items = WishlistItem.query.filter_by(base_product_id=base_product_id).all()
-
-            if not wishlist_items:
-                return success_message  # No customers to notify, return success message
-
-            # Notify customers with this product in their wishlist
-            sender_email = "GMAIL_APP_PASSWORD"  # Replace with your sender email
-            sender_password = "GMAIL_APP_PASSWORD"  # Replace with your sender password
-
-            for item in wishlist_items:
-                customer = Customer.query.filter_by(customer_id=item.customer_id).first()
-                if customer:
-                    # Send email notification
-                    try:
-                        smtp_server = "smtp.gmail.com"
-                        smtp_port = 465
-
-                        subject = f"Discount Alert: {product.product_name} Now at ${discounted_price:.2f}!"
-                        body = f"""Dear {customer.name},
-
-Good news! The product "{product.product_name}" in your wishlist is now available at a discounted price of ${discounted_price:.2f} (Discount: {new_discount}%).
-
-Don't miss out! Check it out now.
-
-Best regards,
-Melangé Team
-"""
-
-                        message = MIMEMultipart()
-                        message["From"] = sender_email
-                        message["To"] = customer.email_address
-                        message["Subject"] = subject
-                        message.attach(MIMEText(body, "plain"))
-
-                        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-                            server.login(sender_email, sender_password)
-                            server.sendmail(sender_email, customer.email_address, message.as_string())
-
-                        print(f"Discount email sent to {customer.email_address}")
-                    except Exception as email_error:
-                        print(f"Failed to send email to {customer.email_address}: {email_error}")
-
-            # Return success message after all notifications
-            return success_message
-
-        except Exception as e:
-            print(f"Error during discount update and notification: {e}")
-            return {
-                "status": "failure",
-                "message": "Product discount updated, but error occurred while notifying customers",
-                "error": str(e)
-            }
 
 # Swagger parser for filtering invoices by date
 invoices_parser = reqparse.RequestParser()
@@ -305,46 +235,117 @@ class GenerateInvoicePDF(Resource):
             download_name=f"invoice_{purchase_time.strftime('%Y%m%d%H%M')}_customer_{customer_id}.pdf"
         )
 
+def rollup_range(args):
+    """UTC [start, end) of the start_date and end_date arguments (both days included)."""
+    start = end = None
+    if args.get('start_date'):
+        start = datetime.strptime(args['start_date'], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    if args.get('end_date'):
+        end = datetime.strptime(args['end_date'], "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1)
+    return start, end
+
+
 @api.route('/revenueAnalysis')
 class RevenueAnalysis(Resource):
     @api.doc(security='BearerAuth')
     @api.expect(invoices_parser)  # Use the same parser for start_date and end_date
     @token_required_with_role('salesManager')  # Restrict access to Sales Managers
     def get(self):
-        """Calculate daily revenue and purchase count in a given time interval"""
+        """
+        Calculate daily revenue and purchase count in a given time interval (UTC days, both
+        included). Complete days come from the sales rollup; only today is read from the invoices.
+        """
         args = invoices_parser.parse_args()
-        start_date = args.get('start_date')
-        end_date = args.get('end_date')
+        try:
+            start, end = rollup_range(args)
+        except ValueError:
+            return {"status": "failure", "message": "Invalid date format. Use YYYY-MM-DD."}, 400
 
-        # Build the base query
-        query = db.session.query(
-            db.func.date(InvoiceItem.purchased_date).label('purchase_date'),
-            db.func.sum(InvoiceItem.price_at_purchase * InvoiceItem.product_quantity).label('total_revenue'),
-            db.func.count(InvoiceItem.invoice_item_id).label('purchase_count')
-        )
+        response_data = [
+            {
+                "date": row["bucket_start"].strftime("%Y-%m-%d"),
+                "total_revenue": float(row["revenue"]),
+                "purchase_count": row["item_count"],
+                "units": row["units"],
+                "order_count": row["order_count"]
+            }
+            for row in sales_rollup('day', 'total', start, end)
+        ]
 
-        # Apply date filters if provided
-        if start_date:
-            query = query.filter(InvoiceItem.purchased_date >= start_date)
-        if end_date:
-            query = query.filter(InvoiceItem.purchased_date <= end_date)
+        return {"status": "success", "data": response_data}, 200
 
-        # Group by date
-        query = query.group_by(db.func.date(InvoiceItem.purchased_date))
-        query = query.order_by(db.func.date(InvoiceItem.purchased_date))  # Ensure results are sorted by date
 
-        # Execute query
-        results = query.all()
+sales_rollup_parser = invoices_parser.copy()
+sales_rollup_parser.add_argument('granularity', type=str, choices=['day', 'hour'], default='day', help='Bucket size (UTC)')
+sales_rollup_parser.add_argument('breakdown', type=str, choices=['total', 'category', 'product'], default='total', help='Totals, or one row per category or product and bucket')
 
-        # Prepare the response
-        response_data = [
-            {
-                "date": result.purchase_date.strftime("%Y-%m-%d"),
-                "total_revenue": float(result.total_revenue),
-                "purchase_count": result.purchase_count
+
+@api.route('/salesRollup')
+class SalesRollupReport(Resource):
+    @api.doc(security='BearerAuth')
+    @api.expect(sales_rollup_parser)
+    @token_required_with_role('salesManager')
+    def get(self):
+        """
+        Gross revenue, units, invoice items and orders per day or hour, in total or per category
+        or product. category_id / product_id 0 collects items of deleted products.
+        """
+        args = sales_rollup_parser.parse_args()
+        try:
+            start, end = rollup_range(args)
+        except ValueError:
+            return {"status": "failure", "message": "Invalid date format. Use YYYY-MM-DD."}, 400
+
+        id_key = {"category": "category_id", "product": "product_id"}.get(args['breakdown'])
+        response_data = []
+        for row in sales_rollup(args['granularity'], args['breakdown'], start, end):
+            entry = {
+                "period_start": row["bucket_start"].isoformat(),
+                "revenue": float(row["revenue"]),
+                "units": row["units"],
+                "item_count": row["item_count"],
+                "order_count": row["order_count"]
             }
-            for result in results
-        ]
+            if id_key:
+                entry[id_key] = row["dimension_id"]
+            response_data.append(entry)
 
         return {"status": "success", "data": response_data}, 200
 
+
+analytics_parser = invoices_parser.copy()
+analytics_parser.add_argument('top', type=int, default=10, help='Number of top products (1-100)')
+
+
+@api.route('/analytics')
+class SalesAnalytics(Resource):
+    @api.doc(security='BearerAuth')
+    @api.expect(analytics_parser)
+    @token_required_with_role('salesManager')
+    def get(self):
+        """
+        Revenue net of refunds and cancellations, discount cost, per-category margins, top products
+        and repeat-customer cohorts for the UTC days start_date..end_date (default: the last 30 days).
+        """
+        args = analytics_parser.parse_args()
+        today = datetime.now(timezone.utc).date()
+        try:
+            end_day = datetime.strptime(args['end_date'], "%Y-%m-%d").date() if args.get('end_date') else today
+            start_day = datetime.strptime(args['start_date'], "%Y-%m-%d").date() if args.get('start_date') \
+                else end_day - timedelta(days=29)
+        except ValueError:
+            return {"status": "failure", "message": "Invalid date format. Use YYYY-MM-DD."}, 400
+        if start_day > end_day:
+            return {"status": "failure", "message": "start_date must not be after end_date"}, 400
+        if (end_day - start_day).days >= ANALYTICS_MAX_DAYS:
+            return {"status": "failure", "message": f"Date range is limited to {ANALYTICS_MAX_DAYS} days"}, 400
+        if not 1 <= args['top'] <= 100:
+            return {"status": "failure", "message": "top must be between 1 and 100"}, 400
+
+        try:
+            metrics = sales_metrics(start_day, end_day, top=args['top'])
+        except AnalyticsUnavailable as e:
+            return {"status": "failure", "message": str(e)}, 503
+
+        return {"status": "success", "data": metrics}, 200
+
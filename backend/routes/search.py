@@ -1,11 +1,16 @@
 from flask_restx import Namespace, Resource, reqparse
-from backend.models import db, Products, ProductColors
+from backend.catalogSync import get_product_search_index, get_suggestion_index
 
 api = Namespace('searchMethods', description='Search functionality for products and colors')
 
+MAX_PAGE_SIZE = 100
+MAX_SUGGESTIONS = 20
+
 # Define a parser for search parameters
 search_parser = reqparse.RequestParser()
 search_parser.add_argument('keyword', type=str, required=True, help="Keyword to search for in product name, color name, or color description")
+search_parser.add_argument('limit', type=int, required=False, help=f"Page size (1-{MAX_PAGE_SIZE}); omit to return every match")
+search_parser.add_argument('offset', type=int, required=False, default=0, help="Number of results to skip")
 
 # Route for searching products and colors
 @api.route('/search')
@@ -14,35 +19,49 @@ class SearchProducts(Resource):
     def get(self):
         args = search_parser.parse_args()
         keyword = args.get('keyword').strip()  # Ensure keyword is stripped of extra whitespace
+        limit = args.get('limit')
+        offset = args.get('offset') or 0
 
-        # Build the query
-        query = db.session.query(
-            Products.base_product_id,
-            Products.product_name,
-            Products.price,
-            ProductColors.color_name,
-            ProductColors.color_description
-        ).join(ProductColors, Products.base_product_id == ProductColors.base_product_id)
-
-        # Apply search filter
-        query = query.filter(
-            (Products.product_name.ilike(f"%{keyword}%")) |  # Search in product_name
-            (ProductColors.color_name.ilike(f"%{keyword}%")) |  # Search in color_name
-            (ProductColors.color_description.ilike(f"%{keyword}%"))  # Search in color_description
-        )
+        if limit is not None and not (1 <= limit <= MAX_PAGE_SIZE):
+            return {"status": "failure", "message": f"limit must be between 1 and {MAX_PAGE_SIZE}"}, 400
+        if offset < 0:
+            return {"status": "failure", "message": "offset must not be negative"}, 400
 
-        search_results = query.all()
+        # Every term must match a word in the product name, color name or color description
+        # (prefix matches included); results are ranked by relevance
+        total, search_results = get_product_search_index().search(keyword, limit=limit, offset=offset)
 
         # Prepare response
         results = [
             {
-                "product_id": result.base_product_id,
-                "product_name": result.product_name,
-                "price": float(result.price),
-                "color_name": result.color_name,
-                "color_description": result.color_description
+                "product_id": result["base_product_id"],
+                "product_name": result["product_name"],
+                "price": result["price"],
+                "color_name": result["color_name"],
+                "color_description": result["color_description"],
+                "score": result["score"]
             }
             for result in search_results
         ]
 
-        return {"status": "success", "results": results}, 200
\ No newline at end of file
+        return {"status": "success", "results": results, "total": total}, 200
+
+
+suggest_parser = reqparse.RequestParser()
+suggest_parser.add_argument('prefix', type=str, required=True, help="Text typed so far")
+suggest_parser.add_argument('limit', type=int, required=False, default=10, help=f"Number of suggestions (1-{MAX_SUGGESTIONS})")
+
+# Route for typeahead suggestions
+@api.route('/suggest')
+class SuggestProducts(Resource):
+    @api.expect(suggest_parser)
+    def get(self):
+        """Suggest product, color and category names starting with the typed prefix"""
+        args = suggest_parser.parse_args()
+        limit = args.get('limit') or 10
+
+        if not (1 <= limit <= MAX_SUGGESTIONS):
+            return {"status": "failure", "message": f"limit must be between 1 and {MAX_SUGGESTIONS}"}, 400
+
+        suggestions = get_suggestion_index().suggest(args.get('prefix'), limit=limit)
+        return {"status": "success", "suggestions": suggestions}, 200
@@ -1,7 +1,9 @@
 from flask_restx import Namespace, Resource, fields, reqparse
 from flask import request, jsonify
 from backend.models import db, ShoppingBagItem, ProductColors, ProductSizes, Products
-from backend.utils import decode_jwt_token
+from backend.auth import token_required
+from backend.catalogSync import product_image_url
+from backend.cart import load_cart_lines, discounted_price, existing_variants, add_to_cart
 
 # Namespace with Swagger Security Definitions
 api = Namespace(
@@ -29,28 +31,6 @@ view_cart_parser = api.parser()
 view_cart_parser.add_argument('Authorization', location='headers', required=True, help='Bearer token is required')
 
 
-# Decorator to check for a valid JWT token
-def token_required(func):
-    def wrapper(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"status": "failure", "message": "Token is missing"}, 401
-        try:
-            # Remove 'Bearer ' prefix if present
-            token = token.replace('Bearer ', '')
-            decoded_token = decode_jwt_token(token)
-            if not decoded_token:
-                return {"status": "failure", "message": "Invalid or expired token"}, 401
-            # Pass the decoded token to the route function
-            request.customer = decoded_token
-        except Exception as e:
-            return {"status": "failure", "message": str(e)}, 401
-        return func(*args, **kwargs)
-
-    wrapper.__name__ = func.__name__  # Preserve original function name
-    return wrapper
-
-
 # POST /shopping-cart/add: Add product to cart
 @api.route('/add')
 class AddToCart(Resource):
@@ -106,32 +86,20 @@ class ViewCart(Resource):
     @token_required
     def get(self):
         customer_id = request.customer['customer_id']
-        cart_items = ShoppingBagItem.query.filter_by(customer_id=customer_id).all()
+        # Lines, products, images and stock come from one joined query
+        cart_lines = load_cart_lines(ShoppingBagItem, customer_id)
 
-        if not cart_items:
+        if not cart_lines:
             return {"status": "failure", "message": "No items in the shopping cart"}, 404
 
         cart_data = []
-        for item in cart_items:
-            product = Products.query.filter_by(base_product_id=item.base_product_id).first()
+        for item, product, product_image, size_info, _ in cart_lines:
             if not product:
                 continue
 
-            color_info = ProductColors.query.filter_by(
-                base_product_id=item.base_product_id,
-                color_name=item.color_name
-            ).first()
-
-            size_info = ProductSizes.query.filter_by(
-                base_product_id=item.base_product_id,
-                color_name=item.color_name,
-                size_name=item.size_name
-            ).first()
-
             # --- RECALCULATE DISCOUNTED PRICE ON THE FLY ---
             original_price = float(product.price)
             discount_percent = float(product.discount_percentage or 0)
-            discounted_price = original_price * (1 - discount_percent / 100.0)
 
             cart_data.append({
                 "product_id": product.base_product_id,
@@ -139,11 +107,11 @@ class ViewCart(Resource):
                 "color_name": item.color_name,
                 "size_name": item.size_name,
                 "quantity": item.product_quantity,
-                "price": round(discounted_price, 2),  # Return the discounted price
+                "price": round(discounted_price(product), 2),  # Return the discounted price
                 "original_price": round(original_price, 2),
                 "discount_percentage": discount_percent,
                 "product_stock": int(size_info.product_stock) if size_info else 0,
-                "image_url": f"/productImages/retrieve?base_product_id={item.base_product_id}&color_name={item.color_name}"
+                "image_url": product_image_url(item.base_product_id, item.color_name, product_image, size='thumb')
             })
 
         return jsonify({"status": "success", "cart_items": cart_data})
@@ -173,60 +141,35 @@ class AddBatchToCart(Resource):
 
         # Collect error messages for debugging
         errors = []
-        success_count = 0
-
+        items = []
         for item in shopping_bag:
             try:
-                base_product_id = item['product_id']
-                color_name = item['color_name']
-                size_name = item['size_name']
-                quantity = item['quantity']
-
-                # Validate foreign key constraints
-                product_color = ProductColors.query.filter_by(
-                    base_product_id=base_product_id, color_name=color_name
-                ).first()
-                if not product_color:
-                    errors.append(f"Invalid color: {color_name} for product ID: {base_product_id}")
-                    continue
-
-                product_size = ProductSizes.query.filter_by(
-                    base_product_id=base_product_id, color_name=color_name, size_name=size_name
-                ).first()
-                if not product_size:
-                    errors.append(f"Invalid size: {size_name} for color: {color_name} and product ID: {base_product_id}")
-                    continue
-
-                # Check if the item already exists in the cart
-                cart_item = ShoppingBagItem.query.filter_by(
-                    customer_id=customer_id,
-                    base_product_id=base_product_id,
-                    color_name=color_name,
-                    size_name=size_name
-                ).first()
-
-                if cart_item:
-                    # Update the quantity
-                    cart_item.product_quantity += quantity
-                else:
-                    # Add a new item to the cart
-                    new_item = ShoppingBagItem(
-                        customer_id=customer_id,
-                        base_product_id=base_product_id,
-                        color_name=color_name,
-                        size_name=size_name,
-                        product_quantity=quantity
-                    )
-                    db.session.add(new_item)
-
-                success_count += 1
-
+                key = (int(item['product_id']), item['color_name'], item['size_name'])
+                items.append((item, key, int(item['quantity'])))
             except KeyError as e:
                 errors.append(f"Missing required field: {str(e)} in item: {item}")
             except Exception as e:
                 errors.append(f"Error processing item: {item}, {str(e)}")
 
-        # Commit all valid changes to the database
+        # Validate every (product, color, size) key at once
+        colors, sizes = existing_variants([key for _, key, _ in items])
+
+        # Merge quantities of repeated keys so each cart line is written once
+        quantities = {}
+        success_count = 0
+        for item, key, quantity in items:
+            base_product_id, color_name, size_name = key
+            if (base_product_id, color_name) not in colors:
+                errors.append(f"Invalid color: {color_name} for product ID: {base_product_id}")
+                continue
+            if key not in sizes:
+                errors.append(f"Invalid size: {size_name} for color: {color_name} and product ID: {base_product_id}")
+                continue
+            quantities[key] = quantities.get(key, 0) + quantity
+            success_count += 1
+
+        # Insert new lines and increment existing ones in one statement, then commit
+        add_to_cart(customer_id, quantities)
         db.session.commit()
 
         # Return a detailed response
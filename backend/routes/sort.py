@@ -1,16 +1,121 @@
+import json
+from flask import Response, stream_with_context
 from flask_restx import Namespace, Resource, reqparse
 from sqlalchemy import func
-from backend.models import db, Products, Categories, ProductColors,ProductSizes,ProductRating
-from sqlalchemy.orm import aliased
+from backend.models import db, ProductListing, ProductListingFacet
+from backend.catalogSync import PRICE_BUCKETS, DISCOUNT_THRESHOLDS, RATING_THRESHOLDS
+from backend.pagination import encode_cursor, decode_cursor, keyset_filter
 
 api = Namespace('sortingMethods', description='Operations related to sorting')
 
 # Define a parser for sorting and filtering parameters
+MAX_PAGE_SIZE = 200
+
 sorting_parser = reqparse.RequestParser()
 sorting_parser.add_argument('sort_by', type=str, required=False, choices=['price', 'discount_percentage','popularity'], help="Field to sort by: 'price' or 'discount_percentage' or 'popularity'")
 sorting_parser.add_argument('order', type=str, required=False, choices=['asc', 'desc'], help="Sort order: 'asc' for ascending, 'desc' for descending")
 sorting_parser.add_argument('category_id', type=int, required=False, help="Filter by category ID")
 sorting_parser.add_argument('category_gender', type=str, required=False, choices=['Men', 'Women', 'Unisex'], help="Filter by category gender")
+sorting_parser.add_argument('limit', type=int, required=False, help=f"Page size (1-{MAX_PAGE_SIZE}); omit to return every matching product")
+sorting_parser.add_argument('cursor', type=str, required=False, help="Value of next_cursor from the previous page")
+sorting_parser.add_argument('format', type=str, required=False, choices=['json', 'ndjson'], help="'ndjson' streams one product per line")
+sorting_parser.add_argument('min_price', type=float, required=False, help="Minimum price")
+sorting_parser.add_argument('max_price', type=float, required=False, help="Maximum price")
+sorting_parser.add_argument('min_discount', type=float, required=False, help="Minimum discount percentage")
+sorting_parser.add_argument('min_rating', type=float, required=False, help="Minimum average rating")
+sorting_parser.add_argument('color', type=str, action='append', required=False, help="Color name; repeat to match any of several colors")
+sorting_parser.add_argument('size', type=str, action='append', required=False, help="Size that must be in stock; repeat to match any of several sizes")
+sorting_parser.add_argument('distributor', type=str, action='append', required=False, help="Distributor; repeat to match any of several distributors")
+
+STREAM_BATCH_SIZE = 500
+
+# Facet values that are ranges or thresholds are listed in this order instead of by count
+FACET_ORDER = {
+    'price': [f"{low}+" if high is None else f"{low}-{high}" for low, high in PRICE_BUCKETS],
+    'discount': [f"{threshold}+" for threshold in DISCOUNT_THRESHOLDS],
+    'rating': [f"{threshold}+" for threshold in RATING_THRESHOLDS],
+}
+FACETS = ['color', 'size', 'distributor', 'price', 'discount', 'rating']
+
+
+def listing_to_dict(product):
+    """Serialize a Product_Listing row for the catalog listing response."""
+    return {
+        "product_id": product.base_product_id,
+        "product_name": product.product_name,
+        "price": float(product.price),
+        "discount_percentage": float(product.discount_percentage),
+        "average_rating": float(product.average_rating),
+        "distributor": product.distributor,
+        "category_name": product.category_name,
+        "category_gender": product.category_gender,
+        "colors": product.colors,  # List of available colors
+        "sizes": product.sizes,  # List of available sizes
+        "popularity": float(product.popularity),
+        "image_url": product.image_url
+    }
+
+
+def has_facet_value(facet, values):
+    """Filter listing rows having any of the given values for a facet."""
+    return ProductListing.base_product_id.in_(
+        db.session.query(ProductListingFacet.base_product_id).filter(
+            ProductListingFacet.facet == facet,
+            ProductListingFacet.value.in_(values)
+        )
+    )
+
+
+def _count_facet_values(query, facets=None):
+    """(facet, value, count) of the products matching a listing query, optionally only for some facets."""
+    matching_ids = query.with_entities(ProductListing.base_product_id)
+    counts = db.session.query(
+        ProductListingFacet.facet,
+        ProductListingFacet.value,
+        func.count(ProductListingFacet.base_product_id)
+    ).filter(
+        ProductListingFacet.base_product_id.in_(matching_ids)
+    )
+    if facets is not None:
+        counts = counts.filter(ProductListingFacet.facet.in_(facets))
+    return counts.group_by(ProductListingFacet.facet, ProductListingFacet.value).all()
+
+
+def facet_counts(query, selected=None):
+    """
+    Count the products matching the (filtered, unsorted) listing query per facet value.
+    `query` must not include the multi-select filters in `selected` ({facet: values}); those are
+    counted disjunctively: the values of a selected facet are counted with every filter except its
+    own, so the alternatives to the current selection keep their counts. Facets without a selection
+    share one GROUP BY over Product_Listing_Facet; each selected facet needs one more.
+    """
+    selected = {facet: values for facet, values in (selected or {}).items() if values}
+
+    def filtered(skip=None):
+        narrowed = query
+        for facet, values in selected.items():
+            if facet != skip:
+                narrowed = narrowed.filter(has_facet_value(facet, values))
+        return narrowed
+
+    unselected = [facet for facet in FACETS if facet not in selected]
+    rows = _count_facet_values(filtered(), unselected) if unselected else []
+    for facet in selected:
+        rows += _count_facet_values(filtered(skip=facet), [facet])
+
+    counts = {facet: {} for facet in FACETS}
+    for facet, value, count in rows:
+        counts.setdefault(facet, {})[value] = count
+
+    facets = {}
+    for facet, values in counts.items():
+        order = FACET_ORDER.get(facet)
+        if order is not None:
+            ordered = [value for value in order if value in values]
+        else:
+            ordered = sorted(values, key=lambda value: (-values[value], value))
+        facets[facet] = [{"value": value, "count": values[value]} for value in ordered]
+    return facets
 
 
 @api.route('/sorting')
@@ -18,95 +123,93 @@ class SortedProducts(Resource):
     @api.expect(sorting_parser)
     def get(self):
         args = sorting_parser.parse_args()
-        sort_by = args.get('sort_by', 'price')  # Default to 'price'
-        order = args.get('order', 'asc')  # Default to 'asc'
+        sort_by = args.get('sort_by') or 'price'  # Default to 'price'
+        order = args.get('order') or 'asc'  # Default to 'asc'
 
         category_id = args.get('category_id')
         category_gender = args.get('category_gender')
 
-        # Sorting logic
-        sort_column = getattr(Products, sort_by, Products.price)
-        sort_order = sort_column.asc() if order == 'asc' else sort_column.desc()
-
-        # Subquery for DISTINCT ON equivalent
-        subquery = (
-            db.session.query(
-                Products.base_product_id,
-                db.func.min(Products.price).label('min_price')  # Get the product with the lowest price per base_product_id
-            )
-            .group_by(Products.base_product_id)
-            .subquery()
-        )
+        limit = args.get('limit')
+        cursor = args.get('cursor')
+        response_format = args.get('format') or 'json'
 
-        # Join ProductRating to calculate popularity
-        popularity_column = func.coalesce(
-            (func.avg(ProductRating.customer_rate) * func.count(ProductRating.customer_rate)), 0
-        ).label('popularity')
-
-        query = (
-            db.session.query(
-                Products.base_product_id,
-                Products.product_name,
-                Products.price,
-                Products.discount_percentage,
-                Products.average_rating,
-                Products.distributor,
-                Categories.category_name,
-                Categories.category_gender,
-                db.func.array_agg(ProductColors.color_name).label('colors'),
-                db.func.array_agg(ProductSizes.size_name).label('sizes'),
-                popularity_column
-            )
-            .join(subquery, Products.base_product_id == subquery.c.base_product_id)
-            .join(Categories, Products.category_id == Categories.category_id)
-            .outerjoin(ProductColors, Products.base_product_id == ProductColors.base_product_id)
-            .outerjoin(ProductSizes, (Products.base_product_id == ProductSizes.base_product_id) &
-                                    (ProductColors.color_name == ProductSizes.color_name))
-            .outerjoin(ProductRating, Products.base_product_id == ProductRating.product_id)  # Join with ratings
-            .group_by(
-                Products.base_product_id,
-                Products.product_name,
-                Products.price,
-                Products.discount_percentage,
-                Products.average_rating,
-                Products.distributor,
-                Categories.category_name,
-                Categories.category_gender
-            )
-        )
+        if limit is not None and not (1 <= limit <= MAX_PAGE_SIZE):
+            return {"status": "failure", "message": f"limit must be between 1 and {MAX_PAGE_SIZE}"}, 400
+
+        # Products are read from the precomputed Product_Listing read model
+        # (maintained by backend.catalogSync) instead of aggregating colors, sizes and ratings per request
+        sort_column = getattr(ProductListing, sort_by, ProductListing.price)
+        descending = order == 'desc'
+
+        query = ProductListing.query
 
         # Apply filters
         if category_id:
-            query = query.filter(Products.category_id == category_id)
+            query = query.filter(ProductListing.category_id == category_id)
         if category_gender:
-            query = query.filter(Categories.category_gender == category_gender)
+            query = query.filter(ProductListing.category_gender == category_gender)
+        if args.get('min_price') is not None:
+            query = query.filter(ProductListing.price >= args['min_price'])
+        if args.get('max_price') is not None:
+            query = query.filter(ProductListing.price <= args['max_price'])
+        if args.get('min_discount') is not None:
+            query = query.filter(ProductListing.discount_percentage >= args['min_discount'])
+        if args.get('min_rating') is not None:
+            query = query.filter(ProductListing.average_rating >= args['min_rating'])
+        selected = {facet: args[facet] for facet in ('color', 'size', 'distributor') if args.get(facet)}
+
+        # Facet counts describe the whole filtered result, so they are only computed for its first page
+        facets = facet_counts(query, selected) if response_format == 'json' and not cursor else None
+
+        # Multi-valued attributes are matched through the facet table; values of one facet are OR-ed
+        for facet, values in selected.items():
+            query = query.filter(has_facet_value(facet, values))
+
+        # Keyset pagination on (sort column, base_product_id); the id breaks ties so pages never overlap
+        if cursor:
+            try:
+                last_value, last_id = decode_cursor(cursor)
+                last_value = sort_column.type.python_type(last_value)
+                last_id = int(last_id)
+            except (TypeError, ValueError, ArithmeticError):
+                return {"status": "failure", "message": "Invalid cursor"}, 400
+            query = query.filter(keyset_filter(
+                [sort_column, ProductListing.base_product_id], [last_value, last_id], descending=descending
+            ))
 
         # Apply sorting
-        if sort_by == "popularity":
-            query = query.order_by(popularity_column.desc() if order == 'desc' else popularity_column.asc())
+        if descending:
+            query = query.order_by(sort_column.desc(), ProductListing.base_product_id.desc())
         else:
-            query = query.order_by(sort_order)
+            query = query.order_by(sort_column.asc(), ProductListing.base_product_id.asc())
+
+        if response_format == 'ndjson':
+            if limit:
+                query = query.limit(limit)
+
+            def generate():
+                for product in query.yield_per(STREAM_BATCH_SIZE):
+                    yield json.dumps(listing_to_dict(product)) + "\n"
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        # Fetch one extra row to know whether another page exists
+        if limit:
+            query = query.limit(limit + 1)
 
         # Execute the query
         results = query.all()
 
+        next_cursor = None
+        if limit and len(results) > limit:
+            results = results[:limit]
+            last = results[-1]
+            next_cursor = encode_cursor(getattr(last, sort_column.key), last.base_product_id)
+
         # Prepare response
-        products_data = [
-            {
-                "product_id": product.base_product_id,
-                "product_name": product.product_name,
-                "price": float(product.price),
-                "discount_percentage": float(product.discount_percentage),
-                "average_rating": float(product.average_rating),
-                "distributor": product.distributor,
-                "category_name": product.category_name,
-                "category_gender": product.category_gender,
-                "colors": product.colors,  # List of available colors
-                "sizes": product.sizes,  # List of available sizes
-                "popularity": float(product.popularity),
-                "image_url": f"/productImages/retrieve?base_product_id={product.base_product_id}&color_name={product.colors[0]}"
-            }
-            for product in results
-        ]
-
-        return {"status": "success", "products": products_data}, 200
\ No newline at end of file
+        products_data = [listing_to_dict(product) for product in results]
+
+        response = {"status": "success", "products": products_data, "next_cursor": next_cursor}
+        if facets is not None:
+            response["facets"] = facets
+        return response, 200
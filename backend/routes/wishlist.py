@@ -1,7 +1,9 @@
 from flask_restx import Namespace, Resource, fields
 from flask import request, jsonify
 from backend.models import db, WishlistItem, ProductColors, ProductSizes, Products
-from backend.utils import decode_jwt_token
+from backend.auth import token_required
+from backend.catalogSync import product_image_url
+from backend.cart import load_cart_lines, discounted_price
 
 # Namespace for Wishlist
 wishlist_api = Namespace(
@@ -26,23 +28,6 @@ add_to_wishlist_model = wishlist_api.model('AddToWishlist', {
     'product_quantity': fields.Integer(required=False, default=1, description='The quantity of the product to add')
 })
 
-# Helper function to get customer ID from the JWT token
-def token_required(func):
-    def wrapper(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"status": "failure", "message": "Token is missing"}, 401
-        try:
-            token = token.replace('Bearer ', '')
-            decoded_token = decode_jwt_token(token)
-            if not decoded_token:
-                return {"status": "failure", "message": "Invalid or expired token"}, 401
-            request.customer = decoded_token
-        except Exception as e:
-            return {"status": "failure", "message": str(e)}, 401
-        return func(*args, **kwargs)
-    wrapper.__name__ = func.__name__
-    return wrapper
 
 # POST /wishlist/add: Add product to wishlist
 @wishlist_api.route('/add')
@@ -101,27 +86,14 @@ class ViewWishlist(Resource):
     def get(self):
         customer_id = request.customer['customer_id']
         try:
-            wishlist_items = db.session.query(
-                WishlistItem,
-                Products,
-                ProductColors
-            ).join(
-                Products, WishlistItem.base_product_id == Products.base_product_id
-            ).join(
-                ProductColors,
-                (WishlistItem.base_product_id == ProductColors.base_product_id) &
-                (WishlistItem.color_name == ProductColors.color_name)
-            ).filter(
-                WishlistItem.customer_id == customer_id
-            ).all()
+            wishlist_items = [line for line in load_cart_lines(WishlistItem, customer_id) if line.product]
 
             if not wishlist_items:
                 return {"status": "failure", "message": "No items in the wishlist"}, 404
 
             result = []
-            for wishlist_item, product, product_color in wishlist_items:
+            for wishlist_item, product, product_image, _, _ in wishlist_items:
                 discount_percentage = float(product.discount_percentage or 0.0)
-                discounted_price = float(product.price) * (1 - discount_percentage / 100.0)
 
                 result.append({
                     "product_id": wishlist_item.base_product_id,
@@ -132,8 +104,8 @@ class ViewWishlist(Resource):
                     "product_quantity": wishlist_item.product_quantity,
                     "product_price": float(product.price),
                     "discount_percentage": discount_percentage,
-                    "discounted_price": round(discounted_price, 2),
-                    "image_url": f"/productImages/retrieve?base_product_id={wishlist_item.base_product_id}&color_name={wishlist_item.color_name}",
+                    "discounted_price": round(discounted_price(product), 2),
+                    "image_url": product_image_url(wishlist_item.base_product_id, wishlist_item.color_name, product_image, size='thumb'),
                     "added_date": wishlist_item.wishlist_item_addition_date.isoformat()
                 })
 
@@ -0,0 +1,269 @@
+"""
+Vectorized sales analytics over Invoice_Item.
+
+Invoice items are loaded per UTC day into columnar chunks (one NumPy array per column) with a single
+query per run of missing days, and the chunks of complete days are cached for ANALYTICS_CACHE_TTL
+seconds. Metrics for a date range are computed on the concatenated chunks with array operations:
+gross and net revenue (approved refunds and cancellations netted out by delivery_status), discount
+cost, per-category margins, top products and repeat-customer cohorts.
+
+Product costs are not recorded, so margins assume a unit cost of ANALYTICS_COST_RATIO (default
+0.5) of the product's current list price. Discount cost is likewise measured against the current
+list price.
+"""
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from backend.cache import LRUCache
+from backend.models import db, InvoiceItem, Products
+
+try:  # NumPy is optional: without it the analytics endpoint is unavailable
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+DEFAULT_COST_RATIO = 0.5
+ANALYTICS_CACHE_TTL = 600  # seconds a complete day's chunk is reused; refund decisions show up after this
+ANALYTICS_MAX_DAYS = 366
+NETTED_STATUSES = (6, 8)  # refund approved, cancelled
+LOAD_BATCH_SIZE = 10000  # rows converted to arrays at a time
+
+COLUMNS = ('purchased', 'customer_id', 'product_id', 'category_id', 'price', 'list_price', 'quantity', 'status')
+
+_day_chunks = LRUCache(maxsize=ANALYTICS_MAX_DAYS + 30, ttl=ANALYTICS_CACHE_TTL)
+_first_purchases = LRUCache(maxsize=1, ttl=ANALYTICS_CACHE_TTL)
+
+
+class AnalyticsUnavailable(Exception):
+    """NumPy is not installed."""
+
+
+def _require_numpy():
+    if np is None:
+        raise AnalyticsUnavailable("Sales analytics require NumPy")
+
+
+def _utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _empty_chunk():
+    return {
+        'purchased': np.empty(0, np.int64), 'customer_id': np.empty(0, np.int64),
+        'product_id': np.empty(0, np.int64), 'category_id': np.empty(0, np.int64),
+        'price': np.empty(0, np.float64), 'list_price': np.empty(0, np.float64),
+        'quantity': np.empty(0, np.int64), 'status': np.empty(0, np.int16)
+    }
+
+
+def _to_chunk(rows):
+    """Columnar chunk of (purchased_date, customer_id, product_id, category_id, price, list_price, quantity, status) rows."""
+    if not rows:
+        return _empty_chunk()
+    purchased, customer_id, product_id, category_id, price, list_price, quantity, status = zip(*rows)
+    return {
+        'purchased': np.fromiter((_utc(value).timestamp() for value in purchased), np.float64, len(rows)).astype(np.int64),
+        'customer_id': np.asarray(customer_id, np.int64),
+        'product_id': np.asarray(product_id, np.int64),
+        'category_id': np.asarray(category_id, np.int64),
+        'price': np.asarray(price, np.float64),
+        'list_price': np.asarray(list_price, np.float64),
+        'quantity': np.asarray(quantity, np.int64),
+        'status': np.asarray(status, np.int16)
+    }
+
+
+def _concat(chunks):
+    chunks = [chunk for chunk in chunks if len(chunk['purchased'])]
+    if not chunks:
+        return _empty_chunk()
+    return {column: np.concatenate([chunk[column] for chunk in chunks]) for column in COLUMNS}
+
+
+def _load_range(start, end):
+    """Invoice items purchased in [start, end) as one chunk, read in batches of LOAD_BATCH_SIZE."""
+    query = db.session.query(
+        InvoiceItem.purchased_date,
+        InvoiceItem.customer_id,
+        db.func.coalesce(InvoiceItem.base_product_id, 0),
+        db.func.coalesce(Products.category_id, 0),
+        InvoiceItem.price_at_purchase,
+        db.func.coalesce(Products.price, InvoiceItem.price_at_purchase),
+        InvoiceItem.product_quantity,
+        InvoiceItem.delivery_status
+    ).outerjoin(
+        Products, InvoiceItem.base_product_id == Products.base_product_id
+    ).filter(
+        InvoiceItem.purchased_date >= start, InvoiceItem.purchased_date < end
+    ).order_by(InvoiceItem.purchased_date)
+    result = db.session.execute(query.statement.execution_options(yield_per=LOAD_BATCH_SIZE))
+    return _concat([_to_chunk(rows) for rows in result.partitions()])
+
+
+def _split_days(chunk, days):
+    """Split a chunk sorted by purchase time into one chunk per day in `days`."""
+    bounds = [int(_day_timestamp(day)) for day in days] + [int(_day_timestamp(days[-1] + timedelta(days=1)))]
+    cuts = np.searchsorted(chunk['purchased'], bounds)
+    return {
+        day: {column: values[cuts[index]:cuts[index + 1]] for column, values in chunk.items()}
+        for index, day in enumerate(days)
+    }
+
+
+def _day_timestamp(day):
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+
+
+def load_days(start_day, end_day, today=None):
+    """
+    Columnar chunk of the invoice items purchased on the UTC days start_day..end_day (dates).
+    Complete days come from the per-day cache; every run of missing days is read with one query.
+    Today is always read fresh.
+    """
+    _require_numpy()
+    today = today or datetime.now(timezone.utc).date()
+    days = [start_day + timedelta(days=offset) for offset in range((end_day - start_day).days + 1)]
+    chunks = {day: _day_chunks.get(day) for day in days if day < today}
+    missing = [day for day in days if chunks.get(day) is None]
+
+    runs = []
+    for day in missing:
+        if runs and runs[-1][-1] + timedelta(days=1) == day:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    for run in runs:
+        start = datetime.fromtimestamp(_day_timestamp(run[0]), timezone.utc)
+        loaded = _split_days(_load_range(start, start + timedelta(days=len(run))), run)
+        for day, chunk in loaded.items():
+            chunks[day] = chunk
+            if day < today:
+                _day_chunks.set(day, chunk)
+
+    return _concat([chunks[day] for day in days])
+
+
+def _first_purchases_by_customer():
+    """(customer ids, epoch seconds of their first purchase ever), sorted by customer id."""
+    cached = _first_purchases.get('all')
+    if cached is None:
+        rows = db.session.query(
+            InvoiceItem.customer_id, db.func.min(InvoiceItem.purchased_date)
+        ).group_by(InvoiceItem.customer_id).order_by(InvoiceItem.customer_id).all()
+        cached = (
+            np.asarray([customer_id for customer_id, _ in rows], np.int64),
+            np.asarray([_utc(first).timestamp() for _, first in rows], np.float64).astype(np.int64)
+        )
+        _first_purchases.set('all', cached)
+    return cached
+
+
+def _month_label(index):
+    """'YYYY-MM' of a month counted from 1970-01."""
+    return f"{1970 + index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _grouped_sums(keys, *weights):
+    """Unique keys and the sum of every weight array per key."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, [np.bincount(inverse, weights=weight, minlength=len(unique)) for weight in weights]
+
+
+def compute_metrics(chunk, cost_ratio=DEFAULT_COST_RATIO, top=10, range_start=None, first_purchases=None):
+    """
+    Sales metrics of a columnar chunk (see load_days). Customers whose first purchase ever is at or
+    after `range_start` (epoch seconds) count as new. `first_purchases` defaults to every
+    customer's first purchase from Invoice_Item.
+    """
+    _require_numpy()
+    quantity = chunk['quantity'].astype(np.float64)
+    revenue = chunk['price'] * quantity
+    netted = np.isin(chunk['status'], NETTED_STATUSES)
+    kept = ~netted
+    net_revenue = np.where(kept, revenue, 0.0)
+    net_units = np.where(kept, quantity, 0.0)
+    discount_cost = np.where(kept, np.clip(chunk['list_price'] - chunk['price'], 0, None) * quantity, 0.0)
+    cost = np.where(kept, chunk['list_price'] * quantity * cost_ratio, 0.0)
+
+    # Orders are a customer's items purchased within the same minute
+    order_keys = np.stack([chunk['customer_id'], chunk['purchased'] // 60], axis=1) if len(revenue) else np.empty((0, 2), np.int64)
+    orders = np.unique(order_keys, axis=0)
+
+    categories, (category_revenue, category_cost, category_discount, category_units) = _grouped_sums(
+        chunk['category_id'], net_revenue, cost, discount_cost, net_units
+    )
+    products, (product_revenue, product_units) = _grouped_sums(chunk['product_id'], net_revenue, net_units)
+    ranking = np.lexsort((products, -product_revenue))[:top]
+
+    # Repeat customers: several orders in the range; cohorts by month of the first purchase ever
+    customers, customer_index = np.unique(chunk['customer_id'], return_inverse=True)
+    order_counts = np.bincount(np.searchsorted(customers, orders[:, 0]), minlength=len(customers))
+    first_seen = np.full(len(customers), np.iinfo(np.int64).max)
+    np.minimum.at(first_seen, customer_index, chunk['purchased'])
+    known_ids, known_first = first_purchases if first_purchases is not None else _first_purchases_by_customer()
+    if len(known_ids):
+        positions = np.clip(np.searchsorted(known_ids, customers), 0, len(known_ids) - 1)
+        matched = known_ids[positions] == customers
+        first_seen = np.where(matched, np.minimum(known_first[positions], first_seen), first_seen)
+    if range_start is None:
+        range_start = int(chunk['purchased'].min()) if len(revenue) else 0
+    cohort_months = first_seen.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    cohorts, cohort_counts = np.unique(cohort_months, return_counts=True)
+    customer_revenue = np.bincount(customer_index, weights=net_revenue, minlength=len(customers))
+
+    gross = float(revenue.sum())
+    net = float(net_revenue.sum())
+    return {
+        "gross_revenue": round(gross, 2),
+        "refunded_revenue": round(gross - net, 2),
+        "net_revenue": round(net, 2),
+        "units": int(quantity.sum()),
+        "net_units": int(net_units.sum()),
+        "items": int(len(revenue)),
+        "orders": int(len(orders)),
+        "discount_cost": round(float(discount_cost.sum()), 2),
+        "cost_ratio": cost_ratio,
+        "categories": [
+            {
+                "category_id": int(category_id),
+                "net_revenue": round(float(category_revenue[index]), 2),
+                "estimated_cost": round(float(category_cost[index]), 2),
+                "margin": round(float(category_revenue[index] - category_cost[index]), 2),
+                "margin_rate": round(float((category_revenue[index] - category_cost[index]) / category_revenue[index]), 4)
+                if category_revenue[index] else None,
+                "discount_cost": round(float(category_discount[index]), 2),
+                "net_units": int(category_units[index])
+            }
+            for index, category_id in enumerate(categories)
+        ],
+        "top_products": [
+            {
+                "product_id": int(products[index]),
+                "net_revenue": round(float(product_revenue[index]), 2),
+                "net_units": int(product_units[index])
+            }
+            for index in ranking
+        ],
+        "customers": {
+            "active": int(len(customers)),
+            "repeat": int((order_counts > 1).sum()),
+            "new": int((first_seen >= range_start).sum()),
+            "average_net_revenue": round(float(customer_revenue.mean()), 2) if len(customers) else 0.0
+        },
+        "cohorts": [
+            {
+                "first_purchase_month": _month_label(int(month)),
+                "customers": int(count),
+                "repeat": int((order_counts[cohort_months == month] > 1).sum())
+            }
+            for month, count in zip(cohorts, cohort_counts)
+        ]
+    }
+
+
+def sales_metrics(start_day, end_day, top=10):
+    """Metrics of the UTC days start_day..end_day (dates, both included)."""
+    cost_ratio = current_app.config.get('ANALYTICS_COST_RATIO', DEFAULT_COST_RATIO)
+    metrics = compute_metrics(
+        load_days(start_day, end_day), cost_ratio=cost_ratio, top=top, range_start=int(_day_timestamp(start_day))
+    )
+    return dict(metrics, start_date=start_day.isoformat(), end_date=end_day.isoformat())
@@ -0,0 +1,218 @@
+"""
+Hourly and daily sales rollup.
+
+Sales_Rollup holds gross revenue, units, invoice items and orders per hour and per day (UTC), in
+total and per category and product. A 'sales_rollup_compaction' job aggregates every complete day
+of Invoice_Item into it once and moves the watermark in Sales_Rollup_State past that day. Reads
+take complete days from the rollup and aggregate only the live tail (purchases since the
+watermark, normally today) from Invoice_Item, so dashboards over months of history read a few
+rows per day instead of every invoice item.
+
+Revenue is gross, as in the revenue analysis: refunded and cancelled items keep counting for the
+day they were purchased, so status changes never touch compacted days. An order is a customer's
+checkout, i.e. the items of one customer purchased within the same minute.
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from sqlalchemy import insert
+from backend.models import db, BackgroundJob, InvoiceItem, Products, SalesRollup, SalesRollupState
+from backend.jobs import enqueue_job, job_handler, record_progress
+
+ROLLUP_LAG = timedelta(minutes=10)  # A day is compacted this long after it ended, once its checkouts committed
+ROLLUP_STATE_ID = 1
+GRANULARITIES = ('hour', 'day')
+DIMENSIONS = ('total', 'category', 'product')
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _utc(value):
+    """Timestamps as aware UTC datetimes (SQLite returns naive UTC ones)."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def bucket_start(value, granularity):
+    value = _utc(value)
+    if granularity == 'day':
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _invoice_rows(start=None, end=None):
+    """Invoice items purchased in [start, end), with the category of their product."""
+    query = db.session.query(
+        InvoiceItem.purchased_date,
+        InvoiceItem.customer_id,
+        InvoiceItem.base_product_id,
+        Products.category_id,
+        InvoiceItem.price_at_purchase,
+        InvoiceItem.product_quantity
+    ).outerjoin(Products, InvoiceItem.base_product_id == Products.base_product_id)
+    if start is not None:
+        query = query.filter(InvoiceItem.purchased_date >= start)
+    if end is not None:
+        query = query.filter(InvoiceItem.purchased_date < end)
+    return query.yield_per(5000)
+
+
+def aggregate_sales(rows, granularities=GRANULARITIES, dimensions=DIMENSIONS):
+    """
+    Aggregate invoice rows (purchased_date, customer_id, base_product_id, category_id, price,
+    quantity) into {(granularity, bucket_start, dimension, dimension_id): totals}.
+    """
+    buckets = {}
+    for purchased_date, customer_id, base_product_id, category_id, price, quantity in rows:
+        revenue = Decimal(price) * quantity
+        order = (customer_id, _utc(purchased_date).replace(second=0, microsecond=0))
+        ids = {'total': 0, 'category': category_id or 0, 'product': base_product_id or 0}
+        for granularity in granularities:
+            start = bucket_start(purchased_date, granularity)
+            for dimension in dimensions:
+                totals = buckets.setdefault((granularity, start, dimension, ids[dimension]), {
+                    "revenue": Decimal(0), "units": 0, "item_count": 0, "orders": set()
+                })
+                totals["revenue"] += revenue
+                totals["units"] += quantity
+                totals["item_count"] += 1
+                totals["orders"].add(order)
+    for totals in buckets.values():
+        totals["order_count"] = len(totals.pop("orders"))
+    return buckets
+
+
+def _state(lock=False):
+    query = SalesRollupState.query.filter_by(state_id=ROLLUP_STATE_ID)
+    if lock:
+        query = query.with_for_update().populate_existing()  # Re-read the watermark under the lock
+    state = query.first()
+    if state is None:
+        state = SalesRollupState(state_id=ROLLUP_STATE_ID, compacted_until=None)
+        db.session.add(state)
+        db.session.flush()
+    return state
+
+
+def compaction_cutoff(now=None):
+    """Start of the first day that is not complete yet (allowing ROLLUP_LAG for late commits)."""
+    return bucket_start((now or utcnow()) - ROLLUP_LAG, 'day')
+
+
+def compact_sales_rollup(job=None, now=None):
+    """
+    Roll every complete day since the watermark up into Sales_Rollup, one transaction per day.
+    Every day starts by locking the state row and reading the watermark again, so concurrent
+    compactions take turns and never roll up a day another one already moved past. Days are
+    rewritten as a whole, so compacting a day again is harmless. Returns the new watermark.
+    """
+    cutoff = compaction_cutoff(now)
+    while True:
+        state = _state(lock=True)
+        start = state.compacted_until
+        if start is None:
+            first_purchase = db.session.query(db.func.min(InvoiceItem.purchased_date)).scalar()
+            start = bucket_start(first_purchase, 'day') if first_purchase is not None else cutoff
+        start = _utc(start)
+        if start >= cutoff:
+            break
+
+        end = start + timedelta(days=1)
+        totals = aggregate_sales(_invoice_rows(start, end))
+        SalesRollup.query.filter(
+            SalesRollup.bucket_start >= start, SalesRollup.bucket_start < end
+        ).delete(synchronize_session=False)
+        if totals:
+            db.session.execute(insert(SalesRollup), [
+                {"granularity": granularity, "bucket_start": bucket, "dimension": dimension,
+                 "dimension_id": dimension_id, **values}
+                for (granularity, bucket, dimension, dimension_id), values in totals.items()
+            ])
+        state.compacted_until = end
+        if job is not None:
+            record_progress(job, compacted_until=end.isoformat())
+        db.session.commit()
+
+    if state.compacted_until is None:
+        state.compacted_until = cutoff
+    db.session.commit()
+    return _utc(state.compacted_until)
+
+
+def rebuild_sales_rollup():
+    """Drop the rollup and compact the whole history again (after correcting past invoice items)."""
+    SalesRollup.query.delete(synchronize_session=False)
+    _state(lock=True).compacted_until = None
+    db.session.commit()
+    return compact_sales_rollup()
+
+
+def schedule_compaction():
+    """
+    Queue a compaction job when a complete day is not rolled up yet and none is waiting. The check
+    and the enqueue run under the state row lock, so concurrent readers queue one job between them;
+    while a compaction holds the lock, the job already running makes scheduling unnecessary.
+    """
+    if not _compaction_due(_state()):
+        return None
+    state = SalesRollupState.query.filter_by(
+        state_id=ROLLUP_STATE_ID
+    ).with_for_update(skip_locked=True).populate_existing().first()
+    job = None
+    if state is not None and _compaction_due(state):
+        pending = db.session.query(BackgroundJob.query.filter(
+            BackgroundJob.job_type == 'sales_rollup_compaction', BackgroundJob.status.in_(['queued', 'running'])
+        ).exists()).scalar()
+        if not pending:
+            job = enqueue_job('sales_rollup_compaction', {})
+    db.session.commit()
+    return job
+
+
+def _compaction_due(state):
+    return state.compacted_until is None or _utc(state.compacted_until) < compaction_cutoff()
+
+
+def sales_rollup(granularity='day', dimension='total', start=None, end=None):
+    """
+    Sales per bucket in [start, end) (UTC datetimes, either may be None): compacted buckets from
+    Sales_Rollup merged with the live tail aggregated from Invoice_Item. Returns dicts with
+    bucket_start, dimension_id, revenue, units, item_count and order_count, ordered by bucket.
+    """
+    schedule_compaction()
+    watermark = _state().compacted_until
+    watermark = _utc(watermark) if watermark is not None else None
+    results = []
+
+    if watermark is not None and (start is None or start < watermark):
+        query = SalesRollup.query.filter(
+            SalesRollup.granularity == granularity,
+            SalesRollup.dimension == dimension,
+            SalesRollup.bucket_start < (watermark if end is None else min(end, watermark))
+        )
+        if start is not None:
+            query = query.filter(SalesRollup.bucket_start >= start)
+        results.extend({
+            "bucket_start": _utc(row.bucket_start),
+            "dimension_id": row.dimension_id,
+            "revenue": row.revenue,
+            "units": row.units,
+            "item_count": row.item_count,
+            "order_count": row.order_count
+        } for row in query)
+
+    tail_start = watermark if start is None or (watermark is not None and watermark > start) else start
+    if end is None or tail_start is None or tail_start < end:
+        live = aggregate_sales(_invoice_rows(tail_start, end), (granularity,), (dimension,))
+        results.extend(
+            {"bucket_start": bucket, "dimension_id": dimension_id, **values}
+            for (_, bucket, _, dimension_id), values in live.items()
+        )
+
+    results.sort(key=lambda row: (row["bucket_start"], row["dimension_id"]))
+    return results
+
+
+@job_handler('sales_rollup_compaction')
+def sales_rollup_compaction_job(payload, job):
+    compact_sales_rollup(job=job)
@@ -0,0 +1,286 @@
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    return _TOKEN_RE.findall((text or "").casefold())
+
+
+class SearchIndex:
+    """
+    In-process inverted index over product colors (one document per base_product_id + color_name).
+
+    Supports multi-term queries (every term must match), prefix matching on each term and
+    TF-IDF style relevance ranking with per-field weights. It is database agnostic, so it
+    behaves the same on PostgreSQL and on the SQLite databases used in tests.
+    """
+
+    FIELD_WEIGHTS = {'product_name': 3.0, 'color_name': 2.0, 'color_description': 1.0}
+    PREFIX_PENALTY = 0.7  # Prefix-only matches rank below exact term matches
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._documents = {}  # (base_product_id, color_name) -> document dict
+        self._postings = defaultdict(dict)  # term -> {doc_key: weighted term frequency}
+        self._terms = []  # Sorted list of indexed terms, for prefix lookups
+        self._product_docs = defaultdict(set)  # base_product_id -> doc keys
+        self._journal = None  # Replacements made while a rebuild reads its snapshot
+        self.loaded_at = None
+
+    # Index maintenance
+    def load(self, documents):
+        """Replace the whole index with the given documents."""
+        self.begin_rebuild()
+        self.rebuild(documents)
+
+    def begin_rebuild(self):
+        """Start recording replace_product() calls. Call before reading the snapshot passed to rebuild()."""
+        with self._lock:
+            self._journal = {}
+
+    def abort_rebuild(self):
+        with self._lock:
+            self._journal = None
+
+    def rebuild(self, documents):
+        """
+        Index `documents` without holding the lock, swap the result in, then re-apply the
+        replacements made since begin_rebuild(), which may be newer than the snapshot.
+        """
+        fresh = SearchIndex()
+        for document in documents:
+            fresh._add(document)
+        with self._lock:
+            self._documents, self._postings = fresh._documents, fresh._postings
+            self._terms, self._product_docs = fresh._terms, fresh._product_docs
+            journal, self._journal = self._journal or {}, None
+            for base_product_id, replacement in journal.items():
+                self._replace_product(base_product_id, replacement)
+            self.loaded_at = time.monotonic()
+
+    def replace_product(self, base_product_id, documents):
+        """Re-index every color of a product. An empty list removes the product."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal[base_product_id] = documents
+            self._replace_product(base_product_id, documents)
+
+    def _replace_product(self, base_product_id, documents):
+        for key in list(self._product_docs.get(base_product_id, ())):
+            self._remove(key)
+        for document in documents:
+            self._add(document)
+
+    def _add(self, document):
+        key = (document['base_product_id'], document['color_name'])
+        if key in self._documents:
+            self._remove(key)
+        self._documents[key] = document
+        self._product_docs[document['base_product_id']].add(key)
+
+        weights = defaultdict(float)
+        for field, weight in self.FIELD_WEIGHTS.items():
+            for term in tokenize(document.get(field)):
+                weights[term] += weight
+        for term, weight in weights.items():
+            postings = self._postings[term]
+            if not postings:
+                insort(self._terms, term)
+            postings[key] = weight
+
+    def _remove(self, key):
+        document = self._documents.pop(key, None)
+        if document is None:
+            return
+        product_docs = self._product_docs.get(document['base_product_id'])
+        if product_docs is not None:
+            product_docs.discard(key)
+            if not product_docs:
+                del self._product_docs[document['base_product_id']]
+        for field in self.FIELD_WEIGHTS:
+            for term in tokenize(document.get(field)):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+                    index = bisect_left(self._terms, term)
+                    if index < len(self._terms) and self._terms[index] == term:
+                        del self._terms[index]
+
+    # Querying
+    def _expand(self, token):
+        """Yield indexed terms starting with token."""
+        index = bisect_left(self._terms, token)
+        while index < len(self._terms) and self._terms[index].startswith(token):
+            yield self._terms[index]
+            index += 1
+
+    def search(self, query, limit=None, offset=0):
+        """
+        Return (total, results) for the query, best matches first.
+        Each result is the indexed document plus its relevance `score`.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            if not tokens:
+                keys = sorted(self._documents)
+                scores = {key: 0.0 for key in keys}
+            else:
+                doc_count = max(len(self._documents), 1)
+                scores = None
+                for token in tokens:
+                    token_scores = {}
+                    for term in self._expand(token):
+                        postings = self._postings[term]
+                        idf = math.log(1 + doc_count / len(postings))
+                        factor = 1.0 if term == token else self.PREFIX_PENALTY
+                        for key, weight in postings.items():
+                            score = weight * idf * factor
+                            if score > token_scores.get(key, 0.0):
+                                token_scores[key] = score
+                    if scores is None:
+                        scores = token_scores
+                    else:
+                        scores = {key: scores[key] + value for key, value in token_scores.items() if key in scores}
+                    if not scores:
+                        break
+                keys = sorted(scores, key=lambda key: (-scores[key], key))
+
+            total = len(keys)
+            end = None if limit is None else offset + limit
+            results = [dict(self._documents[key], score=round(scores[key], 4)) for key in keys[offset:end]]
+        return total, results
+
+    def __len__(self):
+        with self._lock:
+            return len(self._documents)
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index for typeahead suggestions.
+
+    Every word position of an entry is indexed, so "shi" suggests "Blue Oxford Shirt".
+    Entries are contributed by sources (a product, a category); the same text contributed
+    by several sources (e.g. a color used by many products) is stored once and ranked by
+    how many sources contribute it.
+    """
+
+    MAX_SCAN = 2000  # Upper bound on candidates examined per lookup
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []  # Sorted (indexed suffix, kind, normalized text)
+        self._entries = {}  # (kind, normalized text) -> [display text, contributing source count]
+        self._sources = {}  # source key -> set of (kind, normalized text)
+        self._journal = None  # Replacements made while a rebuild reads its snapshot
+        self.loaded_at = None
+
+    @staticmethod
+    def _suffixes(normalized):
+        """Yield the text starting at each of its words."""
+        for match in _TOKEN_RE.finditer(normalized):
+            yield normalized[match.start():]
+
+    def load(self, sources):
+        """Replace the whole index. `sources` maps source keys to lists of (kind, text)."""
+        self.begin_rebuild()
+        self.rebuild(sources)
+
+    def begin_rebuild(self):
+        """Start recording replace() calls. Call before reading the snapshot passed to rebuild()."""
+        with self._lock:
+            self._journal = {}
+
+    def abort_rebuild(self):
+        with self._lock:
+            self._journal = None
+
+    def rebuild(self, sources):
+        """
+        Index `sources` without holding the lock, swap the result in, then re-apply the
+        replacements made since begin_rebuild(), which may be newer than the snapshot.
+        """
+        fresh = PrefixIndex()
+        for source, entries in sources.items():
+            fresh._replace(source, entries, keep_sorted=False)
+        fresh._keys.sort()
+        with self._lock:
+            self._keys, self._entries, self._sources = fresh._keys, fresh._entries, fresh._sources
+            journal, self._journal = self._journal or {}, None
+            for source, entries in journal.items():
+                self._replace(source, entries, keep_sorted=True)
+            self.loaded_at = time.monotonic()
+
+    def replace(self, source, entries):
+        """Replace the entries contributed by one source. An empty list removes the source."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal[source] = entries
+            self._replace(source, entries, keep_sorted=True)
+
+    def _replace(self, source, entries, keep_sorted):
+        new = {}
+        for kind, text in entries:
+            text = (text or "").strip()
+            if text:
+                new.setdefault((kind, " ".join(text.casefold().split())), text)
+        old = self._sources.pop(source, set())
+
+        for entry_key in old - set(new):
+            entry = self._entries[entry_key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._entries[entry_key]
+                kind, normalized = entry_key
+                for suffix in self._suffixes(normalized):
+                    index = bisect_left(self._keys, (suffix, kind, normalized))
+                    if index < len(self._keys) and self._keys[index] == (suffix, kind, normalized):
+                        del self._keys[index]
+
+        for entry_key, text in new.items():
+            if entry_key in old:
+                continue
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                entry[1] += 1
+                continue
+            self._entries[entry_key] = [text, 1]
+            kind, normalized = entry_key
+            for suffix in self._suffixes(normalized):
+                if keep_sorted:
+                    insort(self._keys, (suffix, kind, normalized))
+                else:
+                    self._keys.append((suffix, kind, normalized))
+
+        if new:
+            self._sources[source] = set(new)
+
+    def suggest(self, prefix, limit=10):
+        """Return up to `limit` suggestions for the prefix, most widely used first."""
+        prefix = " ".join((prefix or "").casefold().split())
+        if not prefix:
+            return []
+        with self._lock:
+            found = {}
+            index = bisect_left(self._keys, (prefix,))
+            end = min(len(self._keys), index + self.MAX_SCAN)
+            while index < end and self._keys[index][0].startswith(prefix):
+                _, kind, normalized = self._keys[index]
+                if (kind, normalized) not in found:
+                    text, count = self._entries[(kind, normalized)]
+                    # Entries that start with the prefix rank above mid-text word matches
+                    starts_with = normalized.startswith(prefix)
+                    found[(kind, normalized)] = (not starts_with, -count, len(normalized), normalized, kind, text)
+                index += 1
+        ranked = sorted(found.values())[:limit]
+        return [{"text": text, "type": kind} for _, _, _, _, kind, text in ranked]
@@ -1,16 +1,22 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 
-from backend.models import db, WishlistItem, Products, Customer
+from backend.mailTransport import get_mail_transport
 
 
-def send_invoice_email(customer_email, pdf_data, order_id, sender_email, sender_password):
-    try:
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 465
+def build_message(sender_email, recipient_email, subject, body):
+    """Build a plain text email; attachments can be added to the returned message."""
+    message = MIMEMultipart()
+    message["From"] = sender_email
+    message["To"] = recipient_email
+    message["Subject"] = subject
+    message.attach(MIMEText(body, "plain"))
+    return message
+
 
+def send_invoice_email(customer_email, pdf_data, order_id, sender_email, sender_password, raise_errors=False):
+    try:
         subject = f"Invoice for Order {order_id}"
         body = f"""Dear Customer,
 
@@ -20,11 +26,7 @@ Best regards,
 Melangé Team
 """
 
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = customer_email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
+        message = build_message(sender_email, customer_email, subject, body)
 
         attachment = MIMEApplication(pdf_data, _subtype="pdf")
         attachment.add_header(
@@ -32,29 +34,20 @@ Melangé Team
         )
         message.attach(attachment)
 
-        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, customer_email, message.as_string())
+        get_mail_transport(sender_email, sender_password).send(message)
 
         print(f"Invoice email sent successfully to {customer_email}")
 
     except Exception as e:
         print(f"Failed to send email: {e}")
+        if raise_errors:  # Background jobs retry failed sends
+            raise
 
 def send_refund_email(customer_email, subject, body, sender_email, sender_password):
     try:
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 465
-
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = customer_email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
+        message = build_message(sender_email, customer_email, subject, body)
 
-        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, customer_email, message.as_string())
+        get_mail_transport(sender_email, sender_password).send(message)
 
         print(f"Refund email sent successfully to {customer_email}")
 
@@ -62,39 +55,35 @@ def send_refund_email(customer_email, subject, body, sender_email, sender_passwo
         print(f"Failed to send email: {e}")
 
 
-def send_price_drop_email(customer_email, product_name, wishlist_price, current_price, sender_email, sender_password):
+def build_price_drop_email(customer_email, product_name, wishlist_price, current_price, sender_email):
     """
-    Send an email notification about a price drop for a product on the wishlist.
+    Build the email notifying a customer about a price drop for a product on the wishlist.
     """
-    try:
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 465
-
-        subject = f"Good News! Price Drop Alert for {product_name}"
-        body = f"""Dear Valued Customer,
+    subject = f"Good News! Price Drop Alert for {product_name}"
+    body = f"""Dear Valued Customer,
 
 We have some exciting news for you! The price of one of your wishlist items, "{product_name}," has dropped.
 
-Wishlist Price: ${wishlist_price:.2f}  
-Current Price: ${current_price:.2f}  
+Wishlist Price: ${wishlist_price:.2f}
+Current Price: ${current_price:.2f}
 
 Don't miss this opportunity to grab the product at a lower price. Check it out on our website now!
 
-Best regards,  
+Best regards,
 The Melangé Team
 """
+    return build_message(sender_email, customer_email, subject, body)
 
-        # Create the email message
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = customer_email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
 
-        # Send the email
-        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, customer_email, message.as_string())
+def send_price_drop_email(customer_email, product_name, wishlist_price, current_price, sender_email, sender_password):
+    """
+    Send an email notification about a price drop for a product on the wishlist.
+    """
+    try:
+        message = build_price_drop_email(customer_email, product_name, wishlist_price, current_price, sender_email)
+
+        # Send the email through the pooled transport
+        get_mail_transport(sender_email, sender_password).send(message)
 
         print(f"Price drop email sent successfully to {customer_email}")
 
@@ -102,40 +91,26 @@ The Melangé Team
         print(f"Failed to send email: {e}")
 
 
-
-def check_price_drops_and_notify(sender_email, sender_password):
+def build_discount_email(customer, product_name, discounted_price, discount_percentage, sender_email):
     """
-    Check for price drops in the wishlist and notify users via email.
-
-    Args:
-        sender_email (str): The email address used to send notifications.
-        sender_password (str): The password for the sender email.
+    Build the email telling a customer that a product on the wishlist is now discounted.
     """
-    try:
-        # Query all wishlist items and join with product and customer data
-        wishlist_items = db.session.query(
-            WishlistItem, Products, Customer
-        ).join(
-            Products, WishlistItem.base_product_id == Products.base_product_id
-        ).join(
-            Customer, WishlistItem.customer_id == Customer.customer_id
-        ).all()
-
-        for wishlist_item, product, customer in wishlist_items:
-            # Compare current product price with the wishlist price
-            if product.price < wishlist_item.addition_price:
-                # Send a price drop email notification
-                send_price_drop_email(
-                    customer_email=customer.email_address,  # Customer's email
-                    product_name=product.product_name,  # Product name
-                    wishlist_price=wishlist_item.addition_price,  # Old price (from WishlistItem)
-                    current_price=product.price,  # New price (from Products)
-                    sender_email=sender_email,  # Sender email
-                    sender_password=sender_password  # Sender email password
-                )
-
-        print("Price drop check completed successfully.")
+    subject = f"Discount Alert: {product_name} Now at ${discounted_price:.2f}!"
+    body = f"""Dear {customer.name},
 
-    except Exception as e:
-        print(f"Error during price drop check: {e}")
+Good news! The product "{product_name}" in your wishlist is now available at a discounted price of ${discounted_price:.2f} (Discount: {discount_percentage}%).
+
+Don't miss out! Check it out now.
 
+Best regards,
+Melangé Team
+"""
+    return build_message(sender_email, customer.email_address, subject, body)
+
+
+def send_batch(messages, sender_email, sender_password):
+    """
+    Send many messages over the sender's pooled connections.
+    Returns a list aligned with `messages`: None when sent, the exception otherwise.
+    """
+    return get_mail_transport(sender_email, sender_password).send_many(messages)
@@ -0,0 +1,43 @@
+import datetime
+import jwt
+import pytest
+from flask import Flask
+from backend.auth import AuthError, token_digest, verified_tokens, verify_token
+from backend.config import Config
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['AUTH_REVOCATION'] = False
+    verified_tokens.clear()
+    with app.test_request_context():
+        yield app
+    verified_tokens.clear()
+
+
+def make_token(**payload):
+    return jwt.encode(payload, Config.SECRET_KEY, algorithm='HS256')
+
+
+def test_verified_token_is_cached_by_digest(app):
+    token = make_token(customer_id=1, exp=datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+    assert verify_token(token)['customer_id'] == 1
+    assert verified_tokens.get(token_digest(token))['customer_id'] == 1
+    assert verify_token(token)['customer_id'] == 1
+
+
+def test_cached_token_honours_expiry(app):
+    token = make_token(customer_id=1, exp=datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+    verify_token(token)
+    verified_tokens.get(token_digest(token))['exp'] = 0  # The token expired while cached
+    with pytest.raises(AuthError, match="expired"):
+        verify_token(token)
+    assert token_digest(token) not in verified_tokens
+
+
+def test_invalid_tokens_are_rejected_and_not_cached(app):
+    token = jwt.encode({'customer_id': 1}, 'another-secret', algorithm='HS256')
+    with pytest.raises(AuthError, match="Invalid token"):
+        verify_token(token)
+    assert len(verified_tokens) == 0
@@ -0,0 +1,41 @@
+import jwt
+import pytest
+from flask import Flask
+from flask_restx import Api
+from backend.config import Config
+from backend.models import db, ProductSizes
+from backend.routes import adminMethods
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(adminMethods, 'STOCK_CHUNK_SIZE', 1)  # Every row is its own chunk
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['AUTH_REVOCATION'] = False
+    db.init_app(app)
+    Api(app).add_namespace(adminMethods.api)
+    with app.app_context():
+        db.create_all()
+        for size_name, stock in [('S', 5), ('L', 3)]:
+            db.session.add(ProductSizes(base_product_id=1, color_name='Blue', size_name=size_name, product_stock=stock))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_rows_of_later_chunks_supersede_earlier_ones(client):
+    token = jwt.encode({'role': 'productManager'}, Config.SECRET_KEY, algorithm='HS256')
+    rows = [
+        {"base_product_id": 1, "color_name": "Blue", "size_name": "S", "product_stock": 7},
+        {"base_product_id": 1, "color_name": "Blue", "size_name": "L", "product_stock": 1},
+        {"base_product_id": 1, "color_name": "Blue", "size_name": "S", "product_stock": 9},
+    ]
+    response = client.post('/adminMethods/bulkAdjustStock', json=rows, headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 200
+    assert [row["status"] for row in response.json["rows"]] == ["superseded", "updated", "updated"]
+    assert response.json["rows"][2]["old_stock"] == 7
+    assert response.json["summary"]["superseded"] == 1
+    assert db.session.get(ProductSizes, (1, 'Blue', 'S'), populate_existing=True).product_stock == 9
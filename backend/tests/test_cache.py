@@ -0,0 +1,24 @@
+import time
+from backend.cache import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    """Reading an entry protects it from eviction."""
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+
+
+def test_entries_expire_after_ttl():
+    """Expired entries behave as missing."""
+    cache = LRUCache(maxsize=4, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    cache.set("b", 2, ttl=None)
+    time.sleep(0.02)
+    assert cache.get("b") == 2
@@ -0,0 +1,39 @@
+from backend.catalogImport import validate_product
+
+
+def product(**overrides):
+    data = {
+        "category_name": "Shoes", "category_gender": "Women", "product_name": "Runner", "model": 1,
+        "serial_number": 2, "price": 100, "warranty_status": 1, "distributor": "D",
+        "colors": [{"color_name": "Red", "product_image": "red.jpg", "color_description": "Red",
+                    "sizes": [{"size_name": "S", "product_stock": 3}]}]
+    }
+    data.update(overrides)
+    return data
+
+
+def test_valid_product_is_normalized():
+    parsed, errors = validate_product(product(category_name=" Shoes "))
+    assert errors == []
+    assert parsed['category'] == ("Shoes", "Women")
+    assert parsed['columns']['discount_percentage'] == 0
+    assert parsed['colors'][0]['sizes'] == {"S": 3}
+
+
+def test_invalid_product_lists_every_problem():
+    colors = [
+        {"color_name": "Red", "product_image": "a", "color_description": "a",
+         "sizes": [{"size_name": "S", "product_stock": -1}, {"size_name": "S", "product_stock": 1}]},
+        {"color_name": "Red", "product_image": "b", "color_description": "b", "sizes": []},
+    ]
+    parsed, errors = validate_product(product(model=1.5, price="x", product_name="", colors=colors))
+    assert parsed is None
+    assert errors == [
+        "product_name is required",
+        "model must be an integer",
+        "price must be a number",
+        "colors[0].sizes[0].product_stock must not be negative",
+        "colors[0].sizes[1].size_name 'S' is repeated",
+        "colors[1].color_name 'Red' is repeated",
+    ]
+    assert validate_product("not json") == (None, ["Expected a JSON object"])
@@ -0,0 +1,77 @@
+from io import BytesIO
+import pytest
+from flask import Flask
+from backend.imageStore import (
+    ImageStore, MemoryImageStore, FileSystemImageStore, content_key, is_image_key, detect_image_type,
+    derivative_key, generate_derivatives, schedule_derivatives, derivatives_failed, DERIVATIVE_SIZES
+)
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 32
+
+
+def test_keys_are_content_addressed():
+    """Identical bytes share a key; the extension follows the detected image type."""
+    assert content_key(PNG) == content_key(bytes(PNG))
+    assert content_key(PNG) != content_key(JPEG)
+    assert content_key(JPEG).endswith('.jpg')
+    assert detect_image_type(b'GIF89a....') == 'gif'
+    assert is_image_key(content_key(PNG))
+    assert not is_image_key(PNG)
+    assert not is_image_key('../etc/passwd')
+
+
+def test_memory_store_round_trip_and_conditional_requests():
+    store = MemoryImageStore()
+    key = store.put(PNG)
+    assert store.put(PNG) == key
+    assert store.get(key) == PNG
+
+    app = Flask(__name__)
+    with app.test_request_context(headers={'If-None-Match': f'"{key}"'}):
+        assert store.send(key, max_age=60).status_code == 304
+
+
+def test_filesystem_store_writes_sharded_files(tmp_path):
+    store = FileSystemImageStore(str(tmp_path))
+    key = store.put(JPEG)
+    assert store.exists(key)
+    assert (tmp_path / key[:2] / key[2:4] / key).read_bytes() == JPEG
+    assert store.get('0' * 64 + '.png') is None
+
+
+def test_derivatives_are_downscaled_webp_renditions():
+    Image = pytest.importorskip("PIL.Image")
+    source = BytesIO()
+    Image.new('RGB', (2000, 500), (10, 120, 200)).save(source, format='JPEG')
+    store = MemoryImageStore()
+    key = store.put(source.getvalue())
+
+    assert sorted(generate_derivatives(store, key)) == sorted(derivative_key(key, size) for size in DERIVATIVE_SIZES)
+    for size, edge in DERIVATIVE_SIZES.items():
+        with Image.open(BytesIO(store.get(derivative_key(key, size)))) as rendition:
+            assert rendition.format == 'WEBP'
+            assert rendition.size == (edge, edge // 4)
+
+
+def test_unreadable_images_produce_no_derivatives():
+    store = MemoryImageStore()
+    key = store.put(PNG)
+    assert generate_derivatives(store, key) == []
+
+
+def test_incomplete_store_fails_when_instantiated():
+    class PutOnlyStore(ImageStore):
+        def put(self, data, key=None):
+            return content_key(data)
+
+    with pytest.raises(TypeError):
+        PutOnlyStore()
+
+
+def test_failed_derivatives_are_not_scheduled_again():
+    store = MemoryImageStore()
+    key = store.put(PNG + b'unreadable')
+    assert generate_derivatives(store, key) == []
+    assert derivatives_failed(key)
+    assert schedule_derivatives(store, key) is None
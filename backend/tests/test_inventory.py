@@ -0,0 +1,44 @@
+import pytest
+from flask import Flask
+from backend.models import db, ProductSizes
+from backend.inventory import InsufficientStock, reserve_stock, sku_quantities
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        for size_name, stock in [('S', 5), ('M', 1), ('L', 3)]:
+            db.session.add(ProductSizes(base_product_id=1, color_name='Blue', size_name=size_name, product_stock=stock))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def stock_levels():
+    return {size.size_name: size.product_stock for size in ProductSizes.query.populate_existing()}
+
+
+def test_sku_quantities_merges_repeated_skus():
+    assert sku_quantities([(1, 'Blue', 'S', 2), (1, 'Blue', 'L', 1), (1, 'Blue', 'S', 3)]) == {
+        (1, 'Blue', 'S'): 5, (1, 'Blue', 'L'): 1
+    }
+
+
+def test_reservation_takes_exactly_the_reserved_quantities(app):
+    reserve_stock(sku_quantities([(1, 'Blue', 'S', 2), (1, 'Blue', 'L', 3), (1, 'Blue', 'S', 1)]))
+    db.session.commit()
+    assert stock_levels() == {'S': 2, 'M': 1, 'L': 0}
+
+
+def test_insufficient_stock_leaves_every_sku_unchanged(app):
+    # 'L' is reserved before 'M' runs short, so the rollback must undo it
+    with pytest.raises(InsufficientStock) as raised:
+        reserve_stock({(1, 'Blue', 'L'): 2, (1, 'Blue', 'M'): 2})
+    db.session.rollback()
+    assert (raised.value.size_name, raised.value.requested) == ('M', 2)
+    assert stock_levels() == {'S': 5, 'M': 1, 'L': 3}
@@ -0,0 +1,43 @@
+from datetime import timedelta
+import pytest
+from flask import Flask
+from backend.models import db, BackgroundJob
+from backend.jobs import claim_next_job, retry_delay, utcnow, JOB_BACKOFF_BASE, JOB_BACKOFF_MAX, JOB_LEASE_SECONDS
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_retry_delay_backs_off_exponentially_with_jitter():
+    for attempts in range(1, 5):
+        expected = JOB_BACKOFF_BASE * 2 ** (attempts - 1)
+        assert expected * 0.8 <= retry_delay(attempts) <= expected * 1.2
+
+
+def test_retry_delay_is_capped():
+    assert retry_delay(50) <= JOB_BACKOFF_MAX * 1.2
+
+
+def test_expired_lease_is_reclaimed_only_while_attempts_are_left(app):
+    expired = utcnow() - timedelta(seconds=JOB_LEASE_SECONDS + 60)
+    for job_id, attempts in [(1, 5), (2, 2)]:
+        db.session.add(BackgroundJob(
+            job_id=job_id, job_type='send_invoice_email', payload={}, status='running', attempts=attempts,
+            max_attempts=5, run_after=expired, locked_by='dead-worker', locked_at=expired
+        ))
+    db.session.commit()
+
+    assert claim_next_job('worker') == 2
+    assert claim_next_job('worker') is None
+    exhausted = db.session.get(BackgroundJob, 1, populate_existing=True)
+    assert exhausted.status == 'failed' and exhausted.finished_at is not None
+    assert db.session.get(BackgroundJob, 2, populate_existing=True).attempts == 3
@@ -0,0 +1,80 @@
+import smtplib
+import time
+import pytest
+from email.message import EmailMessage
+from backend.mailTransport import MailTransport, MemoryTransport, RateLimiter, SMTPTransport
+
+
+def make_message(recipient):
+    message = EmailMessage()
+    message["From"] = "shop@example.com"
+    message["To"] = recipient
+    message["Subject"] = "Hello"
+    message.set_content("Hi")
+    return message
+
+
+class FakeSMTP:
+    connections = 0
+    logins = 0
+
+    def __init__(self, host, port, timeout=None):
+        FakeSMTP.connections += 1
+        self.sent = []
+
+    def login(self, username, password):
+        FakeSMTP.logins += 1
+
+    def send_message(self, message):
+        if message["To"] == "bounce@example.com":
+            raise smtplib.SMTPRecipientsRefused({message["To"]: (550, b"No such user")})
+        self.sent.append(message["To"])
+
+    def noop(self):
+        return 250, b"OK"
+
+    def quit(self):
+        pass
+
+
+def test_memory_transport_collects_batch():
+    transport = MemoryTransport()
+    messages = [make_message(f"c{i}@example.com") for i in range(3)]
+    assert transport.send_many(messages) == [None, None, None]
+    assert [m["To"] for m in transport.outbox] == ["c0@example.com", "c1@example.com", "c2@example.com"]
+
+
+def test_transport_without_send_fails_when_instantiated():
+    class SilentTransport(MailTransport):
+        pass
+
+    with pytest.raises(TypeError):
+        SilentTransport()
+
+
+def test_rate_limiter_spaces_acquisitions():
+    limiter = RateLimiter(20, burst=1)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - started >= 4 / 20 * 0.9
+
+
+def test_smtp_transport_reuses_pooled_connections(monkeypatch):
+    monkeypatch.setattr(FakeSMTP, "connections", 0)
+    monkeypatch.setattr(FakeSMTP, "logins", 0)
+    monkeypatch.setattr(smtplib, "SMTP_SSL", FakeSMTP)
+    transport = SMTPTransport("smtp.example.com", 465, "shop@example.com", "secret", pool_size=2)
+
+    messages = [make_message(f"c{i}@example.com") for i in range(20)]
+    messages[5] = make_message("bounce@example.com")
+    results = transport.send_many(messages)
+
+    assert sum(error is None for error in results) == 19
+    assert isinstance(results[5], smtplib.SMTPRecipientsRefused)
+    # The refused recipient does not cost a reconnect: only the pooled connections ever log in
+    assert FakeSMTP.connections <= 2
+    assert FakeSMTP.logins == FakeSMTP.connections
+
+    transport.send(make_message("again@example.com"))
+    assert FakeSMTP.connections <= 2
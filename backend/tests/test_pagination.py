@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, select
+from backend.pagination import encode_cursor, decode_cursor, keyset_filter
+
+
+def test_cursor_round_trip():
+    """A cursor decodes back to the values it was built from."""
+    cursor = encode_cursor(120, 7)
+    assert decode_cursor(cursor) == [120, 7]
+
+
+def test_invalid_cursor_is_rejected():
+    """Malformed cursors raise ValueError."""
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_pages_cover_all_rows_once(descending):
+    """Walking pages with keyset_filter returns every row exactly once, even with ties."""
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    items = Table("items", metadata, Column("id", Integer, primary_key=True), Column("price", Integer))
+    metadata.create_all(engine)
+    rows = [{"id": i, "price": price} for i, price in enumerate([5, 3, 5, 1, 3, 5, 2], start=1)]
+
+    with engine.begin() as conn:
+        conn.execute(items.insert(), rows)
+        order = [items.c.price.desc(), items.c.id.desc()] if descending else [items.c.price, items.c.id]
+        expected = [row.id for row in conn.execute(select(items).order_by(*order))]
+
+        seen, last = [], None
+        while True:
+            query = select(items).order_by(*order).limit(2)
+            if last:
+                query = query.where(keyset_filter([items.c.price, items.c.id], last, descending=descending))
+            page = conn.execute(query).all()
+            if not page:
+                break
+            seen += [row.id for row in page]
+            last = [page[-1].price, page[-1].id]
+
+    assert seen == expected
@@ -0,0 +1,37 @@
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from backend.passwords import normalize_method, needs_rehash, verify_password, hash_password_bounded
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    with app.app_context():
+        yield app
+
+
+def test_normalize_method_spells_out_defaults():
+    assert normalize_method('scrypt') == 'scrypt:32768:8:1'
+    assert normalize_method('pbkdf2:sha256:1000') == 'pbkdf2:sha256:1000'
+    assert normalize_method('pbkdf2').startswith('pbkdf2:sha256:')
+
+
+def test_needs_rehash_compares_method_and_cost(app):
+    assert not needs_rehash(generate_password_hash('pw', 'pbkdf2:sha256:1000'))
+    assert needs_rehash(generate_password_hash('pw', 'pbkdf2:sha256:500'))
+    assert needs_rehash('not-a-hash')
+
+
+def test_verify_password_upgrades_stale_hashes(app):
+    stale = generate_password_hash('pw', 'pbkdf2:sha256:500')
+    valid, upgraded = verify_password(stale, 'pw')
+    assert valid and upgraded.startswith('pbkdf2:sha256:1000$')
+    assert verify_password(upgraded, 'pw') == (True, None)
+    assert verify_password(stale, 'wrong') == (False, None)
+    assert verify_password(None, 'pw') == (False, None)
+
+
+def test_hash_password_bounded_uses_configured_method(app):
+    assert hash_password_bounded('pw').startswith('pbkdf2:sha256:1000$')
@@ -0,0 +1,64 @@
+import pytest
+from flask import Flask
+from backend.models import db, Categories, Customer, Products, WishlistItem, PriceChangeLog, PriceDropNotification
+from backend.mailTransport import get_mail_transport
+from backend.priceDrops import detect_price_drops
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['MAIL_TRANSPORT'] = 'memory'
+    app.config['JOB_WORKERS'] = 0
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Categories(category_id=1, category_name='Shirts', category_gender='Men'))
+        db.session.add(Products(
+            base_product_id=2, category_id=1, product_name='Linen Shirt', model=1, serial_number=1, price=50,
+            warranty_status=1, discount_percentage=0, distributor='D'
+        ))
+        for customer_id in (1, 2, 3):
+            db.session.add(Customer(
+                customer_id=customer_id, name='A', surname='B', tax_id=customer_id,
+                email_address=f'c{customer_id}@example.com', home_address='x', password='x'
+            ))
+        for customer_id, size_name, addition_price in [(1, 'S', 50), (1, 'L', 50), (2, 'S', 40), (3, 'M', 35)]:
+            db.session.add(WishlistItem(
+                customer_id=customer_id, base_product_id=2, color_name='Beige', size_name=size_name,
+                addition_price=addition_price, product_quantity=1
+            ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def log_change(change_id, old_price, new_price):
+    db.session.add(PriceChangeLog(change_id=change_id, base_product_id=2, old_price=old_price, new_price=new_price))
+    db.session.commit()
+
+
+def test_one_email_per_customer_and_product(app):
+    log_change(1, 50, 40)
+    assert detect_price_drops('shop@example.com', 'secret') == (1, 0)
+
+    outbox = get_mail_transport().outbox
+    assert [message['To'] for message in outbox] == ['c1@example.com']  # Not c2 (wished at 40) or c3 (at 35)
+    assert PriceDropNotification.query.count() == 2  # Both wishlisted sizes are covered
+    assert PriceChangeLog.query.filter(PriceChangeLog.processed_at.is_(None)).count() == 0
+
+
+def test_a_price_is_notified_once(app):
+    log_change(1, 50, 40)
+    detect_price_drops('shop@example.com', 'secret')
+    log_change(2, 45, 40)  # e.g. a discount landing on the price already notified
+    assert detect_price_drops('shop@example.com', 'secret') == (0, 0)
+    assert len(get_mail_transport().outbox) == 1
+
+
+def test_increases_are_not_notified(app):
+    log_change(1, 40, 50)
+    assert detect_price_drops('shop@example.com', 'secret') == (0, 0)
+    assert get_mail_transport().outbox == []
@@ -0,0 +1,47 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from backend.salesAnalytics import compute_metrics  # noqa: E402
+
+DAY = 86400
+
+
+def chunk(rows):
+    """Columnar chunk of (purchased, customer_id, product_id, category_id, price, list_price, quantity, status)."""
+    columns = list(zip(*rows))
+    dtypes = [np.int64, np.int64, np.int64, np.int64, np.float64, np.float64, np.int64, np.int16]
+    names = ('purchased', 'customer_id', 'product_id', 'category_id', 'price', 'list_price', 'quantity', 'status')
+    return {name: np.asarray(column, dtype) for name, column, dtype in zip(names, columns, dtypes)}
+
+
+def test_metrics_net_out_refunds_and_rank_products():
+    start = 100 * DAY
+    metrics = compute_metrics(chunk([
+        (start + 10, 1, 10, 1, 80.0, 100.0, 2, 0),      # discounted by 20 per unit
+        (start + 20, 1, 11, 2, 50.0, 50.0, 1, 0),       # same order (same minute)
+        (start + 3600, 1, 11, 2, 50.0, 50.0, 1, 6),     # refund approved
+        (start + DAY, 2, 12, 2, 300.0, 300.0, 1, 8),    # cancelled
+        (start + DAY, 3, 11, 2, 50.0, 50.0, 3, 7),      # refund denied: still revenue
+    ]), cost_ratio=0.5, top=2, range_start=start,
+        first_purchases=(np.array([1, 2, 3]), np.array([start - 40 * DAY, start + DAY, start + DAY])))
+
+    assert metrics["gross_revenue"] == 710.0
+    assert metrics["refunded_revenue"] == 350.0
+    assert metrics["net_revenue"] == 360.0
+    assert metrics["orders"] == 4
+    assert metrics["discount_cost"] == 40.0
+    assert metrics["categories"][0] == {
+        "category_id": 1, "net_revenue": 160.0, "estimated_cost": 100.0, "margin": 60.0,
+        "margin_rate": 0.375, "discount_cost": 40.0, "net_units": 2
+    }
+    assert [product["product_id"] for product in metrics["top_products"]] == [11, 10]
+    assert metrics["customers"] == {"active": 3, "repeat": 1, "new": 2, "average_net_revenue": 120.0}
+    assert [cohort["customers"] for cohort in metrics["cohorts"]] == [1, 2]
+
+
+def test_metrics_of_an_empty_range():
+    empty = chunk([(0, 0, 0, 0, 0.0, 0.0, 0, 0)])
+    empty = {name: values[:0] for name, values in empty.items()}
+    metrics = compute_metrics(empty, first_purchases=(np.array([], np.int64), np.array([], np.int64)))
+    assert metrics["net_revenue"] == 0 and metrics["orders"] == 0 and metrics["top_products"] == []
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from backend.salesRollup import aggregate_sales, compaction_cutoff, ROLLUP_LAG
+
+
+def test_aggregate_sales_by_bucket_and_dimension():
+    at = datetime(2024, 5, 1, 10, 15, 20)  # Naive timestamps are UTC
+    rows = [
+        (at, 1, 10, 2, Decimal('100.00'), 2),
+        (at, 1, 11, 2, Decimal('50.00'), 1),
+        (at + timedelta(hours=3), 2, 10, 2, Decimal('90.00'), 1),
+        (at, 3, None, None, Decimal('5.00'), 1),  # Product deleted since
+    ]
+    totals = aggregate_sales(rows)
+    day = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    hour = datetime(2024, 5, 1, 10, tzinfo=timezone.utc)
+
+    assert totals[('day', day, 'total', 0)] == {
+        "revenue": Decimal('345.00'), "units": 5, "item_count": 4, "order_count": 3
+    }
+    assert totals[('day', day, 'product', 10)]["revenue"] == Decimal('290.00')
+    assert totals[('hour', hour, 'category', 2)]["order_count"] == 1
+    assert totals[('hour', hour, 'product', 0)]["units"] == 1
+    assert ('hour', hour + timedelta(hours=3), 'total', 0) in totals
+
+
+def test_compaction_waits_for_late_checkouts():
+    just_after_midnight = datetime(2024, 5, 2, 0, 1, tzinfo=timezone.utc)
+    assert compaction_cutoff(just_after_midnight) == datetime(2024, 5, 1, tzinfo=timezone.utc)
+    assert compaction_cutoff(just_after_midnight + ROLLUP_LAG) == datetime(2024, 5, 2, tzinfo=timezone.utc)
@@ -0,0 +1,84 @@
+from backend.searchIndex import SearchIndex, PrefixIndex
+
+
+def _doc(base_product_id, product_name, color_name, color_description=""):
+    return {
+        "base_product_id": base_product_id,
+        "product_name": product_name,
+        "price": 10.0,
+        "color_name": color_name,
+        "color_description": color_description
+    }
+
+
+def _index():
+    index = SearchIndex()
+    index.load([
+        _doc(1, "Blue Oxford Shirt", "Blue", "classic blue"),
+        _doc(1, "Blue Oxford Shirt", "White", "plain white"),
+        _doc(2, "Linen Shirt", "Beige", "light beige"),
+        _doc(3, "Summer Dress", "Red", "blue flowers"),
+    ])
+    return index
+
+
+def test_multi_term_queries_require_every_term():
+    """Each query term must match, and terms may be prefixes."""
+    total, results = _index().search("oxf whi")
+    assert total == 1
+    assert (results[0]["base_product_id"], results[0]["color_name"]) == (1, "White")
+
+
+def test_name_matches_rank_above_description_matches():
+    """Product name hits are weighted above color description hits."""
+    _, results = _index().search("blue")
+    assert [(r["base_product_id"], r["color_name"]) for r in results] == [(1, "Blue"), (1, "White"), (3, "Red")]
+
+
+def test_pagination_reports_total():
+    """limit/offset slice the ranked results without changing the total."""
+    total, results = _index().search("shirt", limit=2, offset=1)
+    assert total == 3
+    assert len(results) == 2
+
+
+def test_replace_product_keeps_index_in_sync():
+    """Re-indexing a product replaces its old documents and terms."""
+    index = _index()
+    index.replace_product(2, [_doc(2, "Linen Trousers", "Navy")])
+    assert index.search("shirt")[0] == 2
+    assert index.search("trous")[0] == 1
+    index.replace_product(2, [])
+    assert index.search("linen")[0] == 0
+
+
+def test_prefix_index_suggests_word_starts_and_counts_shared_entries():
+    """Suggestions match any word of an entry; shared colors are stored once and outrank single uses."""
+    index = PrefixIndex()
+    index.load({
+        ('product', 1): [('product', 'Blue Oxford Shirt'), ('color', 'Blue')],
+        ('product', 2): [('product', 'Blouse'), ('color', 'Blue')],
+        ('category', 1): [('category', 'Shirts')],
+    })
+    assert index.suggest('bl') == [
+        {"text": "Blue", "type": "color"},
+        {"text": "Blouse", "type": "product"},
+        {"text": "Blue Oxford Shirt", "type": "product"},
+    ]
+    assert {"text": "Blue Oxford Shirt", "type": "product"} in index.suggest('shi')
+
+    index.replace(('product', 2), [])
+    assert index.suggest('blo') == []
+    assert {"text": "Blue", "type": "color"} in index.suggest('blu')
+
+
+def test_rebuild_keeps_replacements_made_while_reading_the_snapshot():
+    """A product re-indexed after the snapshot was read is not overwritten by the older snapshot."""
+    index = _index()
+    index.begin_rebuild()
+    snapshot = [_doc(2, "Linen Shirt", "Beige"), _doc(3, "Summer Dress", "Red")]
+    index.replace_product(2, [_doc(2, "Linen Trousers", "Navy")])
+    index.rebuild(snapshot)
+    assert index.search("trous")[0] == 1
+    assert index.search("linen shirt")[0] == 0
+    assert index.search("oxford")[0] == 0